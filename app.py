@@ -1,9 +1,20 @@
 import os
+import re
+import json
+import time
+import hashlib
 import logging
+import threading
 import tempfile
-from flask import Flask, render_template, request, redirect, url_for, flash, session, send_from_directory
+import mimetypes
+from flask import (Flask, render_template, request, redirect, url_for, flash, session, send_file,
+                   jsonify, Response, stream_with_context, abort)
 from werkzeug.utils import secure_filename
-from yt_translator import YouTubeTranslator
+from werkzeug.security import safe_join
+from scheduler import SchedulerBusyError
+from job_store import TERMINAL_STATUSES
+import metrics
+import services
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -12,9 +23,37 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev_secret_key")
 
-# Ensure temp directory exists for file storage
-TEMP_DIR = os.path.join(tempfile.gettempdir(), 'yt_translator')
-os.makedirs(TEMP_DIR, exist_ok=True)
+# Let the front-end server send download bodies: X-Sendfile (Apache, lighttpd)
+# or X-Accel-Redirect to an internal nginx location mapped onto OUTPUTS_DIR
+app.config['USE_X_SENDFILE'] = os.environ.get('YT_TRANSLATOR_X_SENDFILE') == '1'
+ACCEL_REDIRECT_PREFIX = os.environ.get('YT_TRANSLATOR_ACCEL_REDIRECT_PREFIX')
+
+# Output files never change once written (unique names), so clients may cache them for good
+DOWNLOAD_MAX_AGE = 365 * 24 * 3600
+
+# Where the translator publishes finished outputs (created with the translator, see
+# services.py). Nothing else under its temp directory is ever served.
+OUTPUTS_DIR = os.path.join(tempfile.gettempdir(), 'yt_translator', 'outputs')
+
+# Names of published outputs and cached results (see WorkspaceManager, DiskCache)
+# Outputs are MP3, except demo copies of the original audio without ffmpeg (e.g. .webm)
+OUTPUT_NAME = re.compile(r'(translated|cached)_[A-Za-z0-9-]+\.[a-z0-9]+')
+
+# Long-poll and event-stream requests must end before gunicorn's worker timeout (30s by default)
+MAX_STATUS_WAIT = 25
+
+# Each held status request (long-poll or event stream) takes one of the worker's
+# threads (see gunicorn.conf.py). Past this many, clients are asked to come back
+# later instead, so held requests never starve the rest of the site.
+MAX_HELD_REQUESTS = int(os.environ.get(
+    'YT_TRANSLATOR_MAX_HELD_REQUESTS', int(os.environ.get('YT_TRANSLATOR_WEB_THREADS', 32)) * 3 // 4
+))
+HELD_REQUEST_RETRY = 5
+_held_requests = threading.BoundedSemaphore(max(1, MAX_HELD_REQUESTS))
+
+def request_tenant():
+    """Tenant a submission counts against for fair scheduling: X-Tenant-ID, else the client address."""
+    return request.headers.get('X-Tenant-ID') or request.remote_addr or ''
 
 @app.route('/')
 def index():
@@ -29,10 +68,10 @@ def translate():
         return redirect(url_for('index'))
     
     try:
-        translator = YouTubeTranslator()
+        translator = services.get_translator()
         
         # Start translation process and get job ID
-        job_id = translator.start_translation_job(youtube_url)
+        job_id = translator.start_translation_job(youtube_url, tenant=request_tenant())
         
         # Store job ID in session
         session['job_id'] = job_id
@@ -40,6 +79,11 @@ def translate():
         # Redirect to result page
         return redirect(url_for('result'))
     
+    except SchedulerBusyError as e:
+        logger.warning(f"Rejected translation request: {str(e)}")
+        flash('The translator is busy right now. Please try again in a few moments.', 'warning')
+        return render_template('index.html'), 503, {'Retry-After': str(e.retry_after)}
+    
     except Exception as e:
         logger.error(f"Error during translation: {str(e)}")
         flash(f'Error: {str(e)}', 'danger')
@@ -54,14 +98,14 @@ def result():
         return redirect(url_for('index'))
     
     try:
-        translator = YouTubeTranslator()
+        translator = services.get_translator()
         status = translator.get_job_status(job_id)
         
         if status['status'] == 'completed':
             download_url = url_for('download_file', filename=status['filename'])
-            return render_template('result.html', status=status, download_url=download_url)
+            return render_template('result.html', status=status, download_url=download_url, job_id=job_id)
         else:
-            return render_template('result.html', status=status)
+            return render_template('result.html', status=status, job_id=job_id)
     
     except Exception as e:
         logger.error(f"Error checking job status: {str(e)}")
@@ -70,17 +114,228 @@ def result():
 
 @app.route('/status/<job_id>')
 def job_status(job_id):
+    """
+    Job status as JSON.
+    
+    With `?version=N&wait=S` the request long-polls: it blocks for up to S
+    seconds until the job's status version differs from N. When too many
+    requests are already held, a long-poll is answered with 503 and
+    Retry-After instead. Responses carry an ETag, so unchanged statuses can
+    be answered with 304.
+    """
     try:
-        translator = YouTubeTranslator()
-        status = translator.get_job_status(job_id)
-        return status
+        translator = services.get_translator()
+        version = request.args.get('version', type=int)
+        wait = min(request.args.get('wait', 0, type=float), MAX_STATUS_WAIT)
+        
+        if version is not None and wait > 0:
+            if not _held_requests.acquire(blocking=False):
+                return Response(status=503, headers={'Retry-After': str(HELD_REQUEST_RETRY)})
+            try:
+                status = translator.wait_for_job_change(job_id, version, wait)
+            finally:
+                _held_requests.release()
+        else:
+            status = translator.get_job_status(job_id)
+        
+        response = jsonify(status)
+        response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
     except Exception as e:
         logger.error(f"Error getting job status: {str(e)}")
         return {"status": "error", "message": str(e)}
 
+@app.route('/status/<job_id>/stream')
+def job_status_stream(job_id):
+    """
+    Job status as Server-Sent Events, one event per status version.
+    
+    The stream closes after MAX_STATUS_WAIT seconds or once the job
+    finishes; EventSource reconnects with Last-Event-ID and picks up from
+    the version it last saw. When too many requests are already held, the
+    stream sends the current status and closes at once, and the client
+    reconnects after HELD_REQUEST_RETRY seconds.
+    """
+    translator = services.get_translator()
+    last_version = request.headers.get('Last-Event-ID', type=int)
+    
+    def generate():
+        held = _held_requests.acquire(blocking=False)
+        try:
+            version = last_version
+            deadline = time.time() + MAX_STATUS_WAIT if held else 0
+            status = translator.get_job_status(job_id)
+            yield f"retry: {1000 if held else HELD_REQUEST_RETRY * 1000}\n\n"
+            
+            while True:
+                if status.get('version') != version:
+                    version = status.get('version')
+                    yield f"id: {version}\ndata: {json.dumps(status)}\n\n"
+                else:
+                    yield ': keepalive\n\n'
+                
+                remaining = deadline - time.time()
+                if status['status'] in TERMINAL_STATUSES or status['status'] == 'not_found' or remaining <= 0:
+                    return
+                status = translator.wait_for_job_change(job_id, version, min(remaining, 15))
+        finally:
+            if held:
+                _held_requests.release()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/retry/<job_id>', methods=['POST'])
+def retry_job(job_id):
+    """
+    Resume a failed job from its last checkpoint.
+    
+    Form posts (the result page's resume button) are redirected to the
+    result page; other clients get the job ID as JSON, with 404 for unknown
+    jobs and 409 for jobs that have not failed.
+    """
+    wants_json = not request.form
+    try:
+        translator = services.get_translator()
+        status = translator.get_job_status(job_id)
+        if status['status'] == 'not_found':
+            if wants_json:
+                return {"status": "not_found", "message": "Job not found"}, 404
+            flash('No translation job found', 'warning')
+            return redirect(url_for('index'))
+        
+        owner_id = translator.retry_job(job_id)
+        if owner_id is None:
+            if wants_json:
+                return {"status": status['status'], "message": "Only failed jobs can be retried"}, 409
+            session['job_id'] = job_id
+            return redirect(url_for('result'))
+        
+        if wants_json:
+            return {"job_id": owner_id, "status": "queued"}, 202
+        session['job_id'] = owner_id
+        return redirect(url_for('result'))
+    
+    except SchedulerBusyError as e:
+        logger.warning(f"Rejected retry of job {job_id}: {str(e)}")
+        if wants_json:
+            return {"status": "busy", "message": str(e)}, 503, {'Retry-After': str(e.retry_after)}
+        flash('The translator is busy right now. Please try again in a few moments.', 'warning')
+        return redirect(url_for('result'))
+    
+    except Exception as e:
+        logger.error(f"Error retrying job {job_id}: {str(e)}")
+        return {"status": "error", "message": str(e)}, 500
+
+@app.route('/batch', methods=['POST'])
+def start_batch():
+    """
+    Translate several videos as one batch.
+    
+    Takes JSON `{"youtube_urls": [...], "playlist_url": "..."}` (either or
+    both), or the same fields as a form post with one URL per line. Returns
+    202 with the batch ID and its status URL, 400 for an empty or oversized
+    batch, and 503 with Retry-After when the queue is full.
+    """
+    payload = request.get_json(silent=True) or {}
+    youtube_urls = payload.get('youtube_urls')
+    playlist_url = payload.get('playlist_url')
+    if not payload:
+        youtube_urls = request.form.get('youtube_urls', '').splitlines()
+        playlist_url = request.form.get('playlist_url')
+    if isinstance(youtube_urls, str) or not isinstance(youtube_urls or [], list):
+        return {"status": "error", "message": "youtube_urls must be a list"}, 400
+    
+    try:
+        translator = services.get_translator()
+        batch_id = translator.start_batch(youtube_urls, playlist_url, tenant=request_tenant())
+        return {"batch_id": batch_id, "status_url": url_for('batch_status', batch_id=batch_id)}, 202
+    
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}, 400
+    
+    except SchedulerBusyError as e:
+        logger.warning(f"Rejected batch: {str(e)}")
+        return {"status": "busy", "message": str(e)}, 503, {'Retry-After': str(e.retry_after)}
+    
+    except Exception as e:
+        logger.error(f"Error starting batch: {str(e)}")
+        return {"status": "error", "message": str(e)}, 500
+
+@app.route('/batch/<batch_id>')
+def batch_status(batch_id):
+    """
+    Aggregate status of a batch as JSON: progress, ETA, counts by status and
+    the status of every item. Responses carry an ETag, so unchanged
+    statuses can be answered with 304.
+    """
+    try:
+        translator = services.get_translator()
+        status = translator.get_batch_status(batch_id)
+        if status['status'] == 'not_found':
+            return status, 404
+        
+        for item in status['items']:
+            if item['status'] == 'completed' and item.get('filename'):
+                item['download_url'] = url_for('download_file', filename=item['filename'])
+        
+        response = jsonify(status)
+        response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+    except Exception as e:
+        logger.error(f"Error getting batch status: {str(e)}")
+        return {"status": "error", "message": str(e)}, 500
+
 @app.route('/download/<filename>')
 def download_file(filename):
-    return send_from_directory(TEMP_DIR, filename, as_attachment=True)
+    """
+    Serve a translated audio file.
+    
+    Supports Range requests (206), a strong ETag with If-None-Match and
+    If-Range, and long-lived caching. The body is sent with sendfile via the
+    WSGI server's file wrapper, or handed to the front-end server with
+    X-Sendfile / X-Accel-Redirect when configured.
+    """
+    if not OUTPUT_NAME.fullmatch(filename):
+        abort(404)
+    path = safe_join(OUTPUTS_DIR, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    
+    # Downloads drive the LRU order of the output quota
+    services.get_translator().get_workspace().mark_accessed(filename)
+    
+    stat = os.stat(path)
+    etag = f"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"
+    
+    if ACCEL_REDIRECT_PREFIX:
+        response = Response(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + filename
+        response.headers['Content-Disposition'] = f'attachment; filename="{secure_filename(filename)}"'
+        response.set_etag(etag)
+        response.last_modified = stat.st_mtime
+        response = response.make_conditional(request)
+    else:
+        response = send_file(path, as_attachment=True, etag=etag, conditional=True, max_age=DOWNLOAD_MAX_AGE)
+    
+    response.cache_control.public = True
+    response.cache_control.max_age = DOWNLOAD_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Pipeline metrics for this worker process in the Prometheus text format."""
+    # Make sure the scheduler and caches exist, so their gauges are reported
+    translator = services.get_translator()
+    translator.get_scheduler()
+    translator.get_result_cache()
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
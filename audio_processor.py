@@ -4,12 +4,61 @@ import tempfile
 import logging
 import math
 import json
-import time
+import asyncio
+import functools
+import hashlib
+import threading
+import contextlib
+import contextvars
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from file_transfer import copy_file
+from mp3_utils import probe_mp3, concat_mp3
+from translation_memory import TranslationMemory
+from disk_cache import DiskCache
+from backends import SimulatedTranscriptionBackend, SimulatedTranslationBackend, SimulatedSpeechBackend
+from chunk_pipeline import ChunkPipeline, PipelineStage
+from checkpoint import CheckpointStore
+from throttle import Throttle
+from metrics import timed, record_stage, register_cache, register_throttle, BYTES_WRITTEN
+
+try:
+    import pcm
+    import time_stretch
+    from vad import SilenceIndex, SilenceTracker
+except ImportError:  # NumPy is optional; without it WAV audio is not stretched or split at pauses
+    pcm = time_stretch = SilenceIndex = SilenceTracker = None
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# Chunk field each long-audio pipeline stage produces, checkpointed per chunk
+_STAGE_OUTPUTS = {
+    'transcribe': 'transcript',
+    'translate': 'translated_text',
+    'synthesize': 'synthesized_path',
+    'adjust timing': 'adjusted_path',
+    'encode': 'encoded_path'
+}
+_FILE_OUTPUTS = ('synthesized_path', 'adjusted_path', 'encoded_path')
+
+# Bytes of a file still downloading that are enough to read its duration
+_HEADER_BYTES = 256 * 1024
+
+# Seconds between checks of a blocking call's cancellation event
+_CANCEL_CHECK_INTERVAL = 0.5
+
+# Backends and the unit their calls are billed in
+_BACKEND_UNITS = {
+    'transcription': 'audio seconds',
+    'translation': 'characters',
+    'speech': 'characters'
+}
+
+# Stage timings of the job being processed in the current task (see _call_backend)
+_job_timings = contextvars.ContextVar('job_timings', default=None)
+
 class AudioProcessor:
     """
     Class to handle audio processing, including:
@@ -20,17 +69,184 @@ class AudioProcessor:
     
     Note: This is a mock implementation for demonstration purposes.
     In a production environment, you would need to use actual APIs for speech recognition,
-    translation, and text-to-speech services.
+    translation, and text-to-speech services, passed in as backends (see backends.py).
+    
+    The processing methods are coroutines (process_audio_async,
+    process_long_audio_async) so that a job waiting on backend calls does
+    not hold a thread; process_audio and process_long_audio are blocking
+    wrappers that run them on a shared event loop.
     """
     
-    def __init__(self):
+    # Event loop, process pool for CPU-bound chunk stages, translation memory,
+    # speech cache and backend throttles, shared by all processors in this process
+    _event_loop = None
+    _process_pool = None
+    _translation_memory = None
+    _speech_cache = None
+    _throttles = None
+    _shared_lock = threading.Lock()
+    
+    def __init__(self, target_language="pt-BR", voice_name="pt-BR-Wavenet-A", chunk_duration=900,
+                 chunk_boundary_window=30, stage_concurrency=None, translation_memory=None, speech_cache=None,
+                 transcription_backend=None, translation_backend=None, speech_backend=None, throttles=None):
         # Create temporary directory for processed files
         self.temp_dir = os.path.join(tempfile.gettempdir(), 'yt_translator')
         os.makedirs(self.temp_dir, exist_ok=True)
         
+        # Pipeline configuration; anything here that changes the output
+        # must also be part of get_config_fingerprint()
+        self.target_language = target_language
+        self.voice_name = voice_name
+        self.chunk_duration = chunk_duration
+        # How far (seconds) a chunk boundary may move to land on a pause
+        self.chunk_boundary_window = chunk_boundary_window
+        
+        # Speech-to-text, translation and text-to-speech services
+        self.transcription_backend = transcription_backend or SimulatedTranscriptionBackend()
+        self.translation_backend = translation_backend or SimulatedTranslationBackend()
+        self.speech_backend = speech_backend or SimulatedSpeechBackend()
+        
+        # Maximum number of chunks in each stage of process_long_audio at once
+        self.stage_concurrency = {
+            'transcribe': 4,
+            'translate': 4,
+            'synthesize': 4,
+            'adjust': os.cpu_count() or 1,
+            'encode': os.cpu_count() or 1,
+            **(stage_concurrency or {})
+        }
+        
+        # Sentence-level translation cache
+        self.translation_memory = translation_memory or self.get_translation_memory()
+        
+        # Content-addressed cache of synthesized speech
+        self.speech_cache = speech_cache or self.get_speech_cache()
+        
+        # Rate and concurrency limits per backend, shared by all jobs
+        self.throttles = throttles or self.get_throttles()
+    
+    @classmethod
+    def get_event_loop(cls):
+        """
+        Get the shared event loop that runs the blocking API's coroutines.
+        
+        The loop runs forever on a daemon thread, so any number of threads
+        can have jobs in flight on it at once. Its default executor, used for
+        blocking file and database work, has YT_TRANSLATOR_IO_THREADS threads.
+        """
+        with cls._shared_lock:
+            if cls._event_loop is None:
+                loop = asyncio.new_event_loop()
+                loop.set_default_executor(ThreadPoolExecutor(
+                    max_workers=int(os.environ.get('YT_TRANSLATOR_IO_THREADS', 32)),
+                    thread_name_prefix='audio-io'
+                ))
+                thread = threading.Thread(target=loop.run_forever, name='audio-event-loop')
+                thread.daemon = True
+                thread.start()
+                cls._event_loop = loop
+            return cls._event_loop
+    
+    @classmethod
+    def get_process_pool(cls):
+        """
+        Get the shared process pool for CPU-bound work, creating it on first use.
+        
+        A pool whose worker process died (BrokenProcessPool) refuses all
+        further work, so it is shut down and replaced by a new one.
+        """
+        with cls._shared_lock:
+            # ProcessPoolExecutor has no public way to tell it is broken
+            if cls._process_pool is not None and getattr(cls._process_pool, '_broken', False):
+                logger.warning("Process pool is broken (a worker process died); starting a new one")
+                cls._process_pool.shutdown(wait=False, cancel_futures=True)
+                cls._process_pool = None
+            if cls._process_pool is None:
+                # spawn avoids forking a process that is running worker threads
+                cls._process_pool = ProcessPoolExecutor(
+                    max_workers=os.cpu_count() or 1,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return cls._process_pool
+    
+    @classmethod
+    def get_translation_memory(cls):
+        """Get the shared on-disk translation memory, creating it on first use."""
+        with cls._shared_lock:
+            if cls._translation_memory is None:
+                db_path = os.path.join(tempfile.gettempdir(), 'yt_translator', 'state', 'translation_memory.db')
+                os.makedirs(os.path.dirname(db_path), exist_ok=True)
+                max_bytes = int(os.environ.get('YT_TRANSLATOR_TM_BYTES', 256 * 1024 * 1024))
+                cls._translation_memory = TranslationMemory(db_path, max_bytes)
+                register_cache('translation_memory', cls._translation_memory.get_stats)
+            return cls._translation_memory
+    
+    @classmethod
+    def get_speech_cache(cls):
+        """Get the shared synthesized-speech cache, creating it on first use."""
+        with cls._shared_lock:
+            if cls._speech_cache is None:
+                cache_dir = os.path.join(tempfile.gettempdir(), 'yt_translator', 'tts_cache')
+                max_bytes = int(os.environ.get('YT_TRANSLATOR_TTS_CACHE_BYTES', 1024 ** 3))
+                cls._speech_cache = DiskCache(cache_dir, max_bytes, prefix='tts_', suffix='.wav')
+                register_cache('speech', cls._speech_cache.get_stats)
+            return cls._speech_cache
+    
+    @classmethod
+    def get_throttles(cls):
+        """
+        Get the shared backend throttles (see throttle.Throttle), creating them on first use.
+        
+        Quotas are read from YT_TRANSLATOR_TRANSCRIPTION_QUOTA (audio seconds
+        per minute), YT_TRANSLATOR_TRANSLATION_QUOTA and
+        YT_TRANSLATOR_SPEECH_QUOTA (characters per minute); without one, a
+        backend has no rate limit. Concurrency limits adapt up to
+        YT_TRANSLATOR_BACKEND_MAX_CONCURRENCY.
+        
+        Returns:
+            dict: Throttle per backend name
+        """
+        with cls._shared_lock:
+            if cls._throttles is None:
+                max_concurrency = int(os.environ.get('YT_TRANSLATOR_BACKEND_MAX_CONCURRENCY', 32))
+                cls._throttles = {}
+                for name, unit in _BACKEND_UNITS.items():
+                    quota = float(os.environ.get(f'YT_TRANSLATOR_{name.upper()}_QUOTA', 0)) or None
+                    cls._throttles[name] = Throttle(name, unit, quota, max_concurrency=max_concurrency)
+                    register_throttle(name, cls._throttles[name].get_stats)
+            return cls._throttles
+    
+    def get_config_fingerprint(self):
+        """Get a short hash identifying the pipeline settings that affect the output."""
+        config = {
+            'target_language': self.target_language,
+            'voice_name': self.voice_name,
+            'chunk_duration': self.chunk_duration,
+            'chunk_boundary_window': self.chunk_boundary_window
+        }
+        return hashlib.sha256(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+        
     def get_audio_duration(self, audio_path):
-        """Get the duration of an audio file in seconds (estimating for demo)."""
-        # In a real implementation, we would use audio libraries to get the actual duration
+        """
+        Get the duration of an audio file in seconds.
+        
+        MP3 files are probed exactly from their headers (see mp3_utils.probe_mp3)
+        and WAV files read from theirs. Anything else falls back to a rough
+        estimate from the file size.
+        """
+        if pcm is not None and os.path.splitext(audio_path)[1].lower() == '.wav':
+            try:
+                return pcm.wav_duration(audio_path)
+            except Exception as e:
+                logger.warning(f"Could not read WAV header of {audio_path}: {str(e)}")
+        
+        try:
+            info = probe_mp3(audio_path)
+            if info is not None:
+                return info.duration
+        except Exception as e:
+            logger.warning(f"Could not probe {audio_path}: {str(e)}")
+        
         # For demo purposes, use file size as a very rough estimate (1MB ~= 60 seconds)
         try:
             file_size = os.path.getsize(audio_path) / (1024 * 1024)  # Convert to MB
@@ -39,60 +255,144 @@ class AudioProcessor:
         except Exception as e:
             logger.error(f"Error estimating audio duration: {str(e)}")
             return 120  # Default to 2 minutes if estimation fails
+    
+    def get_growing_audio_duration(self, growing_file):
+        """
+        Get the duration of audio that is still downloading (see downloader.GrowingFile).
+        
+        Blocks until the start of the file is on disk and reads the duration
+        from its header, or estimates it from the preallocated file size.
+        MP3 files without an info frame can only be measured frame by frame,
+        so for those this waits for the whole file.
+        """
+        growing_file.wait(_HEADER_BYTES)
+        audio_path = growing_file.path
+        if not growing_file.complete and os.path.splitext(audio_path)[1].lower() == '.mp3':
+            try:
+                info = probe_mp3(audio_path)
+            except Exception:
+                info = None
+            if info is not None and not info.has_info_frame:
+                growing_file.wait(growing_file.size)
+        return self.get_audio_duration(audio_path)
         
-    def process_audio(self, audio_path, progress_callback=None):
+    def process_audio(self, audio_path, progress_callback=None, work_dir=None, stage_timings=None, cancelled=None):
         """
         Process a single audio file: transcribe, translate, and synthesize.
         
+        Blocking wrapper around process_audio_async, run on the shared event loop.
+        
         Args:
             audio_path: Path to the input audio file
             progress_callback: Function to call with progress updates
+            work_dir: Directory for intermediate and output files (default: self.temp_dir)
+            stage_timings: Optional dict that receives seconds spent per stage
+            cancelled: Optional threading.Event; once set, the processing is cancelled
             
         Returns:
             str: Path to the translated audio file
+            
+        Raises:
+            concurrent.futures.CancelledError: If cancelled was set
         """
+        return self._run_sync(self.process_audio_async(audio_path, progress_callback, work_dir, stage_timings),
+                              cancelled)
+    
+    def process_long_audio(self, audio_path, chunk_duration=None, progress_callback=None, work_dir=None,
+                           stage_timings=None, growing_file=None, cancelled=None):
+        """
+        Process a long audio file by splitting it into chunks.
+        
+        Blocking wrapper around process_long_audio_async, run on the shared event loop.
+        
+        Args:
+            audio_path: Path to the input audio file
+            chunk_duration: Duration of each chunk in seconds (default: self.chunk_duration)
+            progress_callback: Function to call with progress updates
+            work_dir: Directory for intermediate and output files (default: self.temp_dir)
+            stage_timings: Optional dict that receives seconds spent per stage,
+                summed over chunks
+            growing_file: Optional downloader.GrowingFile if audio_path is
+                still downloading
+            cancelled: Optional threading.Event; once set, the processing is cancelled
+            
+        Returns:
+            str: Path to the combined translated audio file
+            
+        Raises:
+            concurrent.futures.CancelledError: If cancelled was set
+        """
+        return self._run_sync(self.process_long_audio_async(
+            audio_path, chunk_duration, progress_callback, work_dir, stage_timings, growing_file
+        ), cancelled)
+    
+    async def process_audio_async(self, audio_path, progress_callback=None, work_dir=None, stage_timings=None):
+        """
+        Process a single audio file: transcribe, translate, and synthesize.
+        
+        Backend calls are awaited; blocking file and database work runs on
+        the event loop's default executor. progress_callback is called on
+        the event loop and must return quickly.
+        
+        Args:
+            audio_path: Path to the input audio file
+            progress_callback: Function to call with progress updates
+            work_dir: Directory for intermediate and output files (default: self.temp_dir)
+            stage_timings: Optional dict that receives seconds spent per stage
+            
+        Returns:
+            str: Path to the translated audio file
+        """
+        loop = asyncio.get_running_loop()
+        timings_token = _job_timings.set(stage_timings)
         try:
             if progress_callback:
                 progress_callback(0, "Starting audio processing...")
             
             # Get original audio path for reference
             file_name = os.path.basename(audio_path)
-            original_duration = self.get_audio_duration(audio_path)
-            
-            # Simulate processing with delays to show progress
+            original_duration = await loop.run_in_executor(None, self.get_audio_duration, audio_path)
             
             # 1. Transcribe audio (English)
             if progress_callback:
                 progress_callback(10, "Transcribing audio to English text...")
             
-            # Simulate transcription process
-            time.sleep(1)
-            transcript = f"This is a simulated transcript for {file_name}. In a production environment, this would be the actual transcribed text from the audio file."
+            with timed('transcribe', stage_timings):
+                transcript = await self._transcribe_audio(audio_path)
             
             # 2. Translate text (English to Brazilian Portuguese)
             if progress_callback:
                 progress_callback(40, "Translating text to Brazilian Portuguese...")
             
-            # Simulate translation process
-            time.sleep(1)
-            translated_text = f"Esta é uma transcrição simulada para {file_name}. Em um ambiente de produção, este seria o texto real traduzido do arquivo de áudio."
+            with timed('translate', stage_timings):
+                translated_text = await self._translate_text(transcript, self.target_language)
+            logger.debug(f"Translated {len(transcript)} characters of {file_name}")
             
             # 3. Synthesize speech (Brazilian Portuguese)
             if progress_callback:
                 progress_callback(60, "Synthesizing Brazilian Portuguese speech...")
             
-            # Simulate speech synthesis by copying the original file
-            translated_audio_path = os.path.join(self.temp_dir, f"translated_{uuid.uuid4()}.mp3")
-            with open(audio_path, 'rb') as source_file:
-                with open(translated_audio_path, 'wb') as dest_file:
-                    dest_file.write(source_file.read())
+            with timed('synthesize', stage_timings):
+                synthesized_path = await self._synthesize_speech(translated_text, self.target_language,
+                                                                 self.voice_name, output_dir=work_dir)
             
-            # 4. Simulate timing adjustment
+            # 4. Adjust timing to match the original (CPU-bound, on the process pool)
             if progress_callback:
                 progress_callback(80, "Adjusting timing to match original audio...")
             
-            # Small delay to simulate processing
-            time.sleep(1)
+            with timed('adjust_timing', stage_timings):
+                adjusted_path = await loop.run_in_executor(
+                    self.get_process_pool(), adjust_timing,
+                    synthesized_path, int(original_duration * 1000), work_dir or self.temp_dir
+                )
+            
+            # 5. Encode the final audio, once
+            if progress_callback:
+                progress_callback(90, "Encoding translated audio...")
+            
+            translated_audio_path = await self._finish_audio(
+                audio_path, original_duration, [(0, adjusted_path)], work_dir, stage_timings
+            )
             
             if progress_callback:
                 progress_callback(100, "Audio processing completed!")
@@ -102,62 +402,153 @@ class AudioProcessor:
         except Exception as e:
             logger.error(f"Error in audio processing: {str(e)}")
             raise Exception(f"Failed to process audio: {str(e)}")
+        
+        finally:
+            _job_timings.reset(timings_token)
     
-    def process_long_audio(self, audio_path, chunk_duration=900, progress_callback=None):
+    async def process_long_audio_async(self, audio_path, chunk_duration=None, progress_callback=None, work_dir=None,
+                                       stage_timings=None, growing_file=None):
         """
         Process a long audio file by splitting it into chunks.
         
+        Chunks run through a pipeline (transcribe -> translate -> synthesize ->
+        adjust timing -> encode) where different chunks can be in different
+        stages at the same time; see stage_concurrency. Timing adjustment is
+        CPU-bound and runs on the shared process pool. Each chunk is encoded
+        to MP3 on its own, in parallel, and the encoded chunks are joined
+        frame by frame without re-encoding (see mp3_utils.concat_mp3).
+        Without an MP3 encoder, chunks are combined as in process_audio_async.
+        progress_callback is called on the event loop and must return quickly.
+        
+        With a work_dir, the chunk plan and each chunk's stage results are
+        checkpointed there (see CheckpointStore). Calling again with the same
+        work_dir, input and settings, e.g. after a failure, skips every stage
+        a chunk already finished.
+        
+        With a growing_file, audio_path may still be downloading: each chunk
+        waits in a first pipeline stage until the bytes it covers are on
+        disk, so the first chunks are transcribed while the rest downloads.
+        A file that is still incomplete is split evenly at first, and each
+        boundary moves to a pause as soon as the audio around it has been
+        decoded (see _pause_stage).
+        
         Args:
             audio_path: Path to the input audio file
-            chunk_duration: Duration of each chunk in seconds (default: 15 min)
+            chunk_duration: Duration of each chunk in seconds (default: self.chunk_duration)
             progress_callback: Function to call with progress updates
+            work_dir: Job directory for intermediate, checkpoint and output
+                files (default: self.temp_dir, without checkpoints)
+            stage_timings: Optional dict that receives seconds spent per stage,
+                summed over chunks
+            growing_file: Optional downloader.GrowingFile if audio_path is
+                still downloading
             
         Returns:
             str: Path to the combined translated audio file
         """
+        loop = asyncio.get_running_loop()
+        timings_token = _job_timings.set(stage_timings)
         try:
             if progress_callback:
                 progress_callback(0, "Starting long audio processing...")
             
             # Get original duration (estimated)
-            original_duration = self.get_audio_duration(audio_path)
-            
-            # Simulate splitting into chunks
-            # Calculate number of chunks
-            num_chunks = math.ceil(original_duration / chunk_duration)
+            if growing_file is not None:
+                original_duration = await loop.run_in_executor(None, self.get_growing_audio_duration, growing_file)
+            else:
+                original_duration = await loop.run_in_executor(None, self.get_audio_duration, audio_path)
+            chunk_duration = chunk_duration or self.chunk_duration
+            
+            checkpoints = plan = None
+            stop_finding_pauses = None
+            if work_dir:
+                checkpoints = await loop.run_in_executor(
+                    None, self._open_checkpoints, work_dir, audio_path, chunk_duration
+                )
+                plan = await loop.run_in_executor(None, checkpoints.load, 'plan')
+            
+            # Chunks are time ranges of the original; nothing is cut or copied
+            if plan:
+                boundaries = plan['boundaries']
+            else:
+                complete = growing_file is None or growing_file.complete
+                with timed('split', stage_timings):
+                    boundaries = await loop.run_in_executor(
+                        None, self._choose_chunk_boundaries, audio_path, original_duration, chunk_duration, complete
+                    )
+                # Audio that is still downloading is split evenly; the boundaries move to pauses later
+                plan = {
+                    'boundaries': boundaries,
+                    'find_pauses': not complete and SilenceTracker is not None and pcm.decoder_available()
+                }
+                if checkpoints:
+                    await loop.run_in_executor(None, checkpoints.save, 'plan', plan)
+            num_chunks = len(boundaries) - 1
             
             if progress_callback:
                 progress_callback(5, f"Splitting audio into {num_chunks} chunks...")
             
-            # Simulate processing time based on number of chunks
-            time.sleep(2)
-            
-            # Process each simulated chunk
-            for i in range(num_chunks):
-                if progress_callback:
-                    chunk_progress = (i / num_chunks) * 80  # Scale to 0-80%
-                    progress_callback(5 + chunk_progress, f"Processing chunk {i+1}/{num_chunks}...")
-                
-                # Simulate processing time for each chunk
-                time.sleep(1)
+            chunks = [
+                {
+                    'index': i,
+                    'audio_path': audio_path,
+                    'start': boundaries[i],
+                    'end': boundaries[i + 1],
+                    'output_dir': work_dir or self.temp_dir
+                }
+                for i in range(num_chunks)
+            ]
+            
+            stages = [
+                PipelineStage('transcribe', self._transcribe_chunk, self.stage_concurrency['transcribe']),
+                PipelineStage('translate', self._translate_chunk, self.stage_concurrency['translate']),
+                PipelineStage('synthesize', self._synthesize_chunk, self.stage_concurrency['synthesize']),
+                PipelineStage('adjust timing', adjust_chunk_timing, self.stage_concurrency['adjust'],
+                              executor=self.get_process_pool())
+            ]
+            encode = pcm is not None and pcm.mp3_encoder_available()
+            if encode:
+                stages.append(PipelineStage('encode', encode_chunk, self.stage_concurrency['encode']))
+            if checkpoints:
+                stages = [self._checkpointed_stage(stage, checkpoints) for stage in stages]
+            if growing_file is not None:
+                stages.insert(0, self._download_stage(growing_file, original_duration, num_chunks))
+            if plan.get('find_pauses') and num_chunks > 1:
+                pause_stage, stop_finding_pauses = self._pause_stage(audio_path, growing_file, boundaries, checkpoints)
+                stages.insert(0, pause_stage)
+            if plan and progress_callback:
+                finished = await loop.run_in_executor(None, lambda: sum(
+                    checkpoints.load(_chunk_checkpoint_key(chunk, stages[-1].name)) is not None for chunk in chunks
+                ))
+                progress_callback(5, f"Resuming from the last checkpoint ({finished} of {num_chunks} chunks done)...")
+            
+            pipeline = ChunkPipeline(
+                stages,
+                # Scale pipeline progress to 5-85%
+                progress_callback=(lambda fraction, message: progress_callback(5 + fraction * 80, message))
+                if progress_callback else None,
+                timing_callback=lambda stage, seconds: record_stage(stage.replace(' ', '_'), seconds, stage_timings)
+            )
+            processed_chunks = await pipeline.run_async(chunks)
+            logger.info(f"Processed {len(processed_chunks)} chunks of {audio_path}")
             
-            # Simulate combining chunks
+            # Place each chunk at its original start time
             if progress_callback:
                 progress_callback(85, "Combining translated chunks...")
             
-            time.sleep(2)
-            
-            # Simulate final timing adjustment
-            if progress_callback:
-                progress_callback(90, "Adjusting final timing to match original...")
-            
-            time.sleep(1)
-            
-            # Create the output file by simply copying the input file (for demo)
-            combined_audio_path = os.path.join(self.temp_dir, f"translated_{uuid.uuid4()}.mp3")
-            with open(audio_path, 'rb') as source_file:
-                with open(combined_audio_path, 'wb') as dest_file:
-                    dest_file.write(source_file.read())
+            if encode:
+                combined_audio_path = os.path.join(work_dir or self.temp_dir, f"translated_{uuid.uuid4()}.mp3")
+                with timed('combine', stage_timings):
+                    await loop.run_in_executor(
+                        None, concat_mp3, combined_audio_path, original_duration,
+                        [(chunk['start'], chunk['encoded_path']) for chunk in processed_chunks]
+                    )
+            else:
+                combined_audio_path = await self._finish_audio(
+                    audio_path, original_duration,
+                    [(chunk['start'], chunk['adjusted_path']) for chunk in processed_chunks],
+                    work_dir, stage_timings
+                )
             
             if progress_callback:
                 progress_callback(100, "Long audio processing completed!")
@@ -167,116 +558,462 @@ class AudioProcessor:
         except Exception as e:
             logger.error(f"Error in long audio processing: {str(e)}")
             raise Exception(f"Failed to process long audio: {str(e)}")
+        
+        finally:
+            if stop_finding_pauses is not None:
+                stop_finding_pauses()
+            _job_timings.reset(timings_token)
+    
+    def _choose_chunk_boundaries(self, audio_path, duration, chunk_duration, use_pauses=True):
+        """
+        Choose where to split audio into chunks of about chunk_duration seconds.
+        
+        Audio is split at pauses found by the voice-activity detector (see
+        vad.SilenceIndex), so chunks do not cut through words. WAV is read
+        directly; other formats (MP3, M4A, WebM) are decoded to PCM once,
+        with ffmpeg, straight into the detector. Without ffmpeg, or if
+        use_pauses is False, audio is split into equal chunks.
+        
+        Returns:
+            list: Boundary times in seconds, starting with 0 and ending with the duration
+        """
+        is_wav = os.path.splitext(audio_path)[1].lower() == '.wav'
+        if use_pauses and SilenceIndex is not None and (is_wav or pcm.decoder_available()):
+            try:
+                if is_wav:
+                    index = SilenceIndex.from_wav(audio_path)
+                else:
+                    index = SilenceIndex.from_blocks(pcm.decode_blocks(audio_path), pcm.ANALYSIS_SAMPLE_RATE)
+                logger.debug(f"Found {len(index.regions)} pauses in {audio_path}")
+                return index.choose_boundaries(chunk_duration, self.chunk_boundary_window)
+            except Exception as e:
+                logger.warning(f"Could not find pauses in {audio_path}, splitting evenly: {str(e)}")
+        
+        # Equal chunks keep parallel work balanced (no short last chunk)
+        num_chunks = max(1, math.ceil(duration / chunk_duration))
+        return [i * duration / num_chunks for i in range(num_chunks + 1)]
+    
+    def _run_sync(self, coroutine, cancelled=None):
+        """
+        Run a coroutine on the shared event loop and wait for its result.
+        
+        If the threading.Event cancelled is set while waiting, the coroutine's
+        task is cancelled and concurrent.futures.CancelledError is raised.
+        """
+        loop = self.get_event_loop()
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is loop:
+            coroutine.close()
+            raise RuntimeError("Blocking AudioProcessor methods cannot be called from its event loop; "
+                               "await the *_async methods instead")
+        future = asyncio.run_coroutine_threadsafe(coroutine, loop)
+        if cancelled is None:
+            return future.result()
+        while True:
+            try:
+                return future.result(timeout=_CANCEL_CHECK_INTERVAL)
+            except FutureTimeoutError:
+                if cancelled.is_set():
+                    future.cancel()
+                    # Raises CancelledError, unless the task finished meanwhile
+                    return future.result()
     
-    def _transcribe_audio(self, audio_path):
+    async def _finish_audio(self, audio_path, duration, pieces, work_dir=None, stage_timings=None):
         """
-        Simulates transcribing audio to text.
-        In a real implementation, this would use a service like Google Cloud Speech-to-Text.
+        Combine adjusted speech into the final output file.
+        
+        The WAV pieces are placed at their start times in one WAV of the
+        original duration (see pcm.assemble_wav), which is then encoded to
+        MP3: the only lossy encode in the pipeline. Without NumPy or an MP3
+        encoder the demo output is a copy of the original file, which keeps
+        the original's extension (e.g. .webm), so it is served as what it is.
+        
+        Args:
+            audio_path: Original audio file
+            duration: Duration of the original in seconds
+            pieces: List of (start_seconds, wav_path), sorted by start
+            work_dir: Directory for intermediate and output files (default: self.temp_dir)
+            stage_timings: Optional dict that receives seconds spent per stage
+            
+        Returns:
+            str: Path to the output file
+        """
+        loop = asyncio.get_running_loop()
+        output_dir = work_dir or self.temp_dir
+        output_name = f"translated_{uuid.uuid4()}"
+        
+        combined_path = None
+        if pcm is not None:
+            with timed('combine', stage_timings):
+                combined_path = await loop.run_in_executor(
+                    None, pcm.assemble_wav, os.path.join(output_dir, f"combined_{uuid.uuid4()}.wav"), duration, pieces
+                )
+        
+        with timed('export', stage_timings):
+            if combined_path and pcm.mp3_encoder_available():
+                output_path = os.path.join(output_dir, output_name + '.mp3')
+                await loop.run_in_executor(None, pcm.export_mp3, combined_path, output_path)
+            else:
+                # Without NumPy or an MP3 encoder, the demo output is a copy of the original file
+                output_path = os.path.join(output_dir, output_name + (os.path.splitext(audio_path)[1].lower() or '.bin'))
+                await loop.run_in_executor(None, copy_file, audio_path, output_path)
+        return output_path
+    
+    def _open_checkpoints(self, work_dir, audio_path, chunk_duration):
+        """Open the long-audio checkpoints in work_dir, valid for this input and these settings."""
+        fingerprint = json.dumps([
+            self.get_config_fingerprint(), os.path.basename(audio_path), os.path.getsize(audio_path), chunk_duration
+        ])
+        return CheckpointStore(work_dir, 'long_audio', fingerprint)
+    
+    def _checkpointed_stage(self, stage, checkpoints):
+        """Wrap a pipeline stage so that chunks with a saved result skip it, and new results are saved."""
+        field = _STAGE_OUTPUTS[stage.name]
+        files = (field,) if field in _FILE_OUTPUTS else ()
+        
+        async def run(chunk):
+            loop = asyncio.get_running_loop()
+            key = _chunk_checkpoint_key(chunk, stage.name)
+            saved = await loop.run_in_executor(None, checkpoints.load, key)
+            if saved is not None:
+                return {**chunk, **saved}
+            
+            if asyncio.iscoroutinefunction(stage.func):
+                result = await stage.func(chunk)
+            else:
+                result = await loop.run_in_executor(stage.executor, stage.func, chunk)
+            await loop.run_in_executor(None, checkpoints.save, key, {field: result[field]}, files)
+            return result
+        
+        return PipelineStage(stage.name, run, stage.concurrency)
+    
+    def _pause_stage(self, audio_path, growing_file, boundaries, checkpoints):
+        """
+        Pipeline stage that moves the boundaries of evenly split chunks to pauses.
+        
+        Used for audio split while still downloading. The audio is decoded
+        to PCM once, on its own thread, as it arrives (see pcm.decode_blocks),
+        into a vad.SilenceTracker. The inner boundaries are then chosen in
+        order, each as soon as the audio around it is decoded, as
+        SilenceIndex.choose_boundaries would, and checkpointed so a resumed
+        job keeps them. A chunk waits in this stage until both of its
+        boundaries are chosen. If the audio cannot be decoded, the
+        remaining boundaries stay where they are.
+        
+        Must be called on the event loop.
+        
+        Returns:
+            tuple: (PipelineStage, stop) where stop() ends the search early
+        """
+        loop = asyncio.get_running_loop()
+        tracker = SilenceTracker(pcm.ANALYSIS_SAMPLE_RATE)
+        stopped = threading.Event()
+        num_chunks = len(boundaries) - 1
+        step = boundaries[-1] / num_chunks
+        window = self.chunk_boundary_window
+        chosen = [loop.create_future() for _ in boundaries]
+        
+        def decode():
+            still_downloading = growing_file is not None and not growing_file.complete
+            source = growing_file.iter_bytes() if still_downloading else audio_path
+            try:
+                with contextlib.closing(pcm.decode_blocks(source)) as blocks:
+                    for block in blocks:
+                        if stopped.is_set():
+                            break
+                        tracker.feed(block)
+            except Exception as e:
+                logger.warning(f"Could not decode {audio_path} to find pauses, keeping even chunks: {str(e)}")
+                tracker.finish(e)
+            else:
+                tracker.finish()
+        
+        async def choose():
+            try:
+                chosen[0].set_result(boundaries[0])
+                previous = boundaries[0]
+                for index in range(1, num_chunks):
+                    key = f'boundary_{index}'
+                    saved = await loop.run_in_executor(None, checkpoints.load, key) if checkpoints else None
+                    if saved is not None:
+                        boundary = saved['time']
+                    else:
+                        nominal = boundary = boundaries[index]
+                        await tracker.wait_async(min(nominal + window, nominal + step / 2))
+                        if tracker.error is None:
+                            silence_index = await loop.run_in_executor(None, tracker.index)
+                            boundary = silence_index.choose_boundary(nominal, previous, step, window)
+                        if checkpoints:
+                            await loop.run_in_executor(None, checkpoints.save, key, {'time': boundary})
+                    chosen[index].set_result(boundary)
+                    previous = boundary
+                chosen[num_chunks].set_result(boundaries[num_chunks])
+            except Exception as e:
+                logger.warning(f"Could not move chunk boundaries of {audio_path} to pauses: {str(e)}")
+                for index, future in enumerate(chosen):
+                    if not future.done():
+                        future.set_result(boundaries[index])
+        
+        thread = threading.Thread(target=decode, name='find-pauses')
+        thread.daemon = True
+        thread.start()
+        task = asyncio.ensure_future(choose())
+        
+        def stop():
+            stopped.set()
+            task.cancel()
+        
+        async def run(chunk):
+            start = await chosen[chunk['index']]
+            end = await chosen[chunk['index'] + 1]
+            return {**chunk, 'start': start, 'end': end}
+        
+        # Waiting costs nothing, so every chunk may wait at once
+        return PipelineStage('find pauses', run, num_chunks), stop
+    
+    def _download_stage(self, growing_file, duration, num_chunks):
+        """Pipeline stage that holds each chunk until the audio it covers is downloaded."""
+        async def run(chunk):
+            await growing_file.wait_async(_bytes_needed(chunk['end'], duration, growing_file.size))
+            return chunk
+        
+        # Waiting costs nothing, so every chunk may wait at once
+        return PipelineStage('wait for download', run, num_chunks)
+    
+    async def _transcribe_chunk(self, chunk):
+        """Pipeline stage: transcribe one chunk."""
+        transcript = await self._transcribe_audio(chunk['audio_path'], chunk['start'], chunk['end'])
+        return {**chunk, 'transcript': transcript}
+    
+    async def _translate_chunk(self, chunk):
+        """Pipeline stage: translate one chunk's transcript."""
+        return {**chunk, 'translated_text': await self._translate_text(chunk['transcript'], self.target_language)}
+    
+    async def _synthesize_chunk(self, chunk):
+        """Pipeline stage: synthesize speech for one chunk."""
+        synthesized_path = await self._synthesize_speech(
+            chunk['translated_text'], self.target_language, self.voice_name, output_dir=chunk['output_dir']
+        )
+        return {**chunk, 'synthesized_path': synthesized_path}
+    
+    async def _call_backend(self, name, cost, func, *args):
+        """
+        Call a backend through its throttle (see get_throttles).
+        
+        Time spent waiting for the throttle is recorded as the stage
+        throttle_<name>, in the stage timings of the job being processed.
+        
+        Args:
+            name: Backend name, a key of self.throttles
+            cost: Cost of the call in the backend's billing unit
+            func: Coroutine function making the call
+            
+        Returns:
+            The call's result
+        """
+        result, waited = await self.throttles[name].call(cost, func, *args)
+        record_stage(f"throttle_{name}", waited, _job_timings.get())
+        return result
+    
+    async def _transcribe_audio(self, audio_path, start=None, end=None):
+        """
+        Transcribe audio to text using the transcription backend.
         
         Args:
             audio_path: Path to the audio file
+            start: Optional start offset in seconds
+            end: Optional end offset in seconds
             
         Returns:
-            str: Simulated transcribed text
+            str: Transcribed text
         """
         try:
-            # Simulate transcription process
-            file_name = os.path.basename(audio_path)
-            
-            # Create a simulated transcript based on the file name
-            transcript = (
-                f"This is a simulated transcript for {file_name}. "
-                "In a production environment, this would be the actual transcribed text from the audio file. "
-                "The transcript would contain all the spoken words from the original English content. "
-                "For demonstration purposes only."
+            # Billed by the second of audio
+            until = end
+            if until is None:
+                until = await asyncio.get_running_loop().run_in_executor(None, self.get_audio_duration, audio_path)
+            seconds = until - (start or 0)
+            return await self._call_backend(
+                'transcription', seconds, self.transcription_backend.transcribe_async, audio_path, start, end
             )
             
-            return transcript
-            
         except Exception as e:
-            logger.error(f"Error in speech transcription simulation: {str(e)}")
-            raise Exception(f"Failed to simulate audio transcription: {str(e)}")
+            logger.error(f"Error in speech transcription: {str(e)}")
+            raise Exception(f"Failed to transcribe audio: {str(e)}")
     
-    def _translate_text(self, text, target_language="pt-BR"):
+    async def _translate_text(self, text, target_language="pt-BR"):
         """
-        Simulates translating text.
-        In a real implementation, this would use a service like Google Cloud Translation.
+        Translate text, sentence by sentence, through the translation memory.
+        
+        Only sentences that are not in the translation memory are sent to
+        the translation backend (_translate_segments).
         
         Args:
             text: Text to translate
             target_language: Target language code
             
         Returns:
-            str: Simulated translated text
+            str: Translated text
         """
         try:
-            # Simulate translation
-            # For demo purposes, just prepend with "Portuguese: " and add some Portuguese-like text
-            translated_text = (
-                f"Esta é uma tradução simulada. "
-                "Em um ambiente de produção, este seria o texto real traduzido do inglês para o português brasileiro. "
-                "Texto original: {text[:100]}... "
-                "Para fins de demonstração apenas."
-            )
-            
-            return translated_text
+            return await self.translation_memory.translate_async(text, target_language, self._translate_segments)
             
         except Exception as e:
-            logger.error(f"Error in text translation simulation: {str(e)}")
-            raise Exception(f"Failed to simulate text translation: {str(e)}")
+            logger.error(f"Error in text translation: {str(e)}")
+            raise Exception(f"Failed to translate text: {str(e)}")
     
-    def _synthesize_speech(self, text, language_code="pt-BR", voice_name="pt-BR-Wavenet-A"):
+    async def _translate_segments(self, segments, target_language="pt-BR"):
         """
-        Simulates synthesizing speech.
-        In a real implementation, this would use a service like Google Cloud Text-to-Speech.
+        Translate a batch of sentences using the translation backend.
         
         Args:
-            text: Text to synthesize
-            language_code: Language code
-            voice_name: Voice name
+            segments: List of sentences to translate
+            target_language: Target language code
             
         Returns:
-            str: Path to the simulated synthesized audio file
+            list: Translations, one per sentence
         """
         try:
-            # Create an empty audio file as a placeholder
-            output_path = os.path.join(self.temp_dir, f"synthesized_{uuid.uuid4()}.mp3")
-            
-            # For demo purposes, write a small amount of data to the file
-            with open(output_path, "wb") as out:
-                # Write some dummy data (this won't be playable audio)
-                out.write(b'\x00' * 1024)
-                
-            return output_path
+            return await self._call_backend(
+                'translation', sum(len(segment) for segment in segments),
+                self.translation_backend.translate_async, segments, target_language
+            )
             
         except Exception as e:
-            logger.error(f"Error in speech synthesis simulation: {str(e)}")
-            raise Exception(f"Failed to simulate speech synthesis: {str(e)}")
+            logger.error(f"Error in text translation: {str(e)}")
+            raise Exception(f"Failed to translate text segments: {str(e)}")
     
-    def _adjust_timing(self, audio_path, target_duration_ms):
+    async def _synthesize_speech(self, text, language_code="pt-BR", voice_name="pt-BR-Wavenet-A", speaking_rate=1.0,
+                                 output_dir=None):
         """
-        Simulates adjusting audio timing.
-        In a real implementation, this would use libraries like Pydub and ffmpeg.
+        Synthesize speech, reusing previously rendered audio for identical requests.
+        
+        Rendered audio is cached by (text, language, voice, rate). On a hit
+        the cached file is linked (or copied) to a fresh path, so callers own
+        the returned file and may delete it.
         
         Args:
-            audio_path: Path to audio file to adjust
-            target_duration_ms: Target duration in milliseconds
+            text: Text to synthesize
+            language_code: Language code
+            voice_name: Voice name
+            speaking_rate: Speaking rate (1.0 is normal speed)
+            output_dir: Directory for the audio file (default: self.temp_dir)
             
         Returns:
-            str: Path to the adjusted audio file
+            str: Path to the synthesized audio file
         """
-        # In a real implementation, this would actually adjust the audio timing
-        # For demo purposes, just copy the file
-        temp_output_path = os.path.join(self.temp_dir, f"timing_output_{uuid.uuid4()}.mp3")
+        loop = asyncio.get_running_loop()
+        output_path = os.path.join(output_dir or self.temp_dir, f"synthesized_{uuid.uuid4()}.wav")
+        cache_key = hashlib.sha256(json.dumps(
+            [text, language_code, voice_name, speaking_rate], ensure_ascii=False
+        ).encode('utf-8')).hexdigest()
+        
+        cached_path = await loop.run_in_executor(None, self.speech_cache.get, cache_key)
+        if cached_path:
+            try:
+                await loop.run_in_executor(None, functools.partial(copy_file, cached_path, output_path,
+                                                                   allow_link=True))
+                return output_path
+            except FileNotFoundError:
+                # Evicted between lookup and link; render it again
+                pass
         
+        await self._render_speech(text, language_code, voice_name, speaking_rate, output_path)
+        BYTES_WRITTEN.inc(os.path.getsize(output_path), kind='speech')
         try:
-            # Copy the file
-            with open(audio_path, 'rb') as source_file:
-                with open(temp_output_path, 'wb') as dest_file:
-                    dest_file.write(source_file.read())
-            
-            return temp_output_path
+            await loop.run_in_executor(None, self.speech_cache.put, cache_key, output_path)
+        except Exception as e:
+            logger.warning(f"Could not cache synthesized speech: {str(e)}")
+        return output_path
+    
+    async def _render_speech(self, text, language_code, voice_name, speaking_rate, output_path):
+        """Render speech into output_path using the speech backend."""
+        try:
+            await self._call_backend(
+                'speech', len(text),
+                self.speech_backend.synthesize_async, text, language_code, voice_name, speaking_rate, output_path
+            )
             
         except Exception as e:
-            logger.error(f"Error simulating audio timing adjustment: {str(e)}")
-            return audio_path  # Return original path if simulation fails
+            logger.error(f"Error in speech synthesis: {str(e)}")
+            raise Exception(f"Failed to synthesize speech: {str(e)}")
+
+
+# Limits on how much speech is sped up or slowed down to fit its slot
+MIN_STRETCH_FACTOR = 0.5
+MAX_STRETCH_FACTOR = 2.0
+
+
+def adjust_timing(audio_path, target_duration_ms, output_dir):
+    """
+    Stretch audio to a target duration without changing its pitch.
+    
+    PCM WAV files are time-stretched in-process with WSOLA (see
+    time_stretch.py, which needs NumPy). Other formats cannot be decoded
+    here yet and are copied unchanged.
+    
+    Module-level so that it can run on a process pool.
+    
+    Args:
+        audio_path: Path to audio file to adjust
+        target_duration_ms: Target duration in milliseconds
+        output_dir: Directory for the adjusted file
+        
+    Returns:
+        str: Path to the adjusted audio file
+    """
+    extension = os.path.splitext(audio_path)[1].lower() or '.mp3'
+    temp_output_path = os.path.join(output_dir, f"timing_output_{uuid.uuid4()}{extension}")
+    
+    try:
+        if time_stretch is not None and extension == '.wav':
+            duration_ms = pcm.wav_duration(audio_path) * 1000
+            if duration_ms > 0 and target_duration_ms > 0:
+                # Past these limits speech stops sounding natural; the slot is
+                # then padded with silence, or the speech cut when combining
+                factor = min(max(target_duration_ms / duration_ms, MIN_STRETCH_FACTOR), MAX_STRETCH_FACTOR)
+                time_stretch.stretch_wav(audio_path, temp_output_path, factor)
+                return temp_output_path
+        
+        # For demo purposes, just copy the file
+        copy_file(audio_path, temp_output_path)
+        
+        return temp_output_path
+        
+    except Exception as e:
+        logger.error(f"Error adjusting audio timing: {str(e)}")
+        return audio_path  # Return original path if adjustment fails
+
+
+def _bytes_needed(end, duration, size):
+    """Estimate how much of a size-byte file must be on disk to read its audio up to end seconds."""
+    # Assumes a roughly constant bitrate; the margin covers headers and bitrate swings.
+    # The last chunk always needs the whole file.
+    return min(size, math.ceil(size * end / duration * 1.02) + _HEADER_BYTES) if duration else size
+
+
+def _chunk_checkpoint_key(chunk, stage_name):
+    return f"chunk_{chunk['index']}_{stage_name.replace(' ', '_')}"
+
+
+def adjust_chunk_timing(chunk):
+    """Pipeline stage: stretch one chunk's synthesized speech to the chunk's duration."""
+    target_duration_ms = int((chunk['end'] - chunk['start']) * 1000)
+    adjusted_path = adjust_timing(chunk['synthesized_path'], target_duration_ms, chunk['output_dir'])
+    return {**chunk, 'adjusted_path': adjusted_path}
+
+
+def encode_chunk(chunk):
+    """Pipeline stage: fit one chunk's adjusted speech to its slot and encode it to MP3."""
+    slot_path = os.path.join(chunk['output_dir'], f"slot_{uuid.uuid4()}.wav")
+    encoded_path = os.path.join(chunk['output_dir'], f"encoded_{uuid.uuid4()}.mp3")
+    try:
+        pcm.assemble_wav(slot_path, chunk['end'] - chunk['start'], [(0, chunk['adjusted_path'])])
+        pcm.export_mp3(slot_path, encoded_path)
+    finally:
+        if os.path.exists(slot_path):
+            os.remove(slot_path)
+    return {**chunk, 'encoded_path': encoded_path}
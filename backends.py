@@ -0,0 +1,358 @@
+import os
+import time
+import wave
+import queue
+import asyncio
+import random
+import logging
+import contextlib
+import http.client
+from urllib.parse import urlparse
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+class BackendError(Exception):
+    """Raised when a transcription, translation or speech backend call fails."""
+
+
+class BackendRateLimitError(BackendError):
+    """
+    Raised when a service rejects a call as over quota (HTTP 429 or RESOURCE_EXHAUSTED).
+
+    Such calls are retried after a pause (see throttle.Throttle).
+
+    Args:
+        message: Error message
+        retry_after: Seconds the service asked to wait, if it said
+    """
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Backend:
+    """
+    Base class of the service interfaces.
+
+    A backend instance is a long-lived client: the service container (see
+    services.py) creates one of each per process and every job shares it,
+    so backends should create connections lazily and keep them open.
+    """
+
+    name = 'backend'
+
+    def warmup(self):
+        """Prepare the client for its first call, e.g. open a connection. Optional."""
+
+
+class TranscriptionBackend(Backend):
+    """
+    Speech-to-text service interface.
+
+    Backends implement transcribe, and may override transcribe_async with a
+    native asyncio client; the default runs transcribe on a worker thread.
+    The same holds for the translation and speech interfaces.
+    """
+
+    name = 'transcription'
+
+    def transcribe(self, audio_path, start=None, end=None):
+        """
+        Transcribe audio to text.
+
+        Args:
+            audio_path: Path to the audio file
+            start: Optional start offset in seconds
+            end: Optional end offset in seconds
+
+        Returns:
+            str: Transcribed text
+        """
+        raise NotImplementedError
+
+    async def transcribe_async(self, audio_path, start=None, end=None):
+        """Async version of transcribe."""
+        return await asyncio.to_thread(self.transcribe, audio_path, start, end)
+
+
+class TranslationBackend(Backend):
+    """Text translation service interface."""
+
+    name = 'translation'
+
+    def translate(self, segments, target_language):
+        """
+        Translate a batch of sentences.
+
+        Returns:
+            list: One translation per input sentence
+        """
+        raise NotImplementedError
+
+    async def translate_async(self, segments, target_language):
+        """Async version of translate."""
+        return await asyncio.to_thread(self.translate, segments, target_language)
+
+
+class SpeechBackend(Backend):
+    """
+    Text-to-speech service interface.
+
+    Speech is rendered as uncompressed PCM WAV (e.g. LINEAR16 from Google
+    Cloud Text-to-Speech); the pipeline only encodes to MP3 once, at the end.
+    """
+
+    name = 'speech'
+
+    def synthesize(self, text, language_code, voice_name, speaking_rate, output_path):
+        """Render speech for text into output_path as a PCM WAV file."""
+        raise NotImplementedError
+
+    async def synthesize_async(self, text, language_code, voice_name, speaking_rate, output_path):
+        """Async version of synthesize."""
+        await asyncio.to_thread(self.synthesize, text, language_code, voice_name, speaking_rate, output_path)
+
+
+class ConnectionPool:
+    """
+    Keep-alive HTTP(S) connections to one service, shared by all threads.
+
+    Connections are opened on demand and put back after each response is
+    read, so only the first calls pay for the TCP and TLS handshakes. Up to
+    `max_idle` idle connections are kept. A request on a kept connection
+    that the server has meanwhile closed is retried once on a new one.
+
+    Args:
+        base_url: Service URL, e.g. 'https://translation.googleapis.com'
+        max_idle: Maximum number of idle connections kept open
+        timeout: Socket timeout in seconds
+    """
+
+    def __init__(self, base_url, max_idle=10, timeout=30):
+        parsed = urlparse(base_url)
+        self.scheme = parsed.scheme or 'https'
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=max_idle)
+
+    def request(self, method, path, body=None, headers=None):
+        """
+        Send a request and read the whole response.
+
+        Returns:
+            tuple: (status, headers dict, body bytes)
+        """
+        conn, reused = self._acquire()
+        try:
+            response = self._send(conn, method, path, body, headers)
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            if not reused:
+                raise
+            # The server closed an idle connection; try a fresh one
+            conn = self._connect()
+            response = self._send(conn, method, path, body, headers)
+        except Exception:
+            conn.close()
+            raise
+
+        status, response_headers, data, keep_alive = response
+        if keep_alive:
+            self._release(conn)
+        else:
+            conn.close()
+        return status, response_headers, data
+
+    @contextlib.contextmanager
+    def stream(self, method, path, headers=None):
+        """
+        Send a request and yield the response, for reading the body in pieces.
+
+        The connection goes back to the pool if the body was read to the
+        end, and is closed otherwise.
+
+        Yields:
+            http.client.HTTPResponse: The response
+        """
+        conn, reused = self._acquire()
+        try:
+            conn.request(method, path, headers=headers or {})
+            response = conn.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            if not reused:
+                raise
+            conn = self._connect()
+            conn.request(method, path, headers=headers or {})
+            response = conn.getresponse()
+        except Exception:
+            conn.close()
+            raise
+
+        try:
+            yield response
+        except BaseException:
+            conn.close()
+            raise
+        if response.isclosed() and not response.will_close:
+            self._release(conn)
+        else:
+            conn.close()
+
+    def warmup(self, connections=1):
+        """Open connections ahead of the first requests."""
+        for _ in range(connections):
+            conn = self._connect()
+            conn.connect()
+            self._release(conn)
+
+    def close(self):
+        """Close every idle connection."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            return self._connect(), False
+
+    def _release(self, conn):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _connect(self):
+        connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        return connection_class(self.host, self.port, timeout=self.timeout)
+
+    def _send(self, conn, method, path, body, headers):
+        conn.request(method, path, body=body, headers=headers or {})
+        response = conn.getresponse()
+        data = response.read()
+        return response.status, dict(response.getheaders()), data, not response.will_close
+
+
+class SimulatedBackend:
+    """
+    Mixin that makes a backend call take time and sometimes fail.
+
+    Args:
+        latency: Seconds per call, or a callable returning seconds per call
+            (e.g. a random distribution, see benchmark.parse_distribution)
+        failure_rate: Probability that a call raises BackendError
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+
+    def _simulate_call(self):
+        delay = self._next_delay()
+        if delay > 0:
+            time.sleep(delay)
+        self._maybe_fail()
+
+    async def _simulate_call_async(self):
+        delay = self._next_delay()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._maybe_fail()
+
+    def _next_delay(self):
+        return self.latency() if callable(self.latency) else self.latency
+
+    def _maybe_fail(self):
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise BackendError(f"Simulated {self.name} backend failure")
+
+
+class SimulatedTranscriptionBackend(SimulatedBackend, TranscriptionBackend):
+    """
+    Simulates transcribing audio to text.
+    In a real implementation, this would use a service like Google Cloud Speech-to-Text.
+    """
+
+    def __init__(self, latency=1.0, failure_rate=0.0):
+        super().__init__(latency, failure_rate)
+
+    def transcribe(self, audio_path, start=None, end=None):
+        self._simulate_call()
+        return self._transcript_for(audio_path)
+
+    async def transcribe_async(self, audio_path, start=None, end=None):
+        await self._simulate_call_async()
+        return self._transcript_for(audio_path)
+
+    def _transcript_for(self, audio_path):
+        # Create a simulated transcript based on the file name
+        file_name = os.path.basename(audio_path)
+        return (
+            f"This is a simulated transcript for {file_name}. "
+            "In a production environment, this would be the actual transcribed text from the audio file. "
+            "The transcript would contain all the spoken words from the original English content. "
+            "For demonstration purposes only."
+        )
+
+
+class SimulatedTranslationBackend(SimulatedBackend, TranslationBackend):
+    """
+    Simulates translating text.
+    In a real implementation, this would be one batched request to a service
+    like Google Cloud Translation.
+    """
+
+    def __init__(self, latency=1.0, failure_rate=0.0):
+        super().__init__(latency, failure_rate)
+
+    def translate(self, segments, target_language):
+        self._simulate_call()
+        return self._translations_for(segments, target_language)
+
+    async def translate_async(self, segments, target_language):
+        await self._simulate_call_async()
+        return self._translations_for(segments, target_language)
+
+    def _translations_for(self, segments, target_language):
+        # For demo purposes, mark each sentence as a simulated translation
+        return [f"[{target_language}] {segment}" for segment in segments]
+
+
+class SimulatedSpeechBackend(SimulatedBackend, SpeechBackend):
+    """
+    Simulates synthesizing speech.
+    In a real implementation, this would use a service like Google Cloud Text-to-Speech.
+    """
+
+    # Output format and a typical speaking pace
+    SAMPLE_RATE = 24000
+    CHARACTERS_PER_SECOND = 15
+
+    def __init__(self, latency=0.0, failure_rate=0.0):
+        super().__init__(latency, failure_rate)
+
+    def synthesize(self, text, language_code, voice_name, speaking_rate, output_path):
+        self._simulate_call()
+        self._write_audio(text, speaking_rate, output_path)
+
+    async def synthesize_async(self, text, language_code, voice_name, speaking_rate, output_path):
+        await self._simulate_call_async()
+        await asyncio.to_thread(self._write_audio, text, speaking_rate, output_path)
+
+    def _write_audio(self, text, speaking_rate, output_path):
+        # For demo purposes, write silence as long as the speech would be
+        seconds = len(text) / (self.CHARACTERS_PER_SECOND * speaking_rate)
+        with wave.open(output_path, 'wb') as out:
+            out.setnchannels(1)
+            out.setsampwidth(2)
+            out.setframerate(self.SAMPLE_RATE)
+            out.writeframes(b'\x00\x00' * int(seconds * self.SAMPLE_RATE))
@@ -0,0 +1,464 @@
+"""
+End-to-end benchmark of the translation pipeline.
+
+Drives concurrent jobs through the real job machinery (YouTubeTranslator,
+scheduler, job store, workspaces and caches) with simulated backends whose
+latency and failure rate are configurable, and reports throughput, latency
+percentiles, peak memory and peak temp-disk usage.
+
+Latencies are given as distribution specs (see parse_distribution), e.g.:
+
+    python benchmark.py --jobs 40 --concurrency 8 \\
+        --transcribe-latency lognormal:1.0,0.4 --translate-latency uniform:0.2,0.8 \\
+        --speech-latency exp:0.5 --failure-rate 0.01 --output results.json
+
+Pass --baseline with the results of a previous run to fail (exit status 1)
+when throughput, latency or resource usage regressed by more than
+--tolerance.
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import logging
+import asyncio
+import argparse
+import resource
+import tempfile
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from backends import SimulatedTranscriptionBackend, SimulatedTranslationBackend, SimulatedSpeechBackend
+from audio_processor import AudioProcessor
+from yt_translator import YouTubeTranslator
+from scheduler import SchedulerBusyError
+from job_store import TERMINAL_STATUSES
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Metrics compared against a baseline, and whether higher values are better
+_COMPARED_METRICS = {
+    'throughput': True,
+    'latency.end_to_end.p50': False,
+    'latency.end_to_end.p95': False,
+    'latency.end_to_end.p99': False,
+    'peak_rss_bytes': False,
+    'peak_temp_bytes': False,
+}
+
+
+def parse_distribution(spec):
+    """
+    Parse a latency distribution spec into a callable returning seconds.
+
+    Supported specs:
+        0.5 or const:0.5       - always 0.5s
+        uniform:LOW,HIGH       - uniform between LOW and HIGH
+        normal:MEAN,STDDEV     - normal, clamped at 0
+        lognormal:MEDIAN,SIGMA - log-normal with the given median
+        exp:MEAN               - exponential with the given mean
+
+    Raises:
+        ValueError: If the spec is malformed
+    """
+    kind, _, params = spec.partition(':')
+    if not params:
+        kind, params = 'const', kind
+    try:
+        values = [float(value) for value in params.split(',')]
+    except ValueError:
+        raise ValueError(f"Invalid distribution parameters: {spec}")
+
+    arity = {'const': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2, 'exp': 1}
+    if kind not in arity:
+        raise ValueError(f"Unknown distribution: {kind}")
+    if len(values) != arity[kind] or any(value < 0 for value in values):
+        raise ValueError(f"Invalid distribution parameters: {spec}")
+
+    if kind == 'const':
+        return lambda: values[0]
+    if kind == 'uniform':
+        return lambda: random.uniform(values[0], values[1])
+    if kind == 'normal':
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if kind == 'lognormal':
+        if values[0] == 0:
+            return lambda: 0.0
+        mu = math.log(values[0])
+        return lambda: random.lognormvariate(mu, values[1])
+    # exp
+    if values[0] == 0:
+        return lambda: 0.0
+    return lambda: random.expovariate(1 / values[0])
+
+
+def percentile(values, pct):
+    """Get the pct-th percentile of values, interpolating between ranks."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values):
+    """Summarize latency samples in seconds."""
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values),
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': max(values),
+    }
+
+
+class StageTimer:
+    """Collects per-stage call durations from any number of threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(list)
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self._samples[stage].append(seconds)
+
+    def timed(self, stage, func):
+        """Wrap func (plain or coroutine function) so that every call's duration is recorded under stage."""
+        if asyncio.iscoroutinefunction(func):
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.record(stage, time.perf_counter() - start)
+            return async_wrapper
+
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return wrapper
+
+    def samples(self):
+        with self._lock:
+            return {stage: list(values) for stage, values in self._samples.items()}
+
+
+class DiskUsageSampler:
+    """Background thread tracking the peak size of a directory tree."""
+
+    def __init__(self, root, interval=0.1):
+        self.root = root
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='disk-usage-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        total = 0
+        seen = set()
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                try:
+                    stat = os.lstat(os.path.join(directory, name))
+                except FileNotFoundError:
+                    continue
+                # Hardlinked cache entries only take space once
+                if (stat.st_dev, stat.st_ino) in seen:
+                    continue
+                seen.add((stat.st_dev, stat.st_ino))
+                total += stat.st_blocks * 512
+        self.peak_bytes = max(self.peak_bytes, total)
+
+
+class BenchmarkTranslator(YouTubeTranslator):
+    """YouTubeTranslator whose download has a configurable size and latency."""
+
+    def __init__(self, audio_processor, timer, download_bytes, download_latency):
+        super().__init__(audio_processor=audio_processor)
+        self.timer = timer
+        self.download_bytes = download_bytes
+        self.download_latency = download_latency
+
+    def _download_youtube_audio(self, youtube_url, work_dir=None, progress_callback=None, growing_file=None):
+        start = time.perf_counter()
+        video_id = self._extract_video_id(youtube_url)
+        audio_path = os.path.join(work_dir or self.temp_dir, f"{video_id}.mp3")
+
+        # Random bytes, so the file is not mistaken for MP3 and its duration
+        # is estimated from its size. The latency is spread over the blocks
+        # and the file preallocated, so it can be read while it downloads.
+        latency = self.download_latency()
+        blocks = max(1, -(-self.download_bytes // (1024 * 1024)))
+        with open(audio_path, 'wb') as audio_file:
+            audio_file.truncate(self.download_bytes)
+        if growing_file is not None:
+            growing_file.start(audio_path, self.download_bytes)
+        written = 0
+        with open(audio_path, 'r+b') as audio_file:
+            for _ in range(blocks):
+                block = min(self.download_bytes - written, 1024 * 1024)
+                time.sleep(latency / blocks)
+                audio_file.write(os.urandom(block))
+                audio_file.flush()
+                written += block
+                if growing_file is not None:
+                    growing_file.advance(written)
+
+        self.timer.record('download', time.perf_counter() - start)
+        video_info = {'title': f"Benchmark Video - {video_id}", 'author': 'Benchmark', 'length': 0}
+        return video_info, audio_path
+
+
+def peak_rss_bytes(who):
+    """Get the peak resident set size of this process or its children."""
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_job(translator, index, timer, poll_timeout=5):
+    """
+    Submit one job and wait for it to finish.
+
+    Returns:
+        tuple: (outcome, end-to-end seconds); outcome is 'completed',
+            'error' or 'rejected'
+    """
+    start = time.perf_counter()
+    # Distinct video IDs, so no job is served from the result cache
+    youtube_url = f"https://www.youtube.com/watch?v=bench{index:06d}"
+    try:
+        job_id = translator.start_translation_job(youtube_url)
+    except SchedulerBusyError:
+        return 'rejected', time.perf_counter() - start
+
+    version = None
+    while True:
+        status = translator.wait_for_job_change(job_id, version, poll_timeout)
+        if status['status'] in TERMINAL_STATUSES or status['status'] == 'not_found':
+            break
+        version = status.get('version')
+
+    if 'queue_wait' in status:
+        timer.record('queue', status['queue_wait'])
+    outcome = 'completed' if status['status'] == 'completed' else 'error'
+    return outcome, time.perf_counter() - start
+
+
+def run_benchmark(args):
+    """Run the benchmark described by parsed command-line args and return its results."""
+    timer = StageTimer()
+
+    transcription = SimulatedTranscriptionBackend(parse_distribution(args.transcribe_latency), args.failure_rate)
+    translation = SimulatedTranslationBackend(parse_distribution(args.translate_latency), args.failure_rate)
+    speech = SimulatedSpeechBackend(parse_distribution(args.speech_latency), args.failure_rate)
+    transcription.transcribe_async = timer.timed('transcribe', transcription.transcribe_async)
+    translation.translate_async = timer.timed('translate', translation.translate_async)
+    speech.synthesize_async = timer.timed('synthesize', speech.synthesize_async)
+
+    processor = AudioProcessor(
+        transcription_backend=transcription,
+        translation_backend=translation,
+        speech_backend=speech
+    )
+    translator = BenchmarkTranslator(processor, timer, args.download_bytes, parse_distribution(args.download_latency))
+    worker = translator.start_worker(args.workers)
+
+    sampler = DiskUsageSampler(os.path.join(tempfile.gettempdir(), 'yt_translator'), args.sample_interval)
+    sampler.start()
+
+    outcomes = defaultdict(int)
+    end_to_end = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix='bench-client') as clients:
+        futures = [clients.submit(run_job, translator, index, timer) for index in range(args.jobs)]
+        for future in futures:
+            outcome, seconds = future.result()
+            outcomes[outcome] += 1
+            if outcome == 'completed':
+                end_to_end.append(seconds)
+    wall_time = time.perf_counter() - start
+    worker.stop()
+    sampler.stop()
+
+    return {
+        'config': {
+            'jobs': args.jobs,
+            'concurrency': args.concurrency,
+            'workers': int(os.environ['YT_TRANSLATOR_WORKERS']),
+            'queue_size': int(os.environ['YT_TRANSLATOR_QUEUE_SIZE']),
+            'job_store': os.environ['YT_TRANSLATOR_JOB_STORE'],
+            'download_bytes': args.download_bytes,
+            'download_latency': args.download_latency,
+            'streaming': os.environ['YT_TRANSLATOR_STREAMING'] == '1',
+            'transcribe_latency': args.transcribe_latency,
+            'translate_latency': args.translate_latency,
+            'speech_latency': args.speech_latency,
+            'failure_rate': args.failure_rate,
+        },
+        'outcomes': {outcome: outcomes[outcome] for outcome in ('completed', 'error', 'rejected')},
+        'wall_time': wall_time,
+        'throughput': outcomes['completed'] / wall_time if wall_time else 0.0,
+        'latency': {
+            'end_to_end': summarize(end_to_end),
+            'stages': {stage: summarize(values) for stage, values in sorted(timer.samples().items())},
+        },
+        'peak_rss_bytes': peak_rss_bytes(resource.RUSAGE_SELF),
+        'peak_children_rss_bytes': peak_rss_bytes(resource.RUSAGE_CHILDREN),
+        'peak_temp_bytes': sampler.peak_bytes,
+        'translation_memory': processor.translation_memory.get_stats(),
+        'speech_cache': processor.speech_cache.get_stats(),
+        'throttles': {name: throttle.get_stats() for name, throttle in processor.throttles.items()},
+    }
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    Compare results to a baseline run.
+
+    Returns:
+        list: One message per metric that regressed by more than tolerance
+            (a fraction, e.g. 0.1 for 10%)
+    """
+    regressions = []
+    for metric, higher_is_better in _COMPARED_METRICS.items():
+        current, previous = results, baseline
+        for key in metric.split('.'):
+            current = (current or {}).get(key)
+            previous = (previous or {}).get(key)
+        if current is None or not previous:
+            continue
+
+        change = (current - previous) / previous
+        if (-change if higher_is_better else change) > tolerance:
+            regressions.append(f"{metric}: {previous:.4g} -> {current:.4g} ({change:+.1%})")
+    return regressions
+
+
+def print_report(results):
+    outcomes = results['outcomes']
+    print(f"Jobs: {outcomes['completed']} completed, {outcomes['error']} failed, "
+          f"{outcomes['rejected']} rejected in {results['wall_time']:.2f}s")
+    print(f"Throughput: {results['throughput']:.3f} jobs/s")
+    print(f"{'stage':<12} {'count':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    rows = [('end_to_end', results['latency']['end_to_end'])] + list(results['latency']['stages'].items())
+    for stage, summary in rows:
+        if not summary['count']:
+            continue
+        print(f"{stage:<12} {summary['count']:>6} {summary['p50']:>7.3f}s {summary['p95']:>7.3f}s "
+              f"{summary['p99']:>7.3f}s {summary['max']:>7.3f}s")
+    print(f"Peak RSS: {results['peak_rss_bytes'] / 1024 ** 2:.1f} MiB "
+          f"(children: {results['peak_children_rss_bytes'] / 1024 ** 2:.1f} MiB)")
+    print(f"Peak temp disk: {results['peak_temp_bytes'] / 1024 ** 2:.1f} MiB")
+    print(f"Translation memory hit ratio: {results['translation_memory']['hit_ratio']:.1%}")
+    for name, stats in results['throttles'].items():
+        print(f"{name} throttle: concurrency limit {stats['concurrency_limit']:g}, "
+              f"{stats['decreases']} decreases, {stats['rate_limited']} rate limited, {stats['errors']} errors")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the translation pipeline end to end.')
+    parser.add_argument('--jobs', type=int, default=20, help='Number of jobs to run (default: 20)')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='Number of clients submitting jobs at once (default: 8)')
+    parser.add_argument('--workers', type=int, default=4, help='Jobs the worker runs at once (default: 4)')
+    parser.add_argument('--queue-size', type=int, default=64, help='Scheduler queue size (default: 64)')
+    parser.add_argument('--job-store', choices=('sqlite', 'memory'), default='sqlite',
+                        help='Job store backend (default: sqlite)')
+    parser.add_argument('--download-bytes', type=int, default=1024 * 1024,
+                        help='Size of each simulated download (default: 1 MiB)')
+    parser.add_argument('--download-latency', default='2', help='Download latency distribution (default: 2)')
+    parser.add_argument('--no-streaming', action='store_true',
+                        help='Wait for each download to finish before translating')
+    parser.add_argument('--transcribe-latency', default='1', help='Transcription latency distribution (default: 1)')
+    parser.add_argument('--translate-latency', default='1', help='Translation latency distribution (default: 1)')
+    parser.add_argument('--speech-latency', default='0', help='Speech synthesis latency distribution (default: 0)')
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                        help='Probability that any backend call fails (default: 0)')
+    parser.add_argument('--sample-interval', type=float, default=0.1,
+                        help='Seconds between temp-disk usage samples (default: 0.1)')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--baseline', help='JSON results of a previous run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='Allowed regression against the baseline, as a fraction (default: 0.1)')
+    parser.add_argument('--keep-temp', action='store_true', help='Keep the temp directory after the run')
+    args = parser.parse_args(argv)
+
+    for name in ('download_latency', 'transcribe_latency', 'translate_latency', 'speech_latency'):
+        try:
+            parse_distribution(getattr(args, name))
+        except ValueError as e:
+            parser.error(f"--{name.replace('_', '-')}: {e}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    # Isolate every file the pipeline writes (job store, caches, workspaces)
+    temp_root = tempfile.mkdtemp(prefix='yt_translator_bench_')
+    tempfile.tempdir = temp_root
+    os.environ.update({
+        'YT_TRANSLATOR_WORKERS': str(args.workers),
+        'YT_TRANSLATOR_QUEUE_SIZE': str(args.queue_size),
+        'YT_TRANSLATOR_JOB_STORE': args.job_store,
+        'YT_TRANSLATOR_DB': os.path.join(temp_root, 'yt_translator', 'state', 'jobs.db'),
+        'YT_TRANSLATOR_STREAMING': '0' if args.no_streaming else '1',
+    })
+
+    try:
+        results = run_benchmark(args)
+    finally:
+        if args.keep_temp:
+            print(f"Temp files kept in {temp_root}")
+        else:
+            shutil.rmtree(temp_root, ignore_errors=True)
+
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare_to_baseline(results, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("No regressions against baseline.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
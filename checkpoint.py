@@ -0,0 +1,125 @@
+import os
+import json
+import shutil
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+class CheckpointStore:
+    """
+    Durable stage results of a job, kept in the job's workspace.
+
+    Each result is a small JSON file under `<work_dir>/checkpoints/<name>/`,
+    written to a temporary file, fsynced and renamed into place, so a crash
+    leaves either the whole checkpoint or none. Results that refer to files
+    (downloads, synthesized audio) store their paths relative to the
+    workspace; those files are fsynced before the checkpoint naming them is
+    written, and a checkpoint whose file has gone missing counts as absent.
+
+    Checkpoints are only valid for the inputs and settings that produced
+    them: if `fingerprint` differs from the one stored, every checkpoint
+    in the set is discarded.
+
+    Args:
+        work_dir: Job workspace directory
+        name: Name of this set of checkpoints
+        fingerprint: String identifying the inputs and settings
+    """
+
+    def __init__(self, work_dir, name, fingerprint):
+        self.work_dir = work_dir
+        self.directory = os.path.join(work_dir, 'checkpoints', name)
+        os.makedirs(self.directory, exist_ok=True)
+
+        fingerprint_path = os.path.join(self.directory, 'fingerprint')
+        try:
+            with open(fingerprint_path, encoding='utf-8') as fingerprint_file:
+                stored = fingerprint_file.read()
+        except FileNotFoundError:
+            stored = None
+        if stored != fingerprint:
+            if stored is not None:
+                logger.info(f"Discarding checkpoints in {self.directory}: inputs or settings changed")
+                shutil.rmtree(self.directory, ignore_errors=True)
+                os.makedirs(self.directory, exist_ok=True)
+            self._write_atomic(fingerprint_path, fingerprint)
+
+    def load(self, key):
+        """
+        Get a saved result.
+
+        Returns:
+            dict: The result, with file fields as absolute paths, or None
+                if there is no complete checkpoint for key
+        """
+        try:
+            with open(self._path(key), encoding='utf-8') as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            logger.warning(f"Ignoring unreadable checkpoint {key} in {self.directory}")
+            return None
+
+        values = checkpoint['values']
+        for field in checkpoint['files']:
+            path = os.path.join(self.work_dir, values[field])
+            if not os.path.isfile(path):
+                return None
+            values[field] = path
+        return values
+
+    def save(self, key, values, files=()):
+        """
+        Save a result durably.
+
+        Args:
+            key: Checkpoint name, e.g. 'chunk_3_translate'
+            values: JSON-serializable dict
+            files: Names of fields in values that are paths of files inside
+                the workspace
+        """
+        values = dict(values)
+        for field in files:
+            path = values[field]
+            _fsync_file(path)
+            values[field] = os.path.relpath(path, self.work_dir)
+        self._write_atomic(self._path(key), json.dumps({'values': values, 'files': list(files)}))
+
+    def discard(self):
+        """Delete every checkpoint in the set, once the work they saved is done."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _write_atomic(self, path, text):
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as temp_file:
+            temp_file.write(text)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.replace(temp_path, path)
+        # Make the rename itself durable
+        _fsync_directory(self.directory)
+
+
+def _fsync_file(path):
+    with open(path, 'rb') as stored_file:
+        os.fsync(stored_file.fileno())
+
+
+def _fsync_directory(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return  # Not supported on this platform
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
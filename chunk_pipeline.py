@@ -0,0 +1,115 @@
+import time
+import asyncio
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+class PipelineStage:
+    """
+    One step of a chunk pipeline.
+
+    Args:
+        name: Stage name, used in progress messages
+        func: Callable taking the previous stage's result for a chunk.
+            Coroutine functions are awaited on the event loop and plain
+            callables run on the executor.
+        concurrency: Maximum number of chunks in this stage at once
+        executor: Executor to run on (e.g. a shared ProcessPoolExecutor for
+            CPU-bound stages). If None, the stage runs on the event loop's
+            default executor. With a process pool, func and its arguments
+            must be picklable.
+    """
+
+    def __init__(self, name, func, concurrency=1, executor=None):
+        self.name = name
+        self.func = func
+        self.concurrency = max(1, concurrency)
+        self.executor = executor
+
+
+class ChunkPipeline:
+    """
+    Run every chunk through a sequence of stages, overlapping the stages.
+
+    Chunk N can be in the translate stage while chunk N+1 is being
+    transcribed, with each stage limited to its own concurrency. Each
+    stage admits waiting chunks in order, so early chunks finish early
+    instead of every chunk piling up in the first stage. Results come back
+    in chunk order regardless of completion order.
+
+    Args:
+        stages: List of PipelineStage
+        progress_callback: Optional callable(fraction, message)
+        timing_callback: Optional callable(stage name, seconds), called
+            with the time each chunk spent in each stage
+    """
+
+    def __init__(self, stages, progress_callback=None, timing_callback=None):
+        self.stages = stages
+        self.progress_callback = progress_callback
+        self.timing_callback = timing_callback
+
+    async def run_async(self, chunks):
+        """
+        Process chunks through all stages on the running event loop.
+
+        Each chunk moves through the stages as its own task, with a
+        semaphore per stage enforcing the stage's concurrency, so thousands
+        of chunks can wait on I/O-bound stages without a thread each.
+
+        Args:
+            chunks: List of inputs for the first stage
+
+        Returns:
+            list: Output of the last stage for each chunk, in input order
+        """
+        num_chunks = len(chunks)
+        num_stages = len(self.stages)
+        results = [None] * num_chunks
+        if num_chunks == 0:
+            return results
+
+        loop = asyncio.get_running_loop()
+        limits = [asyncio.Semaphore(stage.concurrency) for stage in self.stages]
+        steps_done = 0
+        chunks_done = 0
+
+        async def run_chunk(chunk_index, value):
+            nonlocal steps_done, chunks_done
+            for stage_index, stage in enumerate(self.stages):
+                async with limits[stage_index]:
+                    started = time.perf_counter()
+                    if asyncio.iscoroutinefunction(stage.func):
+                        value = await stage.func(value)
+                    else:
+                        value = await loop.run_in_executor(stage.executor, stage.func, value)
+                    elapsed = time.perf_counter() - started
+                steps_done += 1
+
+                if stage_index + 1 == num_stages:
+                    results[chunk_index] = value
+                    chunks_done += 1
+
+                if self.timing_callback:
+                    self.timing_callback(stage.name, elapsed)
+                if self.progress_callback:
+                    self.progress_callback(
+                        steps_done / (num_chunks * num_stages),
+                        f"Processed {chunks_done}/{num_chunks} chunks "
+                        f"(chunk {chunk_index + 1}: {stage.name} done)..."
+                    )
+
+        tasks = [asyncio.ensure_future(run_chunk(index, chunk)) for index, chunk in enumerate(chunks)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            # Let cancelled chunks unwind before reporting the failure
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        return results
@@ -0,0 +1,155 @@
+import os
+import json
+import uuid
+import time
+import logging
+import threading
+from file_transfer import copy_file
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+class DiskCache:
+    """
+    Content-addressed file cache with size-based LRU eviction.
+
+    Each entry is a single file named `<prefix><key><suffix>` inside
+    `directory`, with an optional JSON metadata sidecar next to it. Entries
+    are written to a temporary name and renamed into place, so readers never
+    see a partially written file. The file's atime doubles as its last-used
+    time: hits touch the entry, and eviction removes the least recently used
+    entries until the cache fits in `max_bytes`. The mtime is left alone so
+    that it keeps identifying the content (e.g. for download ETags).
+
+    Other processes may write to the same directory, so the running size
+    total kept here is only a trigger; eviction always rescans the directory.
+    """
+
+    def __init__(self, directory, max_bytes, prefix='cached_', suffix=''):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.prefix = prefix
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        self._approx_bytes = None
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path_for(self, key):
+        """Get the path an entry with the given key is stored at."""
+        return os.path.join(self.directory, f"{self.prefix}{key}{self.suffix}")
+
+    def get(self, key):
+        """
+        Look up an entry.
+
+        Returns:
+            str: Path to the cached file, or None on a miss
+        """
+        path = self.path_for(key)
+        try:
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except FileNotFoundError:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return path
+
+    def get_stats(self):
+        """Get hit/miss/eviction counters for this process."""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def get_metadata(self, key):
+        """Get the metadata stored with an entry, or an empty dict."""
+        try:
+            with open(self.path_for(key) + '.json', 'r') as meta_file:
+                return json.load(meta_file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def put(self, key, source_path, metadata=None):
+        """
+        Store a copy of a file under the given key.
+
+        Args:
+            key: Cache key
+            source_path: File to store
+            metadata: Optional JSON-serializable dict stored alongside
+
+        Returns:
+            str: Path to the cached file
+        """
+        path = self.path_for(key)
+
+        if metadata is not None:
+            self._write_atomic(path + '.json', lambda tmp: self._dump_json(tmp, metadata))
+        self._write_atomic(path, lambda tmp: copy_file(source_path, tmp, allow_link=True))
+
+        with self._lock:
+            if self._approx_bytes is not None:
+                self._approx_bytes += os.path.getsize(path)
+            needs_eviction = self._approx_bytes is None or self._approx_bytes > self.max_bytes
+        if needs_eviction:
+            self.evict()
+        return path
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits its budget."""
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if not self._is_entry(entry.name):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_atime, stat.st_size, entry.path))
+                total += stat.st_size
+
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+                self._stats['evictions'] += 1
+                logger.debug(f"Evicted cache entry {os.path.basename(path)}")
+            self._approx_bytes = total
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _is_entry(self, name):
+        return (name.startswith(self.prefix) and name.endswith(self.suffix)
+                and not name.endswith('.json') and '.tmp-' not in name)
+
+    def _remove(self, path):
+        for stale in (path, path + '.json'):
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass
+
+    def _write_atomic(self, path, write):
+        """Write a file through a temporary name, then rename it into place."""
+        tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _dump_json(self, path, data):
+        with open(path, 'w') as out:
+            json.dump(data, out)
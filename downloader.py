@@ -0,0 +1,466 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+import contextlib
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, urljoin
+from backends import ConnectionPool
+from checkpoint import CheckpointStore
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Bytes read from a response at a time; bounds memory use per connection
+_READ_SIZE = 256 * 1024
+
+# Redirects followed before giving up
+_MAX_REDIRECTS = 5
+
+
+class DownloadError(Exception):
+    """Raised when a download fails for good."""
+
+
+class _TransientError(Exception):
+    """A failure worth retrying: a dropped connection, a short body or a 5xx response."""
+
+
+class GrowingFile:
+    """
+    A downloaded file that can be read while the download is still running.
+
+    The downloader preallocates the file at its full size, calls start() and
+    then advance() as the part of the file on disk without gaps grows, and
+    finish() or fail() at the end. Readers wait for the bytes they need with
+    wait(), or wait_async() on an event loop, and must not read past
+    `available`: the rest of the file is still zeros. cancel() asks the
+    downloader to give up, e.g. once the reader has failed.
+    """
+
+    def __init__(self):
+        self.path = None
+        self.size = None
+        self.available = 0
+        self.error = None
+        self.cancelled = False
+        self._condition = threading.Condition()
+        self._waiters = []
+
+    @property
+    def complete(self):
+        return self.size is not None and self.available >= self.size
+
+    def start(self, path, size):
+        """Announce the file, preallocated at size bytes."""
+        with self._condition:
+            self.path = path
+            self.size = size
+            self._notify()
+
+    def advance(self, available):
+        """Record that the first `available` bytes are on disk."""
+        with self._condition:
+            if available > self.available:
+                self.available = available
+                self._notify()
+
+    def finish(self, path):
+        """Record that the whole file is on disk, e.g. one reused from an earlier download."""
+        with self._condition:
+            self.path = path
+            self.size = self.available = os.path.getsize(path)
+            self._notify()
+
+    def fail(self, error):
+        """Record that the download failed; waiting readers get a DownloadError."""
+        with self._condition:
+            self.error = error
+            self._notify()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def wait(self, size):
+        """
+        Block until the first size bytes are on disk (all of them if the file is smaller).
+
+        Raises:
+            DownloadError: If the download failed
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._ready(size))
+            if self.error is not None:
+                raise DownloadError(f"Download failed: {str(self.error)}")
+
+    async def wait_async(self, size):
+        """Wait for the first size bytes without blocking the event loop (see wait)."""
+        loop = asyncio.get_running_loop()
+        with self._condition:
+            if not self._ready(size):
+                future = loop.create_future()
+                self._waiters.append((size, loop, future))
+            else:
+                future = None
+        if future is not None:
+            await future
+        if self.error is not None:
+            raise DownloadError(f"Download failed: {str(self.error)}")
+
+    def iter_bytes(self, block_size=256 * 1024):
+        """
+        Read the file from the start, block by block, as it arrives.
+
+        Yields:
+            bytes: The next block_size bytes (fewer at the end of the file)
+
+        Raises:
+            DownloadError: If the download failed
+        """
+        self.wait(0)
+        with open(self.path, 'rb') as source:
+            offset = 0
+            while offset < self.size:
+                end = min(offset + block_size, self.size)
+                self.wait(end)
+                yield source.read(end - offset)
+                offset = end
+
+    def _ready(self, size):
+        return self.error is not None or (self.path is not None and self.available >= min(size, self.size))
+
+    def _notify(self):
+        # Called with the condition held, from the download threads
+        self._condition.notify_all()
+        waiting = []
+        for size, loop, future in self._waiters:
+            if self._ready(size):
+                loop.call_soon_threadsafe(_resolve, future)
+            else:
+                waiting.append((size, loop, future))
+        self._waiters = waiting
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class SegmentedDownloader:
+    """
+    Downloads a file over HTTP with parallel Range requests.
+
+    The file is split into segments of `segment_size` bytes, fetched over
+    up to `connections` keep-alive connections at once and written straight
+    to their offsets in a file preallocated at full size, so nothing is
+    buffered beyond one read per connection and nothing is copied at the
+    end.
+
+    Each finished segment is fsynced and recorded in a CheckpointStore next
+    to the output file. A download that fails or is interrupted resumes
+    with the missing segments only, provided the server still reports the
+    same size and validator (ETag or Last-Modified); a failed segment is
+    retried from the last byte received. Servers without Range support are
+    downloaded in a single stream, without resume.
+
+    With a GrowingFile, the file can be read while it downloads: segments
+    are fetched roughly in file order, and the file is reported readable up
+    to the first byte not yet received.
+
+    Args:
+        connections: Maximum parallel connections
+            (default: YT_TRANSLATOR_DOWNLOAD_CONNECTIONS or 4)
+        segment_size: Bytes per segment
+            (default: YT_TRANSLATOR_DOWNLOAD_SEGMENT_BYTES or 8 MiB)
+        max_retries: Retries per segment after transient failures
+        timeout: Socket timeout in seconds
+    """
+
+    def __init__(self, connections=None, segment_size=None, max_retries=3, timeout=30):
+        self.connections = connections or int(os.environ.get('YT_TRANSLATOR_DOWNLOAD_CONNECTIONS', 4))
+        self.segment_size = segment_size or int(os.environ.get('YT_TRANSLATOR_DOWNLOAD_SEGMENT_BYTES', 8 * 1024 ** 2))
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._pools = {}
+        self._pools_lock = threading.Lock()
+
+    def download(self, url, output_path, progress_callback=None, growing_file=None):
+        """
+        Download url to output_path, resuming an earlier partial download.
+
+        Args:
+            url: HTTP(S) URL of the file
+            output_path: File to write
+            progress_callback: Optional callable(bytes_done, total_bytes),
+                called from the download threads as data arrives; total_bytes
+                is None if the server does not report a size
+            growing_file: Optional GrowingFile to report the bytes on disk
+                to; cancelling it stops the download with a DownloadError
+
+        Returns:
+            int: Size of the file in bytes
+
+        Raises:
+            DownloadError: If the download fails
+        """
+        progress = _Progress(progress_callback)
+        try:
+            with self._open(url, {'Range': 'bytes=0-0'}) as (url, response):
+                if response.status != 206:
+                    # No Range support: this response is the whole file
+                    return self._download_stream(response, output_path, progress, growing_file)
+                size = _content_range_size(response.getheader('Content-Range'))
+                validator = response.getheader('ETag') or response.getheader('Last-Modified')
+                response.read()
+        except (OSError, http.client.HTTPException, _TransientError) as e:
+            raise DownloadError(f"Could not reach {urlparse(url).netloc}: {str(e)}") from e
+
+        if size is None:
+            raise DownloadError("The server did not report the file size")
+        return self._download_segments(url, output_path, size, validator, progress, growing_file)
+
+    def close(self):
+        """Close every kept-alive connection."""
+        with self._pools_lock:
+            for pool in self._pools.values():
+                pool.close()
+            self._pools.clear()
+
+    def _download_segments(self, url, output_path, size, validator, progress, growing_file):
+        segments = [(start, min(start + self.segment_size, size) - 1) for start in range(0, size, self.segment_size)]
+
+        # Without a validator there is no telling whether a partial file is still current
+        fingerprint = json.dumps([size, validator] if validator else [size, url])
+        checkpoints = CheckpointStore(os.path.dirname(output_path) or '.',
+                                      f"download_{os.path.basename(output_path)}", fingerprint)
+        saved = checkpoints.load('segments')
+        resumable = saved is not None and os.path.isfile(output_path) and os.path.getsize(output_path) == size
+        done = set(saved['done']) if resumable else set()
+        if done:
+            logger.info(f"Resuming download of {output_path}: {len(done)} of {len(segments)} segments on disk")
+            progress.add(sum(end - start + 1 for index, (start, end) in enumerate(segments) if index in done))
+        else:
+            _preallocate(output_path, size)
+        progress.total = size
+        progress.report()
+        prefix = _Prefix(segments, done, growing_file)
+        if growing_file is not None:
+            growing_file.start(output_path, size)
+            prefix.report()
+
+        done_lock = threading.Lock()
+
+        def fetch(index):
+            start, end = segments[index]
+            self._fetch_segment(url, output_path, start, end, validator, progress, growing_file,
+                                lambda offset: prefix.update(index, offset))
+            with done_lock:
+                done.add(index)
+                checkpoints.save('segments', {'done': sorted(done)})
+
+        missing = [index for index in range(len(segments)) if index not in done]
+        with ThreadPoolExecutor(max_workers=self.connections, thread_name_prefix='download') as executor:
+            futures = [executor.submit(fetch, index) for index in missing]
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+        checkpoints.discard()
+        return size
+
+    def _fetch_segment(self, url, output_path, start, end, validator, progress, growing_file=None,
+                       written_callback=None):
+        """
+        Fetch bytes start..end into output_path, retrying from the last byte received.
+
+        written_callback, if given, is called with the offset after each write.
+        """
+        offset = start
+        headers = {'If-Range': validator} if validator else {}
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self._open(url, {**headers, 'Range': f"bytes={offset}-{end}"}) as (_, response):
+                    if response.status == 200:
+                        raise DownloadError("The file changed on the server during the download")
+                    if response.status != 206:
+                        raise DownloadError(f"Unexpected HTTP status {response.status} for a byte range")
+                    with open(output_path, 'r+b') as output:
+                        output.seek(offset)
+                        while offset <= end:
+                            _check_cancelled(growing_file)
+                            data = response.read(min(_READ_SIZE, end - offset + 1))
+                            if not data:
+                                raise _TransientError(f"connection closed at byte {offset}")
+                            output.write(data)
+                            offset += len(data)
+                            progress.add(len(data))
+                            if written_callback is not None:
+                                # Written data is readable by other file handles before the fsync
+                                output.flush()
+                                written_callback(offset)
+                        # The segment must be on disk before its checkpoint is
+                        output.flush()
+                        os.fsync(output.fileno())
+                return
+            except (OSError, http.client.HTTPException, _TransientError) as e:
+                if attempt == self.max_retries:
+                    raise DownloadError(f"Bytes {start}-{end} failed after {attempt + 1} attempts: {str(e)}") from e
+                logger.warning(f"Retrying bytes {offset}-{end} of {output_path}: {str(e)}")
+                time.sleep(min(2 ** attempt, 10))
+
+    def _download_stream(self, response, output_path, progress, growing_file=None):
+        if response.status != 200:
+            raise DownloadError(f"Unexpected HTTP status {response.status}")
+        length = response.getheader('Content-Length')
+        progress.total = int(length) if length is not None else None
+        # Without a size the file cannot be preallocated, so it is only readable once complete
+        streaming = growing_file is not None and progress.total is not None
+        if streaming:
+            _preallocate(output_path, progress.total)
+            growing_file.start(output_path, progress.total)
+        size = 0
+        with open(output_path, 'r+b' if streaming else 'wb') as output:
+            while True:
+                _check_cancelled(growing_file)
+                data = response.read(_READ_SIZE)
+                if not data:
+                    break
+                output.write(data)
+                size += len(data)
+                progress.add(len(data))
+                if streaming:
+                    output.flush()
+                    growing_file.advance(min(size, progress.total))
+        if progress.total is not None and size != progress.total:
+            raise DownloadError(f"Download ended after {size} of {progress.total} bytes")
+        return size
+
+    @contextlib.contextmanager
+    def _open(self, url, headers):
+        """
+        GET url with headers, following redirects.
+
+        Yields:
+            tuple: (final url, response)
+
+        Raises:
+            _TransientError: For 5xx responses
+            DownloadError: For other error responses
+        """
+        for _ in range(_MAX_REDIRECTS + 1):
+            parsed = urlparse(url)
+            target = parsed.path or '/'
+            if parsed.query:
+                target += f"?{parsed.query}"
+            with self._get_pool(parsed).stream('GET', target, headers) as response:
+                if response.status in (301, 302, 303, 307, 308) and response.getheader('Location'):
+                    response.read()
+                    url = urljoin(url, response.getheader('Location'))
+                    continue
+                if response.status >= 400:
+                    response.read()
+                    if response.status >= 500:
+                        raise _TransientError(f"HTTP {response.status}")
+                    raise DownloadError(f"HTTP {response.status} from {parsed.netloc}")
+                yield url, response
+                return
+        raise DownloadError(f"Too many redirects from {url}")
+
+    def _get_pool(self, parsed):
+        origin = (parsed.scheme, parsed.netloc)
+        with self._pools_lock:
+            if origin not in self._pools:
+                self._pools[origin] = ConnectionPool(f"{parsed.scheme}://{parsed.netloc}", self.connections, self.timeout)
+            return self._pools[origin]
+
+
+class _Progress:
+    """Thread-safe byte counter that reports to a progress callback."""
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.done = 0
+        self.total = None
+        self._lock = threading.Lock()
+
+    def add(self, count):
+        with self._lock:
+            self.done += count
+            self._report()
+
+    def report(self):
+        with self._lock:
+            self._report()
+
+    def _report(self):
+        # Under the lock, so reports never go backwards
+        if self.callback is not None:
+            self.callback(self.done, self.total)
+
+
+class _Prefix:
+    """Tracks how much of a segmented download is on disk without gaps, for a GrowingFile."""
+
+    def __init__(self, segments, done, growing_file):
+        self.segments = segments
+        self.growing_file = growing_file
+        # Next offset to write per segment; segments not listed have nothing yet
+        self._offsets = {index: segments[index][1] + 1 for index in done}
+        self._first_incomplete = 0
+        self._lock = threading.Lock()
+
+    def update(self, index, offset):
+        if self.growing_file is None:
+            return
+        with self._lock:
+            self._offsets[index] = offset
+            self._report()
+
+    def report(self):
+        with self._lock:
+            self._report()
+
+    def _report(self):
+        segments = self.segments
+        while (self._first_incomplete < len(segments)
+               and self._offsets.get(self._first_incomplete) == segments[self._first_incomplete][1] + 1):
+            self._first_incomplete += 1
+        if self._first_incomplete == len(segments):
+            available = segments[-1][1] + 1 if segments else 0
+        else:
+            start = segments[self._first_incomplete][0]
+            available = self._offsets.get(self._first_incomplete, start)
+        self.growing_file.advance(available)
+
+
+def _check_cancelled(growing_file):
+    if growing_file is not None and growing_file.cancelled:
+        raise DownloadError("Download cancelled")
+
+
+def _content_range_size(content_range):
+    """Get the total size from a Content-Range header such as 'bytes 0-0/1234'."""
+    if not content_range or '/' not in content_range:
+        return None
+    total = content_range.rsplit('/', 1)[1].strip()
+    return int(total) if total.isdigit() else None
+
+
+def _preallocate(path, size):
+    """Create path at its full size, reserving the disk space where the platform allows."""
+    with open(path, 'wb') as output:
+        if hasattr(os, 'posix_fallocate') and size:
+            try:
+                os.posix_fallocate(output.fileno(), 0, size)
+                return
+            except OSError:
+                pass  # Not supported by this filesystem
+        output.truncate(size)
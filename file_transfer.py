@@ -0,0 +1,112 @@
+import os
+import errno
+import shutil
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# ioctl request number for FICLONE (copy-on-write clone) on Linux
+FICLONE = 0x40049409
+
+# Buffer size for the streaming fallback; bounds memory use per copy
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Errors meaning "this strategy is not supported here", as opposed to real I/O failures
+_UNSUPPORTED_ERRNOS = {
+    errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP,
+    errno.ENOTTY, errno.EPERM, errno.EBADF, errno.ENOTSUP
+}
+
+
+def copy_file(source_path, dest_path, allow_link=False):
+    """
+    Materialize a copy of a file without reading it into Python memory.
+
+    Tries the cheapest strategy first and falls back on failure:
+    reflink (copy-on-write clone), hard link (only if allow_link is set),
+    copy_file_range, sendfile, and finally a fixed-buffer streaming copy.
+    Peak memory use is bounded by COPY_BUFFER_SIZE whatever the file size.
+
+    Args:
+        source_path: File to copy
+        dest_path: Destination path; must not be in use by another writer
+        allow_link: Allow a hard link, sharing the inode with the source.
+            Only safe when neither file is modified in place afterwards.
+
+    Returns:
+        str: Name of the strategy that produced the copy
+    """
+    if allow_link:
+        try:
+            os.link(source_path, dest_path)
+            return 'hardlink'
+        except FileExistsError:
+            os.remove(dest_path)
+            try:
+                os.link(source_path, dest_path)
+                return 'hardlink'
+            except OSError:
+                pass
+        except OSError:
+            pass
+
+    with open(source_path, 'rb') as source_file, open(dest_path, 'wb') as dest_file:
+        size = os.fstat(source_file.fileno()).st_size
+
+        for name, strategy in _STRATEGIES:
+            try:
+                strategy(source_file.fileno(), dest_file.fileno(), size)
+                return name
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED_ERRNOS:
+                    raise
+                logger.debug(f"{name} not supported for {dest_path}: {str(e)}")
+                # Start the next strategy from a clean slate
+                os.ftruncate(dest_file.fileno(), 0)
+                os.lseek(dest_file.fileno(), 0, os.SEEK_SET)
+                os.lseek(source_file.fileno(), 0, os.SEEK_SET)
+
+        shutil.copyfileobj(source_file, dest_file, COPY_BUFFER_SIZE)
+        return 'stream'
+
+
+def _reflink(source_fd, dest_fd, size):
+    if fcntl is None:
+        raise OSError(errno.ENOSYS, 'reflink not available')
+    fcntl.ioctl(dest_fd, FICLONE, source_fd)
+
+
+def _copy_file_range(source_fd, dest_fd, size):
+    if not hasattr(os, 'copy_file_range'):
+        raise OSError(errno.ENOSYS, 'copy_file_range not available')
+    copied = 0
+    while copied < size:
+        sent = os.copy_file_range(source_fd, dest_fd, size - copied)
+        if sent == 0:
+            break
+        copied += sent
+
+
+def _sendfile(source_fd, dest_fd, size):
+    if not hasattr(os, 'sendfile'):
+        raise OSError(errno.ENOSYS, 'sendfile not available')
+    copied = 0
+    while copied < size:
+        sent = os.sendfile(dest_fd, source_fd, copied, size - copied)
+        if sent == 0:
+            break
+        copied += sent
+
+
+_STRATEGIES = (
+    ('reflink', _reflink),
+    ('copy_file_range', _copy_file_range),
+    ('sendfile', _sendfile),
+)
@@ -0,0 +1,17 @@
+import os
+
+# Status long-polls and event streams hold a request open for up to 25 s
+# (MAX_STATUS_WAIT in app.py), so each worker serves requests on a thread
+# pool instead of gunicorn's single sync thread. app.py lets held requests
+# take at most three quarters of the threads, so the rest stay free for
+# /translate and /download.
+worker_class = 'gthread'
+workers = int(os.environ.get('YT_TRANSLATOR_WEB_WORKERS', 1))
+threads = int(os.environ.get('YT_TRANSLATOR_WEB_THREADS', 32))
+
+
+def post_fork(server, worker):
+    """Build the worker's services before it takes requests (set YT_TRANSLATOR_WARMUP=0 to skip)."""
+    if os.environ.get('YT_TRANSLATOR_WARMUP', '1') != '0':
+        import services
+        services.warmup()
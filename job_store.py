@@ -0,0 +1,982 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import tempfile
+import threading
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Fields stored as real columns; everything else goes into the JSON data blob
+_COLUMNS = ('status', 'youtube_url', 'cache_key', 'progress', 'message',
+            'priority', 'tenant', 'lease_owner', 'lease_expires', 'attempts', 'started_at', 'finished_at')
+
+# Statuses after which a job no longer changes
+TERMINAL_STATUSES = ('completed', 'error')
+
+# Completed runs averaged for queue wait estimates
+_RECENT_RUNS = 20
+
+# Writes to a job are serialized by one of this many locks, picked by job ID
+_WRITE_LOCK_STRIPES = 64
+
+
+class JobStore:
+    """
+    Base class for job state storage.
+
+    Subclasses implement the raw read/write primitives; this class adds
+    batching of progress updates so that frequent progress ticks are
+    coalesced into at most one write per `flush_interval` seconds per job.
+    Progress is always written by a background flusher thread, never by the
+    caller, so reporting progress from the event loop does not block it on
+    the store.
+    Any other update to a job flushes its pending progress first, and the
+    flusher and updates write a job under the same lock, so status
+    transitions are never reordered behind a buffered tick. A tick never
+    overwrites a finished job, and is only written while the worker that
+    reported it still holds the job's lease.
+
+    Every write bumps the job's `version`, which lets readers wait for the
+    next change instead of polling the full record.
+
+    The store is also the job queue. Jobs with status 'queued' are claimed
+    by workers (see worker.Worker), lowest `priority` first. Within a
+    priority the queue is shared fairly between tenants: the next job comes
+    from the tenant with the fewest running jobs, oldest first, so one
+    tenant's large batch cannot hold back everyone else. A claim is a lease:
+    the worker must renew it before `lease_expires`. If the worker dies,
+    the lease runs out and another worker reclaims the job, up to
+    `max_attempts` claims per job.
+
+    Batches group jobs submitted together; a batch record lists its items
+    and the job running each of them.
+    """
+
+    # How often wait_for_change re-reads a job when the store cannot notify
+    poll_interval = 0.25
+
+    def __init__(self, flush_interval=1.0):
+        self.flush_interval = flush_interval
+        self._pending = {}
+        # Lease owner each pending tick is written for
+        self._pending_owners = {}
+        self._last_flush = {}
+        # When each job's pending progress is due to be written
+        self._due = {}
+        self._pending_lock = threading.Lock()
+        self._flush_wakeup = threading.Condition(self._pending_lock)
+        self._flusher = None
+        self._write_locks = [threading.Lock() for _ in range(_WRITE_LOCK_STRIPES)]
+
+    def create(self, job_id, fields):
+        """Create a new job record."""
+        raise NotImplementedError
+
+    def create_or_attach(self, job_id, fields):
+        """
+        Create a job unless one with the same cache key is still running.
+
+        The check and the insert happen atomically, so concurrent submissions
+        of the same work all end up sharing a single job.
+
+        Returns:
+            str: ID of the job that owns the work (job_id if it was created)
+        """
+        raise NotImplementedError
+
+    def requeue(self, job_id, fields):
+        """
+        Move a failed job back to the queue, writing fields (which set its status).
+
+        Like create_or_attach, this is atomic: if another job with the same
+        cache key is running, that job owns the work and nothing changes.
+
+        Returns:
+            str: ID of the job that owns the work (job_id if it was requeued),
+                or None if the job does not exist or has not failed
+        """
+        raise NotImplementedError
+
+    def claim(self, worker_id, lease_seconds, max_attempts):
+        """
+        Lease the next job to run: an expired lease first, else the next
+        queued job in priority and tenant-fair order.
+
+        A job whose lease has already expired max_attempts times is marked
+        'error' instead of being claimed again, so a job that kills its
+        worker cannot take down the whole fleet.
+
+        Returns:
+            tuple: (job_id, job fields), or None if there is nothing to run
+        """
+        raise NotImplementedError
+
+    def renew_leases(self, worker_id, lease_seconds):
+        """
+        Extend every lease a worker holds.
+
+        Returns:
+            set: IDs of the jobs the worker still holds
+        """
+        raise NotImplementedError
+
+    def release(self, job_id, worker_id, expire=False):
+        """
+        Give up a worker's lease on a job once the worker is done with it.
+
+        Args:
+            job_id: Job ID
+            worker_id: Worker holding the lease
+            expire: Leave the job to be reclaimed at once (for jobs that did
+                not finish, e.g. on shutdown) instead of marking it finished
+        """
+        raise NotImplementedError
+
+    def heartbeat(self, worker_id, concurrency, active):
+        """Record that a worker is alive, with its number of job slots and running jobs."""
+        raise NotImplementedError
+
+    def remove_worker(self, worker_id):
+        """Forget a worker that is shutting down."""
+        raise NotImplementedError
+
+    def queue_stats(self, worker_timeout):
+        """
+        Get the state of the queue and of the worker fleet.
+
+        Args:
+            worker_timeout: Seconds without a heartbeat after which a worker is considered gone
+
+        Returns:
+            dict: queue_depth, active_jobs, worker_slots and avg_run_time
+                (mean seconds of recent completed runs, or None)
+        """
+        raise NotImplementedError
+
+    def queue_position(self, job_id):
+        """
+        Estimate a queued job's place in the queue.
+
+        Jobs of a higher priority all come first. Within the job's priority,
+        tenants take turns, so a job that is its tenant's k-th waits for up
+        to k jobs of every other tenant.
+
+        Returns:
+            int: 1-based position, or None if the job is not waiting
+        """
+        raise NotImplementedError
+
+    def create_batch(self, batch_id, fields):
+        """
+        Create a batch record.
+
+        Args:
+            batch_id: Batch ID
+            fields: Batch fields, including `items`: a list of dicts with
+                at least `youtube_url` and `job_id`
+        """
+        raise NotImplementedError
+
+    def get_batch(self, batch_id):
+        """
+        Get a batch record.
+
+        Returns:
+            dict: Batch fields, or None if the batch does not exist
+        """
+        raise NotImplementedError
+
+    def get_many(self, job_ids):
+        """
+        Get several job records at once.
+
+        Returns:
+            dict: Job fields by job ID, for the jobs that exist
+        """
+        jobs = {}
+        for job_id in job_ids:
+            job = self.get(job_id)
+            if job is not None:
+                jobs[job_id] = job
+        return jobs
+
+    def delete(self, job_id):
+        """Delete a job record."""
+        with self._write_lock(job_id):
+            self._take_pending(job_id)
+            self._delete(job_id)
+
+    def get(self, job_id):
+        """
+        Get a job record.
+
+        Returns:
+            dict: Job fields, or None if the job does not exist
+        """
+        job = self._read(job_id)
+        if job is None:
+            return None
+
+        # Reads in this process see progress that has not been written yet
+        with self._pending_lock:
+            pending = self._pending.get(job_id)
+        if pending and job.get('status') not in TERMINAL_STATUSES:
+            job.update(pending)
+        return job
+
+    def find(self, status=None, youtube_url=None, cache_key=None, limit=None):
+        """
+        Find jobs by status, YouTube URL and/or cache key, newest first.
+
+        Returns:
+            list: Matching job records
+        """
+        raise NotImplementedError
+
+    def wait_for_change(self, job_id, version, timeout):
+        """
+        Block until a job's version differs from `version` or the timeout expires.
+
+        Args:
+            job_id: Job ID
+            version: Last version the caller has seen
+            timeout: Maximum time to wait in seconds
+
+        Returns:
+            dict: The job as of return time, or None if it does not exist
+        """
+        deadline = time.time() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.time()
+            if job is None or job.get('version') != version or remaining <= 0:
+                return job
+            time.sleep(min(self.poll_interval, remaining))
+
+    def update(self, job_id, owner=None, **fields):
+        """
+        Write fields to a job immediately, flushing any pending progress.
+
+        Args:
+            job_id: Job ID
+            owner: If given, write only if this worker still holds the job's
+                lease, so a worker that lost a job cannot overwrite the
+                results of the worker that reclaimed it
+            **fields: Job fields to write
+
+        Returns:
+            bool: Whether the job was written
+        """
+        with self._write_lock(job_id):
+            pending, pending_owner = self._take_pending(job_id)
+            if pending and pending_owner == owner:
+                fields = {**pending, **fields}
+            elif pending:
+                self._write(job_id, pending, pending_owner, unfinished_only=True)
+            return self._write(job_id, fields, owner)
+
+    def update_progress(self, job_id, progress, message, owner=None):
+        """
+        Record a progress tick without waiting for the store.
+
+        Only the latest tick is kept; the flusher thread writes it at most
+        once per flush interval. Reads in this process see it at once.
+
+        Args:
+            job_id: Job ID
+            progress: Percentage done
+            message: Progress message
+            owner: If given, write the tick only while this worker holds the
+                job's lease (see update)
+        """
+        with self._pending_lock:
+            self._pending[job_id] = {'progress': progress, 'message': message}
+            self._pending_owners[job_id] = owner
+            if job_id not in self._due:
+                self._due[job_id] = self._last_flush.get(job_id, 0) + self.flush_interval
+                # Started on first use, so that a forked process gets its own
+                if self._flusher is None or not self._flusher.is_alive():
+                    self._flusher = threading.Thread(target=self._flush_loop, name='job-store-flusher')
+                    self._flusher.daemon = True
+                    self._flusher.start()
+                self._flush_wakeup.notify()
+
+    def flush(self, job_id=None):
+        """Write pending progress for one job, or for all jobs."""
+        with self._pending_lock:
+            job_ids = [job_id] if job_id is not None else list(self._pending)
+
+        for pending_id in job_ids:
+            # Taken and written under the job's lock, so no update can come in between
+            with self._write_lock(pending_id):
+                pending, owner = self._take_pending(pending_id)
+                if pending:
+                    self._write(pending_id, pending, owner, unfinished_only=True)
+
+    def _take_pending(self, job_id):
+        """
+        Remove a job's pending progress; the caller holds the job's write lock.
+
+        Returns:
+            tuple: (pending fields or None, lease owner to write them for)
+        """
+        with self._pending_lock:
+            self._due.pop(job_id, None)
+            self._last_flush[job_id] = time.time()
+            return self._pending.pop(job_id, None), self._pending_owners.pop(job_id, None)
+
+    def _write_lock(self, job_id):
+        """Lock serializing the writes to a job in this process."""
+        return self._write_locks[hash(job_id) % _WRITE_LOCK_STRIPES]
+
+    def _flush_loop(self):
+        """Write pending progress as it falls due."""
+        while True:
+            with self._pending_lock:
+                now = time.time()
+                due = [job_id for job_id, due_at in self._due.items() if due_at <= now]
+                if not due:
+                    self._flush_wakeup.wait(min(self._due.values()) - now if self._due else None)
+                    continue
+            for job_id in due:
+                try:
+                    self.flush(job_id)
+                except Exception as e:
+                    logger.error(f"Could not write progress of job {job_id}: {str(e)}")
+
+    def _read(self, job_id):
+        raise NotImplementedError
+
+    def _write(self, job_id, fields, owner=None, unfinished_only=False):
+        """
+        Write fields to a job.
+
+        Args:
+            owner: If given, write only if this worker holds the job's lease
+            unfinished_only: Write only if the job has not finished
+
+        Returns:
+            bool: Whether the job was written
+        """
+        raise NotImplementedError
+
+    def _delete(self, job_id):
+        raise NotImplementedError
+
+
+class MemoryJobStore(JobStore):
+    """In-process job store, used for tests and single-process setups."""
+
+    def __init__(self):
+        super().__init__(flush_interval=0)
+        self._jobs = {}
+        self._batches = {}
+        self._workers = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def create(self, job_id, fields):
+        now = time.time()
+        with self._lock:
+            self._jobs[job_id] = self._new_job(fields, now)
+            self._changed.notify_all()
+
+    def create_or_attach(self, job_id, fields):
+        with self._lock:
+            cache_key = fields.get('cache_key')
+            for other_id, job in self._jobs.items():
+                if job.get('cache_key') == cache_key and job.get('status') not in TERMINAL_STATUSES:
+                    return other_id
+            now = time.time()
+            self._jobs[job_id] = self._new_job(fields, now)
+            self._changed.notify_all()
+            return job_id
+
+    def claim(self, worker_id, lease_seconds, max_attempts):
+        with self._lock:
+            now = time.time()
+            while True:
+                expired = [
+                    (job_id, job) for job_id, job in self._jobs.items()
+                    if job.get('lease_owner') is not None and job['lease_expires'] < now
+                    and job.get('status') not in TERMINAL_STATUSES
+                ]
+                if expired:
+                    job_id, job = expired[0]
+                    if job['attempts'] >= max_attempts:
+                        self._set(job, now, status='error', lease_owner=None, lease_expires=None, finished_at=now,
+                                  message=f'Error: the job stopped its worker {job["attempts"]} times')
+                        continue
+                else:
+                    running = {}
+                    for other in self._jobs.values():
+                        if other.get('lease_owner') is not None and other['lease_expires'] >= now:
+                            running[other['tenant']] = running.get(other['tenant'], 0) + 1
+                    queued = [
+                        (job['priority'], running.get(job['tenant'], 0), job['created_at'], job_id)
+                        for job_id, job in self._jobs.items()
+                        if job.get('status') == 'queued' and job.get('lease_owner') is None
+                    ]
+                    if not queued:
+                        return None
+                    job_id = min(queued)[3]
+                    job = self._jobs[job_id]
+                job.update(lease_owner=worker_id, lease_expires=now + lease_seconds,
+                           attempts=job['attempts'] + 1, started_at=now)
+                return job_id, dict(job)
+
+    def renew_leases(self, worker_id, lease_seconds):
+        with self._lock:
+            expires = time.time() + lease_seconds
+            held = set()
+            for job_id, job in self._jobs.items():
+                if job.get('lease_owner') == worker_id:
+                    job['lease_expires'] = expires
+                    held.add(job_id)
+            return held
+
+    def release(self, job_id, worker_id, expire=False):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.get('lease_owner') != worker_id:
+                return
+            if expire:
+                job['lease_expires'] = 0
+            else:
+                job.update(lease_owner=None, lease_expires=None, finished_at=time.time())
+
+    def heartbeat(self, worker_id, concurrency, active):
+        with self._lock:
+            self._workers[worker_id] = {'concurrency': concurrency, 'active': active, 'heartbeat_at': time.time()}
+
+    def remove_worker(self, worker_id):
+        with self._lock:
+            self._workers.pop(worker_id, None)
+
+    def queue_stats(self, worker_timeout):
+        with self._lock:
+            now = time.time()
+            jobs = list(self._jobs.values())
+            runs = sorted(
+                (job['finished_at'], job['finished_at'] - job['started_at']) for job in jobs
+                if job.get('status') == 'completed' and job.get('started_at') and job.get('finished_at')
+            )[-_RECENT_RUNS:]
+            return {
+                'queue_depth': sum(1 for job in jobs if job.get('status') == 'queued' and not job.get('lease_owner')),
+                'active_jobs': sum(1 for job in jobs if job.get('lease_owner') and job['lease_expires'] > now),
+                'worker_slots': sum(worker['concurrency'] for worker in self._workers.values()
+                                    if worker['heartbeat_at'] > now - worker_timeout),
+                'avg_run_time': sum(run for _, run in runs) / len(runs) if runs else None
+            }
+
+    def queue_position(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.get('status') != 'queued' or job.get('lease_owner'):
+                return None
+            ahead, rank, tenant_counts = 0, 1, {}
+            for other in self._jobs.values():
+                if other is job or other.get('status') != 'queued' or other.get('lease_owner'):
+                    continue
+                if other['priority'] < job['priority']:
+                    ahead += 1
+                elif other['priority'] == job['priority']:
+                    if other['tenant'] == job['tenant']:
+                        rank += other['created_at'] < job['created_at']
+                    else:
+                        tenant_counts[other['tenant']] = tenant_counts.get(other['tenant'], 0) + 1
+            return _fair_position(ahead, rank, tenant_counts.values())
+
+    def create_batch(self, batch_id, fields):
+        with self._lock:
+            self._batches[batch_id] = {'tenant': '', **fields, 'created_at': time.time()}
+
+    def get_batch(self, batch_id):
+        with self._lock:
+            batch = self._batches.get(batch_id)
+            return dict(batch) if batch is not None else None
+
+    def get_many(self, job_ids):
+        with self._lock:
+            return {job_id: dict(self._jobs[job_id]) for job_id in job_ids if job_id in self._jobs}
+
+    def requeue(self, job_id, fields):
+        with self._write_lock(job_id), self._lock:
+            self._take_pending(job_id)
+            job = self._jobs.get(job_id)
+            if job is None or job.get('status') != 'error':
+                return None
+            for other_id, other in self._jobs.items():
+                if other.get('cache_key') == job.get('cache_key') and other.get('status') not in TERMINAL_STATUSES:
+                    return other_id
+            self._set(job, time.time(), **fields)
+            return job_id
+
+    def wait_for_change(self, job_id, version, timeout):
+        with self._changed:
+            self._changed.wait_for(
+                lambda: self._jobs.get(job_id, {}).get('version') != version,
+                timeout=timeout
+            )
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def find(self, status=None, youtube_url=None, cache_key=None, limit=None):
+        with self._lock:
+            jobs = [
+                dict(job, id=job_id) for job_id, job in self._jobs.items()
+                if (status is None or job.get('status') == status)
+                and (youtube_url is None or job.get('youtube_url') == youtube_url)
+                and (cache_key is None or job.get('cache_key') == cache_key)
+            ]
+        jobs.sort(key=lambda job: job['created_at'], reverse=True)
+        return jobs[:limit] if limit else jobs
+
+    def _read(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def _write(self, job_id, fields, owner=None, unfinished_only=False):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or (owner is not None and job.get('lease_owner') != owner):
+                return False
+            if unfinished_only and job.get('status') in TERMINAL_STATUSES:
+                return False
+            self._set(job, time.time(), **fields)
+            return True
+
+    def _new_job(self, fields, now):
+        return {'priority': 0, 'tenant': '', 'attempts': 0, 'lease_owner': None, 'lease_expires': None,
+                **fields, 'version': 1, 'created_at': now, 'updated_at': now}
+
+    def _set(self, job, now, **fields):
+        """Update a job as a new version; the caller holds the lock."""
+        job.update(fields)
+        job['updated_at'] = now
+        job['version'] += 1
+        self._changed.notify_all()
+
+    def _delete(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            self._changed.notify_all()
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Job store backed by a SQLite database in WAL mode.
+
+    The database file can be shared by every gunicorn worker on the host, so
+    any worker can answer status requests for any job, and job state
+    survives restarts.
+    """
+
+    def __init__(self, db_path, flush_interval=1.0):
+        super().__init__(flush_interval=flush_interval)
+        self.db_path = db_path
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self):
+        """Get this thread's database connection."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                youtube_url TEXT,
+                cache_key TEXT,
+                progress REAL NOT NULL DEFAULT 0,
+                message TEXT,
+                data TEXT NOT NULL DEFAULT '{}',
+                version INTEGER NOT NULL DEFAULT 1,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at);
+            CREATE INDEX IF NOT EXISTS idx_jobs_youtube_url ON jobs(youtube_url, created_at);
+            CREATE TABLE IF NOT EXISTS batches (
+                id TEXT PRIMARY KEY,
+                tenant TEXT NOT NULL DEFAULT '',
+                data TEXT NOT NULL DEFAULT '{}',
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS workers (
+                id TEXT PRIMARY KEY,
+                concurrency INTEGER NOT NULL,
+                active INTEGER NOT NULL,
+                heartbeat_at REAL NOT NULL
+            );
+        """)
+
+        # Databases created before these columns existed
+        existing = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+        for column, definition in (
+            ('cache_key', 'TEXT'),
+            ('version', 'INTEGER NOT NULL DEFAULT 1'),
+            ('priority', 'INTEGER NOT NULL DEFAULT 0'),
+            ("tenant", "TEXT NOT NULL DEFAULT ''"),
+            ('lease_owner', 'TEXT'),
+            ('lease_expires', 'REAL'),
+            ('attempts', 'INTEGER NOT NULL DEFAULT 0'),
+            ('started_at', 'REAL'),
+            ('finished_at', 'REAL'),
+        ):
+            if column not in existing:
+                conn.execute(f'ALTER TABLE jobs ADD COLUMN {column} {definition}')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_cache_key ON jobs(cache_key, status)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs(status, priority, created_at)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_lease ON jobs(lease_expires) WHERE lease_owner IS NOT NULL')
+
+    def create(self, job_id, fields):
+        self._insert(self._connect(), job_id, fields)
+
+    def create_or_attach(self, job_id, fields):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            placeholders = ', '.join('?' for _ in TERMINAL_STATUSES)
+            row = conn.execute(
+                f'SELECT id FROM jobs WHERE cache_key = ? AND status NOT IN ({placeholders}) '
+                'ORDER BY created_at DESC LIMIT 1',
+                (fields.get('cache_key'), *TERMINAL_STATUSES)
+            ).fetchone()
+            if row is None:
+                self._insert(conn, job_id, fields)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return row['id'] if row is not None else job_id
+
+    def claim(self, worker_id, lease_seconds, max_attempts):
+        conn = self._connect()
+        placeholders = ', '.join('?' for _ in TERMINAL_STATUSES)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            while True:
+                row = conn.execute(
+                    f'SELECT id, attempts FROM jobs WHERE lease_owner IS NOT NULL AND lease_expires < ? '
+                    f'AND status NOT IN ({placeholders}) ORDER BY lease_expires LIMIT 1',
+                    (now, *TERMINAL_STATUSES)
+                ).fetchone()
+                if row is not None and row['attempts'] >= max_attempts:
+                    self._update(conn, row['id'], {
+                        'status': 'error', 'lease_owner': None, 'lease_expires': None, 'finished_at': now,
+                        'message': f"Error: the job stopped its worker {row['attempts']} times"
+                    })
+                    continue
+                if row is None:
+                    # Within a priority, the tenant with the fewest running jobs goes next
+                    row = conn.execute(
+                        'SELECT queued.id FROM jobs AS queued LEFT JOIN ('
+                        '    SELECT tenant, COUNT(*) AS running FROM jobs '
+                        '    WHERE lease_owner IS NOT NULL AND lease_expires >= ? GROUP BY tenant'
+                        ') AS busy ON busy.tenant = queued.tenant '
+                        "WHERE queued.status = 'queued' AND queued.lease_owner IS NULL "
+                        'ORDER BY queued.priority, COALESCE(busy.running, 0), queued.created_at LIMIT 1',
+                        (now,)
+                    ).fetchone()
+                    if row is None:
+                        conn.execute('COMMIT')
+                        return None
+                # Leasing is not a visible change, so the version stays
+                conn.execute(
+                    'UPDATE jobs SET lease_owner = ?, lease_expires = ?, attempts = attempts + 1, started_at = ? '
+                    'WHERE id = ?',
+                    (worker_id, now + lease_seconds, now, row['id'])
+                )
+                job = self._row_to_job(conn.execute('SELECT * FROM jobs WHERE id = ?', (row['id'],)).fetchone())
+                conn.execute('COMMIT')
+                return job.pop('id'), job
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def renew_leases(self, worker_id, lease_seconds):
+        conn = self._connect()
+        conn.execute('UPDATE jobs SET lease_expires = ? WHERE lease_owner = ?', (time.time() + lease_seconds, worker_id))
+        return {row['id'] for row in conn.execute('SELECT id FROM jobs WHERE lease_owner = ?', (worker_id,))}
+
+    def release(self, job_id, worker_id, expire=False):
+        if expire:
+            self._connect().execute(
+                'UPDATE jobs SET lease_expires = 0 WHERE id = ? AND lease_owner = ?', (job_id, worker_id)
+            )
+        else:
+            self._connect().execute(
+                'UPDATE jobs SET lease_owner = NULL, lease_expires = NULL, finished_at = ? '
+                'WHERE id = ? AND lease_owner = ?',
+                (time.time(), job_id, worker_id)
+            )
+
+    def heartbeat(self, worker_id, concurrency, active):
+        self._connect().execute(
+            'INSERT INTO workers (id, concurrency, active, heartbeat_at) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(id) DO UPDATE SET concurrency = excluded.concurrency, active = excluded.active, '
+            'heartbeat_at = excluded.heartbeat_at',
+            (worker_id, concurrency, active, time.time())
+        )
+
+    def remove_worker(self, worker_id):
+        self._connect().execute('DELETE FROM workers WHERE id = ?', (worker_id,))
+
+    def queue_stats(self, worker_timeout):
+        conn = self._connect()
+        now = time.time()
+        queue_depth = conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND lease_owner IS NULL"
+        ).fetchone()[0]
+        active_jobs = conn.execute(
+            'SELECT COUNT(*) FROM jobs WHERE lease_owner IS NOT NULL AND lease_expires > ?', (now,)
+        ).fetchone()[0]
+        worker_slots = conn.execute(
+            'SELECT COALESCE(SUM(concurrency), 0) FROM workers WHERE heartbeat_at > ?', (now - worker_timeout,)
+        ).fetchone()[0]
+        avg_run_time = conn.execute(
+            "SELECT AVG(finished_at - started_at) FROM (SELECT finished_at, started_at FROM jobs "
+            "WHERE status = 'completed' AND started_at IS NOT NULL AND finished_at IS NOT NULL "
+            'ORDER BY finished_at DESC LIMIT ?)',
+            (_RECENT_RUNS,)
+        ).fetchone()[0]
+        return {'queue_depth': queue_depth, 'active_jobs': active_jobs, 'worker_slots': worker_slots,
+                'avg_run_time': avg_run_time}
+
+    def queue_position(self, job_id):
+        conn = self._connect()
+        job = conn.execute('SELECT status, lease_owner, priority, tenant, created_at FROM jobs WHERE id = ?',
+                           (job_id,)).fetchone()
+        if job is None or job['status'] != 'queued' or job['lease_owner'] is not None:
+            return None
+        ahead = conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND lease_owner IS NULL AND priority < ?",
+            (job['priority'],)
+        ).fetchone()[0]
+        rank = 1 + conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND lease_owner IS NULL "
+            'AND priority = ? AND tenant = ? AND created_at < ?',
+            (job['priority'], job['tenant'], job['created_at'])
+        ).fetchone()[0]
+        tenant_counts = [row[0] for row in conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND lease_owner IS NULL "
+            'AND priority = ? AND tenant != ? GROUP BY tenant',
+            (job['priority'], job['tenant'])
+        )]
+        return _fair_position(ahead, rank, tenant_counts)
+
+    def create_batch(self, batch_id, fields):
+        fields = dict(fields)
+        tenant = fields.pop('tenant', '')
+        self._connect().execute(
+            'INSERT INTO batches (id, tenant, data, created_at) VALUES (?, ?, ?, ?)',
+            (batch_id, tenant, json.dumps(fields), time.time())
+        )
+
+    def get_batch(self, batch_id):
+        row = self._connect().execute('SELECT * FROM batches WHERE id = ?', (batch_id,)).fetchone()
+        if row is None:
+            return None
+        return {**json.loads(row['data']), 'tenant': row['tenant'], 'created_at': row['created_at']}
+
+    def get_many(self, job_ids):
+        conn = self._connect()
+        jobs = {}
+        job_ids = list(job_ids)
+        # Stay below SQLite's limit on query parameters
+        for start in range(0, len(job_ids), 500):
+            ids = job_ids[start:start + 500]
+            placeholders = ', '.join('?' for _ in ids)
+            for row in conn.execute(f'SELECT * FROM jobs WHERE id IN ({placeholders})', ids):
+                job = self._row_to_job(row)
+                jobs[job.pop('id')] = job
+        with self._pending_lock:
+            for job_id, job in jobs.items():
+                if job.get('status') not in TERMINAL_STATUSES:
+                    job.update(self._pending.get(job_id) or {})
+        return jobs
+
+    def requeue(self, job_id, fields):
+        with self._write_lock(job_id):
+            self._take_pending(job_id)
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                job = conn.execute('SELECT status, cache_key FROM jobs WHERE id = ?', (job_id,)).fetchone()
+                if job is None or job['status'] != 'error':
+                    conn.execute('ROLLBACK')
+                    return None
+                placeholders = ', '.join('?' for _ in TERMINAL_STATUSES)
+                row = conn.execute(
+                    f'SELECT id FROM jobs WHERE cache_key = ? AND status NOT IN ({placeholders}) '
+                    'ORDER BY created_at DESC LIMIT 1',
+                    (job['cache_key'], *TERMINAL_STATUSES)
+                ).fetchone()
+                if row is None:
+                    self._update(conn, job_id, fields)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            return row['id'] if row is not None else job_id
+
+    def find(self, status=None, youtube_url=None, cache_key=None, limit=None):
+        clauses, params = [], []
+        if status is not None:
+            clauses.append('status = ?')
+            params.append(status)
+        if youtube_url is not None:
+            clauses.append('youtube_url = ?')
+            params.append(youtube_url)
+        if cache_key is not None:
+            clauses.append('cache_key = ?')
+            params.append(cache_key)
+
+        query = 'SELECT * FROM jobs'
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        query += ' ORDER BY created_at DESC'
+        if limit:
+            query += ' LIMIT ?'
+            params.append(limit)
+
+        return [self._row_to_job(row) for row in self._connect().execute(query, params)]
+
+    def _read(self, job_id):
+        row = self._connect().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = self._row_to_job(row)
+        del job['id']
+        return job
+
+    def _write(self, job_id, fields, owner=None, unfinished_only=False):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            written = self._update(conn, job_id, fields, owner, unfinished_only)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return written
+
+    def _update(self, conn, job_id, fields, owner=None, unfinished_only=False):
+        """
+        Write fields to a job inside the caller's transaction.
+
+        Returns:
+            bool: Whether the job exists (and is leased to owner and
+                unfinished, if asked)
+        """
+        condition, params = 'id = ?', (job_id,)
+        if owner is not None:
+            condition, params = condition + ' AND lease_owner = ?', (*params, owner)
+        if unfinished_only:
+            placeholders = ', '.join('?' for _ in TERMINAL_STATUSES)
+            condition, params = condition + f' AND status NOT IN ({placeholders})', (*params, *TERMINAL_STATUSES)
+
+        columns, data = self._split_fields(fields)
+        if data:
+            # Merge into the existing blob inside the write transaction
+            row = conn.execute(f'SELECT data FROM jobs WHERE {condition}', params).fetchone()
+            if row is None:
+                return False
+            columns['data'] = json.dumps({**json.loads(row['data']), **data})
+
+        columns['updated_at'] = time.time()
+        assignments = ', '.join([f'{name} = ?' for name in columns] + ['version = version + 1'])
+        cursor = conn.execute(f'UPDATE jobs SET {assignments} WHERE {condition}', (*columns.values(), *params))
+        return cursor.rowcount > 0
+
+    def _delete(self, job_id):
+        self._connect().execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+
+    def _insert(self, conn, job_id, fields):
+        columns, data = self._split_fields(fields)
+        now = time.time()
+        conn.execute(
+            'INSERT INTO jobs (id, status, youtube_url, cache_key, progress, message, priority, tenant, data, '
+            'created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (job_id, columns.get('status', 'queued'), columns.get('youtube_url'), columns.get('cache_key'),
+             columns.get('progress', 0), columns.get('message'), columns.get('priority', 0),
+             columns.get('tenant', ''), json.dumps(data), now, now)
+        )
+
+    def _split_fields(self, fields):
+        """Split job fields into column values and JSON blob values."""
+        columns = {name: value for name, value in fields.items() if name in _COLUMNS}
+        data = {name: value for name, value in fields.items() if name not in _COLUMNS}
+        return columns, data
+
+    def _row_to_job(self, row):
+        job = json.loads(row['data'])
+        job.update({
+            'id': row['id'],
+            'status': row['status'],
+            'youtube_url': row['youtube_url'],
+            'cache_key': row['cache_key'],
+            'progress': row['progress'],
+            'message': row['message'],
+            'priority': row['priority'],
+            'tenant': row['tenant'],
+            'attempts': row['attempts'],
+            'lease_owner': row['lease_owner'],
+            'lease_expires': row['lease_expires'],
+            'started_at': row['started_at'],
+            'finished_at': row['finished_at'],
+            'version': row['version'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at']
+        })
+        return job
+
+
+def _fair_position(ahead, rank, other_tenant_counts):
+    """
+    Queue position of a tenant's rank-th job when tenants take turns.
+
+    Args:
+        ahead: Queued jobs of higher priority
+        rank: 1-based place of the job among its tenant's jobs of its priority
+        other_tenant_counts: Queued jobs of the same priority per other tenant
+    """
+    return ahead + rank + sum(min(count, rank) for count in other_tenant_counts)
+
+
+def create_job_store():
+    """
+    Create the job store selected by the environment.
+
+    YT_TRANSLATOR_JOB_STORE chooses the backend ('sqlite' or 'memory') and
+    YT_TRANSLATOR_DB overrides the SQLite database path.
+    """
+    backend = os.environ.get('YT_TRANSLATOR_JOB_STORE', 'sqlite')
+
+    if backend == 'memory':
+        return MemoryJobStore()
+
+    if backend == 'sqlite':
+        # Keep state out of the translator's temp root, parts of which are served for download
+        default_path = os.path.join(tempfile.gettempdir(), 'yt_translator', 'state', 'jobs.db')
+        db_path = os.environ.get('YT_TRANSLATOR_DB', default_path)
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        return SQLiteJobStore(db_path)
+
+    raise ValueError(f"Unknown job store backend: {backend}")
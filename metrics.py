@@ -0,0 +1,225 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Histogram buckets in seconds, from sub-second API calls to hour-long jobs
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+
+class Registry:
+    """A set of metrics rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format (0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    """Base class for labelled metrics. Label values are passed as keyword arguments."""
+
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._functions = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def set_function(self, func, **labels):
+        """Read the value from func() at scrape time instead of storing it."""
+        with self._lock:
+            self._functions[self._key(labels)] = func
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, func in functions.items():
+            try:
+                values[key] = func()
+            except Exception as e:
+                logger.warning(f"Could not collect metric {self.name}: {str(e)}")
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(values.items())]
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric {self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(_Metric):
+    """A value that only goes up."""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """A value that can go up and down."""
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Cumulative histogram of observations, with sum and count."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        with self._lock:
+            values = {key: {**series, 'buckets': list(series['buckets'])} for key, series in self._values.items()}
+        lines = []
+        for key, series in sorted(values.items()):
+            for bound, count in zip(self.buckets, series['buckets']):
+                labels = _format_labels(self.labelnames + ('le',), key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames + ('le',), key + ('+Inf',))
+            lines.append(f"{self.name}_bucket{labels} {series['count']}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Pipeline metrics. Values are per process; under gunicorn, each worker
+# exposes its own and Prometheus aggregates them.
+STAGE_SECONDS = Histogram(
+    'yt_translator_stage_seconds', 'Time spent in each job stage', ['stage'])
+JOB_SECONDS = Histogram(
+    'yt_translator_job_seconds', 'Time from queueing to the end of a job', ['outcome'])
+JOBS_TOTAL = Counter(
+    'yt_translator_jobs_total', 'Jobs started, by outcome', ['outcome'])
+BYTES_WRITTEN = Counter(
+    'yt_translator_bytes_written_total', 'Bytes of audio written to disk', ['kind'])
+QUEUE_DEPTH = Gauge(
+    'yt_translator_queue_depth', 'Jobs waiting for a worker')
+ACTIVE_JOBS = Gauge(
+    'yt_translator_active_jobs', 'Jobs being processed by a worker')
+CACHE_HITS = Counter(
+    'yt_translator_cache_hits_total', 'Cache lookups that found an entry', ['cache'])
+CACHE_MISSES = Counter(
+    'yt_translator_cache_misses_total', 'Cache lookups that found no entry', ['cache'])
+CACHE_HIT_RATIO = Gauge(
+    'yt_translator_cache_hit_ratio', 'Fraction of cache lookups that found an entry', ['cache'])
+BACKEND_CONCURRENCY_LIMIT = Gauge(
+    'yt_translator_backend_concurrency_limit', 'Adaptive limit on calls in flight to a backend', ['backend'])
+BACKEND_IN_FLIGHT = Gauge(
+    'yt_translator_backend_in_flight', 'Calls in flight to a backend', ['backend'])
+BACKEND_WAITING = Gauge(
+    'yt_translator_backend_waiting', 'Calls waiting for a backend concurrency slot', ['backend'])
+BACKEND_TOKENS = Gauge(
+    'yt_translator_backend_tokens', 'Quota available to a backend, in its cost unit; negative while in debt',
+    ['backend'])
+BACKEND_RATE_LIMITED = Counter(
+    'yt_translator_backend_rate_limited_total', 'Backend calls rejected as over quota', ['backend'])
+
+
+def register_cache(name, get_stats):
+    """Expose a cache's get_stats() hits, misses and hit_ratio under cache=name."""
+    CACHE_HITS.set_function(lambda: get_stats()['hits'], cache=name)
+    CACHE_MISSES.set_function(lambda: get_stats()['misses'], cache=name)
+    CACHE_HIT_RATIO.set_function(lambda: get_stats()['hit_ratio'], cache=name)
+
+
+def register_throttle(name, get_stats):
+    """Expose a backend throttle's get_stats() limits under backend=name."""
+    BACKEND_CONCURRENCY_LIMIT.set_function(lambda: get_stats()['concurrency_limit'], backend=name)
+    BACKEND_IN_FLIGHT.set_function(lambda: get_stats()['in_flight'], backend=name)
+    BACKEND_WAITING.set_function(lambda: get_stats()['waiting'], backend=name)
+    BACKEND_RATE_LIMITED.set_function(lambda: get_stats()['rate_limited'], backend=name)
+    # Without a quota there are no tokens to report
+    if get_stats()['quota']:
+        BACKEND_TOKENS.set_function(lambda: get_stats()['tokens'], backend=name)
+
+
+def record_stage(stage, seconds, timings=None):
+    """
+    Record time spent in a stage.
+
+    Args:
+        stage: Stage name
+        seconds: Duration
+        timings: Optional dict of per-job totals to add the duration to
+    """
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    if timings is not None:
+        timings[stage] = round(timings.get(stage, 0.0) + seconds, 3)
+
+
+@contextmanager
+def timed(stage, timings=None):
+    """Time the enclosed block as a stage (see record_stage)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start, timings)
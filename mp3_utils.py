@@ -0,0 +1,486 @@
+import os
+import mmap
+import struct
+import logging
+import functools
+from collections import namedtuple
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Bitrates in kbps, indexed by [MPEG1?][layer][bitrate index]
+_BITRATES = {
+    True: {
+        1: (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+        2: (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+        3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    },
+    False: {
+        1: (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+        2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+        3: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    },
+}
+
+# Sample rates in Hz, indexed by version bits then sample rate index
+_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),  # MPEG1
+    2: (22050, 24000, 16000),  # MPEG2
+    0: (11025, 12000, 8000),   # MPEG2.5
+}
+
+# Consecutive valid frames required before trusting a sync word
+_SYNC_CONFIRM_FRAMES = 3
+
+# How far past the ID3v2 tag to look for the first frame
+_MAX_SYNC_SEARCH = 1024 * 1024
+
+# Encoder strings that open a LAME tag: LAME's own, and FFmpeg's (libmp3lame through libavcodec)
+_LAME_TAG_ENCODERS = (b'LAME', b'Lavc', b'Lavf')
+
+FrameHeader = namedtuple('FrameHeader', [
+    'version', 'layer', 'bitrate', 'sample_rate', 'padding',
+    'channels', 'samples', 'length', 'side_info_size'
+])
+
+Mp3Info = namedtuple('Mp3Info', [
+    'duration', 'sample_rate', 'channels', 'frames', 'bitrate',
+    'encoder_delay', 'encoder_padding', 'data_offset', 'data_end', 'has_info_frame'
+])
+
+
+def parse_frame_header(buf, offset):
+    """
+    Parse an MPEG audio frame header.
+
+    Args:
+        buf: Buffer holding the file (bytes or mmap)
+        offset: Offset of the candidate header
+
+    Returns:
+        FrameHeader: Parsed header, or None if the bytes are not a valid header
+    """
+    if offset + 4 > len(buf):
+        return None
+    b0, b1, b2, b3 = buf[offset], buf[offset + 1], buf[offset + 2], buf[offset + 3]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+
+    version = (b1 >> 3) & 0x03
+    layer = 4 - ((b1 >> 1) & 0x03)
+    bitrate_index = b2 >> 4
+    sample_rate_index = (b2 >> 2) & 0x03
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    mpeg1 = version == 3
+    bitrate = _BITRATES[mpeg1][layer][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+    padding = (b2 >> 1) & 0x01
+    channels = 1 if (b3 >> 6) == 3 else 2
+
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 2 or mpeg1:
+        samples = 1152
+        length = 144 * bitrate // sample_rate + padding
+    else:
+        samples = 576
+        length = 72 * bitrate // sample_rate + padding
+
+    if mpeg1:
+        side_info_size = 17 if channels == 1 else 32
+    else:
+        side_info_size = 9 if channels == 1 else 17
+
+    return FrameHeader(version, layer, bitrate, sample_rate, padding, channels, samples, length, side_info_size)
+
+
+def skip_id3v2(buf):
+    """Get the offset of the first byte after a leading ID3v2 tag (0 if there is none)."""
+    if len(buf) < 10 or buf[0:3] != b'ID3':
+        return 0
+    size = ((buf[6] & 0x7F) << 21) | ((buf[7] & 0x7F) << 14) | ((buf[8] & 0x7F) << 7) | (buf[9] & 0x7F)
+    footer = 10 if buf[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def find_first_frame(buf, start=0, end=None):
+    """
+    Find the first frame that starts a run of valid consecutive frames.
+
+    Returns:
+        tuple: (offset, FrameHeader), or (None, None) if no frame is found
+    """
+    end = len(buf) if end is None else end
+    offset = buf.find(b'\xff', start, end)
+    while offset != -1:
+        header = parse_frame_header(buf, offset)
+        if header is not None and _confirm_sync(buf, offset, header, len(buf)):
+            return offset, header
+        offset = buf.find(b'\xff', offset + 1, end)
+    return None, None
+
+
+def iter_frames(buf, start, end=None):
+    """
+    Iterate over consecutive frames starting at a known frame offset.
+
+    Stops at the first invalid or truncated frame (e.g. a trailing ID3v1 tag).
+
+    Yields:
+        tuple: (offset, FrameHeader)
+    """
+    end = len(buf) if end is None else end
+    offset = start
+    while offset < end:
+        header = parse_frame_header(buf, offset)
+        if header is None or header.length <= 0 or offset + header.length > end:
+            return
+        yield offset, header
+        offset += header.length
+
+
+def read_info_frame(buf, offset, header):
+    """
+    Read a Xing/Info or VBRI header from the first frame, if present.
+
+    Returns:
+        dict: 'frames' (or None), 'encoder_delay' and 'encoder_padding',
+            or None if the frame carries no such header
+    """
+    xing_offset = offset + 4 + header.side_info_size
+    tag = bytes(buf[xing_offset:xing_offset + 4])
+    if tag in (b'Xing', b'Info'):
+        flags = struct.unpack('>I', buf[xing_offset + 4:xing_offset + 8])[0]
+        position = xing_offset + 8
+        frames = None
+        if flags & 0x1:
+            frames = struct.unpack('>I', buf[position:position + 4])[0]
+            position += 4
+        if flags & 0x2:
+            position += 4  # byte count
+        if flags & 0x4:
+            position += 100  # seek table
+        if flags & 0x8:
+            position += 4  # quality
+
+        # LAME extension: encoder delay and padding live 21 bytes into the tag
+        delay = padding = 0
+        if _has_lame_tag(buf, offset, position):
+            b0, b1, b2 = buf[position + 21], buf[position + 22], buf[position + 23]
+            delay = (b0 << 4) | (b1 >> 4)
+            padding = ((b1 & 0x0F) << 8) | b2
+        return {'frames': frames, 'encoder_delay': delay, 'encoder_padding': padding}
+
+    vbri_offset = offset + 4 + 32
+    if bytes(buf[vbri_offset:vbri_offset + 4]) == b'VBRI':
+        delay = struct.unpack('>H', buf[vbri_offset + 6:vbri_offset + 8])[0]
+        frames = struct.unpack('>I', buf[vbri_offset + 14:vbri_offset + 18])[0]
+        return {'frames': frames, 'encoder_delay': delay, 'encoder_padding': 0}
+
+    return None
+
+
+def _has_lame_tag(buf, frame_offset, position):
+    """Check for a LAME tag at position, by its encoder string or its CRC of the frame before it."""
+    if position + 36 > len(buf):
+        return False
+    if bytes(buf[position:position + 4]) in _LAME_TAG_ENCODERS:
+        return True
+    crc = struct.unpack('>H', buf[position + 34:position + 36])[0]
+    return crc == _crc16(buf[frame_offset:position + 34])
+
+
+def probe_mp3(audio_path):
+    """
+    Read the exact duration and stream parameters of an MP3 file.
+
+    Uses the Xing/Info or VBRI header when the file has one, otherwise
+    walks the frame headers over an mmap of the file. No audio is decoded.
+    Results are memoized by (path, size, mtime), so repeated calls for an
+    unchanged file are free.
+
+    Returns:
+        Mp3Info: Stream information, or None if the file is not valid MP3
+    """
+    stat = os.stat(audio_path)
+    return _probe_cached(os.path.abspath(audio_path), stat.st_size, stat.st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=1024)
+def _probe_cached(audio_path, size, mtime_ns):
+    if size == 0:
+        return None
+    with open(audio_path, 'rb') as audio_file:
+        with mmap.mmap(audio_file.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            return _probe(buf)
+
+
+def _probe(buf):
+    end = len(buf)
+    if end >= 128 and buf[end - 128:end - 125] == b'TAG':
+        end -= 128  # ID3v1 tag
+
+    start = skip_id3v2(buf)
+    offset, header = find_first_frame(buf, start, min(end, start + _MAX_SYNC_SEARCH))
+    if offset is None:
+        return None
+
+    info = read_info_frame(buf, offset, header)
+    if info is not None and info['frames']:
+        # The info frame itself carries no audio
+        total_samples = info['frames'] * header.samples
+        data_offset = offset + header.length
+        audio_samples = max(0, total_samples - info['encoder_delay'] - info['encoder_padding'])
+        duration = audio_samples / header.sample_rate
+        bitrate = int((end - data_offset) * 8 / duration) if duration else header.bitrate
+        return Mp3Info(duration, header.sample_rate, header.channels, info['frames'], bitrate,
+                       info['encoder_delay'], info['encoder_padding'], data_offset, end, True)
+
+    data_offset = offset + header.length if info is not None else offset
+    frames = 0
+    total_samples = 0
+    data_end = data_offset
+    for frame_offset, frame in iter_frames(buf, data_offset, end):
+        frames += 1
+        total_samples += frame.samples
+        data_end = frame_offset + frame.length
+
+    if frames == 0:
+        return None
+
+    delay = info['encoder_delay'] if info else 0
+    padding = info['encoder_padding'] if info else 0
+    duration = max(0, total_samples - delay - padding) / header.sample_rate
+    bitrate = int((data_end - data_offset) * 8 / duration) if duration else header.bitrate
+    return Mp3Info(duration, header.sample_rate, header.channels, frames, bitrate,
+                   delay, padding, data_offset, data_end, info is not None)
+
+
+def _confirm_sync(buf, offset, header, end):
+    """Check that a candidate header is followed by more frames of the same stream."""
+    for _ in range(_SYNC_CONFIRM_FRAMES):
+        offset += header.length
+        if offset == end:
+            return True
+        following = parse_frame_header(buf, offset)
+        if following is None or following.sample_rate != header.sample_rate or following.layer != header.layer:
+            return False
+        header = following
+    return True
+
+
+def concat_mp3(output_path, duration, pieces):
+    """
+    Join MP3 files into one by copying their frames, without re-encoding.
+
+    Each piece is placed at its start time, to the nearest frame: silent
+    frames fill gaps, and a piece that runs into the next one (or past the
+    duration) loses its trailing frames. Each piece's encoder delay is
+    accounted for, so its audio rather than its priming samples starts on
+    time, and its padding is dropped along with any overflow. The output
+    gets a new Xing/Info header with the frame count, byte count, seek
+    table and a LAME tag holding the combined encoder delay and padding,
+    so players report the exact duration and trim the edges.
+
+    Frames are copied from memory maps in large blocks, so memory use is
+    constant and the merge is I/O-bound. Pieces must be complete Layer III
+    files from an encoder (each starting with an empty bit reservoir) with
+    the same MPEG version, sample rate and channel count.
+
+    Args:
+        output_path: MP3 file to create
+        duration: Output duration in seconds
+        pieces: List of (start_seconds, mp3_path), sorted by start
+
+    Returns:
+        str: output_path
+
+    Raises:
+        ValueError: If there are no pieces, a piece is not valid Layer III
+            MP3, or the pieces' formats differ
+    """
+    if not pieces:
+        raise ValueError("Nothing to concatenate")
+
+    sources = []
+    template = None
+    for start, path in pieces:
+        info = probe_mp3(path)
+        header, header_bytes = _first_audio_frame(path, info)
+        if header is None or header.layer != 3:
+            raise ValueError(f"Not a Layer III MP3 file: {path}")
+        if template is None:
+            template, template_bytes = header, header_bytes
+        elif (header.version, header.sample_rate, header.channels) != \
+                (template.version, template.sample_rate, template.channels):
+            raise ValueError(f"Cannot concatenate MP3 files with different formats: {path}")
+        sources.append((start, path, info))
+
+    # Timeline in decoded samples; the output keeps the first piece's encoder delay
+    samples_per_frame = template.samples
+    delay = sources[0][2].encoder_delay
+    total_samples = delay + int(round(duration * template.sample_rate))
+    total_frames = -(-total_samples // samples_per_frame)
+    padding = total_frames * samples_per_frame - total_samples
+    targets = [
+        min(total_frames, max(0, int(round(
+            (delay + start * template.sample_rate - info.encoder_delay) / samples_per_frame
+        ))))
+        for start, _, info in sources
+    ] + [total_frames]
+
+    silent_frame = _silent_frame(template_bytes)
+    info_frame_length = _info_frame_header(template_bytes, template)[1]
+    writer = _FrameWriter(output_path, info_frame_length, total_frames)
+    try:
+        for index, (_, path, info) in enumerate(sources):
+            writer.write_silence(silent_frame, targets[index] - writer.frames)
+            budget = targets[index + 1] - writer.frames
+            if budget > 0:
+                copied = writer.copy_frames(path, info, budget, template.bitrate)
+                if copied < info.frames:
+                    logger.debug(f"Cut {info.frames - copied} frames from {path} to fit its slot")
+        writer.write_silence(silent_frame, total_frames - writer.frames)
+        writer.finish(_info_frame(template_bytes, template, writer, delay, padding))
+    except Exception:
+        writer.close()
+        os.remove(output_path)
+        raise
+    return output_path
+
+
+# Encoder string in the LAME tag of concatenated files (their frames come from LAME)
+_ENCODER_TAG = b'LAME3.100'
+
+# Bytes copied per write when concatenating frames
+_COPY_BLOCK = 1024 * 1024
+
+
+class _FrameWriter:
+    """Writes audio frames after a reserved info frame, collecting seek table data."""
+
+    def __init__(self, output_path, info_frame_length, total_frames):
+        self.info_frame_length = info_frame_length
+        self.total_frames = total_frames
+        self.frames = 0
+        self.position = info_frame_length
+        self.constant_bitrate = True
+        # Output offsets of the frames at each percent of the duration
+        self.toc_frames = [percent * total_frames // 100 for percent in range(100)]
+        self.toc_offsets = []
+        self._file = open(output_path, 'wb')
+        self._file.write(bytes(info_frame_length))
+
+    def write_silence(self, frame, count):
+        for _ in range(max(0, count)):
+            self._mark_frame()
+            self._file.write(frame)
+            self.position += len(frame)
+            self.frames += 1
+
+    def copy_frames(self, path, info, limit, bitrate):
+        """Copy up to limit audio frames of a file. Returns the number copied."""
+        copied = 0
+        with open(path, 'rb') as source, mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            run_start = run_end = info.data_offset
+            for offset, header in iter_frames(buf, info.data_offset, info.data_end):
+                if copied == limit:
+                    break
+                self._mark_frame()
+                if header.bitrate != bitrate:
+                    self.constant_bitrate = False
+                run_end = offset + header.length
+                self.position += header.length
+                self.frames += 1
+                copied += 1
+            view = memoryview(buf)
+            try:
+                for block_start in range(run_start, run_end, _COPY_BLOCK):
+                    self._file.write(view[block_start:min(run_end, block_start + _COPY_BLOCK)])
+            finally:
+                view.release()
+        return copied
+
+    def finish(self, info_frame):
+        self._file.seek(0)
+        self._file.write(info_frame)
+        self._file.close()
+
+    def close(self):
+        self._file.close()
+
+    def _mark_frame(self):
+        while len(self.toc_offsets) < 100 and self.toc_frames[len(self.toc_offsets)] == self.frames:
+            self.toc_offsets.append(self.position)
+
+
+def _first_audio_frame(path, info):
+    """Get the header of a file's first audio frame, parsed and as raw bytes."""
+    if info is None:
+        return None, None
+    with open(path, 'rb') as audio_file:
+        audio_file.seek(info.data_offset)
+        header_bytes = audio_file.read(4)
+    return parse_frame_header(header_bytes, 0), header_bytes
+
+
+def _frame_header_bytes(template_bytes, bitrate_index):
+    """Build a frame header like template_bytes, without CRC or padding, at another bitrate."""
+    b0, b1, b2, b3 = template_bytes
+    return bytes((b0, b1 | 0x01, (bitrate_index << 4) | (b2 & 0x0D), b3))
+
+
+def _silent_frame(template_bytes):
+    """A frame at the template's bitrate whose zeroed side info decodes to silence."""
+    header_bytes = _frame_header_bytes(template_bytes, template_bytes[2] >> 4)
+    header = parse_frame_header(header_bytes, 0)
+    return header_bytes + bytes(header.length - 4)
+
+
+def _info_frame_header(template_bytes, template):
+    """Choose the smallest-bitrate header whose frame can hold the Xing and LAME tags."""
+    needed = 4 + template.side_info_size + 120 + 36
+    for bitrate_index in range(1, 15):
+        header_bytes = _frame_header_bytes(template_bytes, bitrate_index)
+        header = parse_frame_header(header_bytes, 0)
+        if header.length >= needed:
+            return header_bytes, header.length
+    raise ValueError("No frame size can hold an info header")
+
+
+def _info_frame(template_bytes, template, writer, delay, padding):
+    """Build the Xing/Info frame (with LAME tag) describing the written frames."""
+    header_bytes, length = _info_frame_header(template_bytes, template)
+    file_bytes = writer.position
+    frame = bytearray(length)
+    frame[0:4] = header_bytes
+
+    position = 4 + template.side_info_size
+    frame[position:position + 4] = b'Info' if writer.constant_bitrate else b'Xing'
+    # Flags: frame count, byte count, seek table, quality
+    struct.pack_into('>III', frame, position + 4, 0x0F, writer.total_frames, file_bytes)
+    toc = bytes(min(255, offset * 256 // file_bytes) for offset in writer.toc_offsets)
+    frame[position + 16:position + 116] = toc.ljust(100, b'\xff')
+    struct.pack_into('>I', frame, position + 116, 0)
+
+    lame = position + 120
+    frame[lame:lame + 9] = _ENCODER_TAG
+    frame[lame + 9] = 1 if writer.constant_bitrate else 0
+    frame[lame + 21:lame + 24] = ((delay << 12) | padding).to_bytes(3, 'big')
+    struct.pack_into('>I', frame, lame + 28, file_bytes)
+    struct.pack_into('>H', frame, lame + 34, _crc16(frame[:lame + 34]))
+    return bytes(frame)
+
+
+def _crc16(data):
+    """CRC-16 (polynomial 0x8005, reflected), as used by the LAME tag."""
+    crc = 0
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
@@ -0,0 +1,311 @@
+import os
+import wave
+import shutil
+import struct
+import logging
+import threading
+import subprocess
+
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# NumPy sample types for WAV sample widths (WAV is little-endian)
+SAMPLE_TYPES = {1: np.dtype('u1'), 2: np.dtype('<i2'), 4: np.dtype('<i4')}
+
+# Size of the canonical WAV header written by WavAudio.create
+_HEADER_SIZE = 44
+
+# Sample rate audio is decoded at for analysis (voice activity detection)
+ANALYSIS_SAMPLE_RATE = 16000
+
+
+def to_float(samples, sample_width):
+    """Convert integer PCM samples (e.g. a WavAudio slice) to float32 in [-1, 1)."""
+    converted = samples.astype(np.float32)
+    if sample_width == 1:
+        converted -= 128  # 8-bit WAV is unsigned
+    converted /= float(2 ** (8 * sample_width - 1))
+    return converted
+
+
+def from_pcm_bytes(data, sample_width, channels):
+    """Convert PCM bytes to float32 samples in [-1, 1), shape (samples, channels)."""
+    return to_float(np.frombuffer(data, dtype=SAMPLE_TYPES[sample_width]), sample_width).reshape(-1, channels)
+
+
+def to_pcm_bytes(samples, sample_width):
+    """Convert float32 samples to PCM bytes, clipping out-of-range values."""
+    scale = 2 ** (8 * sample_width - 1)
+    scaled = np.clip(np.round(samples * scale), -scale, scale - 1)
+    if sample_width == 1:
+        scaled += 128
+    return scaled.astype(SAMPLE_TYPES[sample_width]).tobytes()
+
+
+def wav_params(path):
+    """
+    Read the format of a WAV file.
+
+    Returns:
+        dict: channels, sample_width (bytes), sample_rate and frames
+
+    Raises:
+        ValueError: If the sample width is not supported
+    """
+    with wave.open(path, 'rb') as audio:
+        params = {
+            'channels': audio.getnchannels(),
+            'sample_width': audio.getsampwidth(),
+            'sample_rate': audio.getframerate(),
+            'frames': audio.getnframes(),
+        }
+    if params['sample_width'] not in SAMPLE_TYPES:
+        raise ValueError(f"Unsupported WAV sample width: {params['sample_width'] * 8} bits")
+    return params
+
+
+def wav_duration(path):
+    """Get the duration of a WAV file in seconds."""
+    params = wav_params(path)
+    return params['frames'] / params['sample_rate']
+
+
+def iter_wav_blocks(path, block_seconds=10):
+    """
+    Read a PCM WAV file in blocks through a memory map, so memory use is
+    bounded by the block size.
+
+    Yields:
+        np.ndarray: float32 samples, shape (samples, channels)
+    """
+    audio = WavAudio(path)
+    block_frames = max(1, int(block_seconds * audio.sample_rate))
+    for start in range(0, len(audio.samples), block_frames):
+        yield to_float(audio.samples[start:start + block_frames], audio.sample_width)
+
+
+class WavAudio:
+    """
+    A PCM WAV file whose samples are memory-mapped as a NumPy array.
+
+    `samples` has shape (frames, channels) in the file's integer sample
+    type. Slicing it is zero-copy, and writing to it (mode 'r+') writes the
+    file in place, so stages can hand audio to each other as views instead
+    of decoding and re-encoding whole files.
+
+    Args:
+        path: WAV file
+        mode: 'r' for read-only, 'r+' for read-write
+    """
+
+    def __init__(self, path, mode='r'):
+        params = wav_params(path)
+        self.path = path
+        self.channels = params['channels']
+        self.sample_width = params['sample_width']
+        self.sample_rate = params['sample_rate']
+
+        offset, size = _find_data_chunk(path)
+        frames = size // (self.channels * self.sample_width)
+        if frames == 0:
+            self.samples = np.zeros((0, self.channels), dtype=SAMPLE_TYPES[self.sample_width])
+        else:
+            self.samples = np.memmap(path, dtype=SAMPLE_TYPES[self.sample_width], mode=mode,
+                                     offset=offset, shape=(frames, self.channels))
+
+    @classmethod
+    def create(cls, path, frames, channels, sample_rate, sample_width=2):
+        """
+        Create a silent WAV file of a given length and map it for writing.
+
+        The file is extended with truncate(), so on most filesystems the
+        silence takes no disk space until written.
+        """
+        data_size = frames * channels * sample_width
+        with open(path, 'wb') as wav_file:
+            wav_file.write(struct.pack(
+                '<4sI4s4sIHHIIHH4sI',
+                b'RIFF', _HEADER_SIZE - 8 + data_size, b'WAVE',
+                b'fmt ', 16, 1, channels, sample_rate, sample_rate * channels * sample_width,
+                channels * sample_width, sample_width * 8,
+                b'data', data_size
+            ))
+            wav_file.truncate(_HEADER_SIZE + data_size)
+        return cls(path, mode='r+')
+
+    @property
+    def duration(self):
+        return len(self.samples) / self.sample_rate
+
+    def slice(self, start, end=None):
+        """Get the samples between two times in seconds, as a view (no copy)."""
+        first = int(round(start * self.sample_rate))
+        last = len(self.samples) if end is None else int(round(end * self.sample_rate))
+        return self.samples[first:last]
+
+    def flush(self):
+        """Write changes made through `samples` to the file."""
+        if isinstance(self.samples, np.memmap):
+            self.samples.flush()
+
+
+def assemble_wav(output_path, duration, pieces):
+    """
+    Place WAV pieces at given times in a new WAV file of a given duration.
+
+    The output is allocated once and each piece is copied into its slot
+    through a memory map; gaps are silent. A piece longer than the time up
+    to the next piece (or the end) is cut there. All pieces must share a
+    format.
+
+    Args:
+        output_path: WAV file to create
+        duration: Output duration in seconds
+        pieces: List of (start_seconds, wav_path), sorted by start
+
+    Returns:
+        str: output_path
+
+    Raises:
+        ValueError: If there are no pieces or their formats differ
+    """
+    if not pieces:
+        raise ValueError("Nothing to assemble")
+    sources = [(start, WavAudio(path)) for start, path in pieces]
+    first = sources[0][1]
+    formats = {(source.sample_rate, source.channels, source.sample_width) for _, source in sources}
+    if len(formats) > 1:
+        raise ValueError(f"Cannot assemble WAV pieces with different formats: {sorted(formats)}")
+
+    total = int(round(duration * first.sample_rate))
+    output = WavAudio.create(output_path, total, first.channels, first.sample_rate, first.sample_width)
+    slots = [int(round(start * first.sample_rate)) for start, _ in sources] + [total]
+    for index, (_, source) in enumerate(sources):
+        offset = min(slots[index], total)
+        length = min(len(source.samples), max(0, slots[index + 1] - offset))
+        if length < len(source.samples):
+            logger.debug(f"Cut {len(source.samples) - length} frames from {source.path} to fit its slot")
+        output.samples[offset:offset + length] = source.samples[:length]
+    output.flush()
+    return output_path
+
+
+def mp3_encoder_available():
+    """Check whether export_mp3 can run (it needs the ffmpeg command-line tool)."""
+    return shutil.which('ffmpeg') is not None
+
+
+def export_mp3(wav_path, mp3_path):
+    """
+    Encode a WAV file to MP3, the single lossy encode of the pipeline.
+
+    Raises:
+        RuntimeError: If ffmpeg is not installed
+        subprocess.CalledProcessError: If encoding fails
+    """
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        raise RuntimeError("MP3 export needs ffmpeg")
+    subprocess.run(
+        [ffmpeg, '-nostdin', '-loglevel', 'error', '-y', '-i', wav_path, '-codec:a', 'libmp3lame', '-q:a', '2',
+         mp3_path],
+        check=True
+    )
+
+
+def decoder_available():
+    """Check whether decode_blocks can run (it needs the ffmpeg command-line tool)."""
+    return shutil.which('ffmpeg') is not None
+
+
+def decode_blocks(source, sample_rate=ANALYSIS_SAMPLE_RATE, block_seconds=10):
+    """
+    Decode audio in any format ffmpeg reads (MP3, M4A, WebM...) to mono PCM, streaming.
+
+    Memory use is bounded by the block size, whatever the length of the audio.
+
+    Args:
+        source: Path of the audio file, or an iterable of the file's bytes in
+            order, e.g. as it downloads. The iterable is consumed on its own
+            thread, so it may block. Formats that need to seek (MP4 with the
+            index at the end) can only be decoded from a path.
+        sample_rate: Sample rate to decode at, in Hz
+        block_seconds: Audio per yielded block
+
+    Yields:
+        np.ndarray: float32 samples, shape (samples, 1)
+
+    Raises:
+        RuntimeError: If ffmpeg is not installed or cannot decode the audio
+    """
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        raise RuntimeError("Decoding needs ffmpeg")
+    from_path = isinstance(source, (str, os.PathLike))
+    process = subprocess.Popen(
+        [ffmpeg, '-nostdin', '-loglevel', 'error', '-i', source if from_path else 'pipe:0',
+         '-vn', '-ac', '1', '-ar', str(sample_rate), '-f', 's16le', 'pipe:1'],
+        stdin=subprocess.DEVNULL if from_path else subprocess.PIPE,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    if not from_path:
+        feeder = threading.Thread(target=_feed, args=(process.stdin, source), name='ffmpeg-feeder')
+        feeder.daemon = True
+        feeder.start()
+
+    block_bytes = max(1, int(block_seconds * sample_rate)) * 2
+    finished = False
+    try:
+        while True:
+            data = process.stdout.read(block_bytes)
+            if len(data) < 2:
+                break
+            yield from_pcm_bytes(data[:len(data) // 2 * 2], 2, 1)
+        finished = True
+    finally:
+        # After the end of the output ffmpeg exits by itself, though it may not have yet
+        if not finished and process.poll() is None:
+            # Stopped early by the caller
+            process.kill()
+        process.stdout.close()
+        error = process.stderr.read().decode('utf-8', 'replace').strip()
+        process.stderr.close()
+        process.wait()
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg could not decode the audio: {error or process.returncode}")
+
+
+def _feed(pipe, blocks):
+    """Write blocks of bytes to a pipe, then close it."""
+    try:
+        for block in blocks:
+            pipe.write(block)
+    except Exception as e:
+        # The decoder sees the input end early; a broken pipe means it already quit
+        if not isinstance(e, BrokenPipeError):
+            logger.warning(f"Stopped feeding audio to the decoder: {str(e)}")
+    finally:
+        try:
+            pipe.close()
+        except OSError:
+            pass
+
+
+def _find_data_chunk(path):
+    """Get the (offset, size) of a WAV file's sample data."""
+    with open(path, 'rb') as wav_file:
+        header = wav_file.read(12)
+        if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+            raise ValueError(f"Not a WAV file: {path}")
+        while True:
+            chunk = wav_file.read(8)
+            if len(chunk) < 8:
+                raise ValueError(f"WAV file has no data chunk: {path}")
+            chunk_id, size = chunk[:4], struct.unpack('<I', chunk[4:])[0]
+            if chunk_id == b'data':
+                return wav_file.tell(), size
+            # Chunks are padded to an even size
+            wav_file.seek(size + (size & 1), 1)
@@ -0,0 +1,118 @@
+import os
+import math
+import time
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+class SchedulerBusyError(Exception):
+    """Raised when the job queue is full and a new job cannot be admitted."""
+
+    def __init__(self, message, retry_after=30):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class JobScheduler:
+    """
+    Admission control and queue inspection for the shared job queue.
+
+    Jobs wait in the job store with status 'queued' until a worker claims
+    them (see worker.Worker); workers may run in this process or in any
+    other process sharing the store. Jobs with a lower priority value run
+    first; within a priority, tenants take turns and each tenant's jobs run
+    in submission order (see JobStore.claim). Once `max_queue_size` jobs
+    are waiting, new submissions are rejected with SchedulerBusyError
+    instead of piling up more work than the workers can drain. A batch is
+    admitted only if the queue has room for all of its jobs. The check is
+    not atomic with the insert, so concurrent submissions and batches may
+    overshoot the limit.
+    """
+
+    def __init__(self, store, max_queue_size=None, worker_timeout=None):
+        """
+        Args:
+            store: Job store holding the queue
+            max_queue_size: Maximum number of waiting jobs
+                (default: YT_TRANSLATOR_QUEUE_SIZE or 64)
+            worker_timeout: Seconds without a heartbeat after which a worker
+                no longer counts towards capacity (default: the lease time)
+        """
+        self.store = store
+        self.max_queue_size = max_queue_size or int(os.environ.get('YT_TRANSLATOR_QUEUE_SIZE', 64))
+        self.worker_timeout = worker_timeout or float(os.environ.get('YT_TRANSLATOR_LEASE_SECONDS', 60))
+
+    def admit(self, count=1):
+        """
+        Check that the queue has room for `count` more jobs.
+
+        Raises:
+            ValueError: If count is more than the queue can ever hold
+            SchedulerBusyError: If the queue has no room for them now
+        """
+        if count > self.max_queue_size:
+            raise ValueError(f'{count} videos to translate do not fit in the queue, '
+                             f'which holds {self.max_queue_size}')
+        stats = self.store.queue_stats(self.worker_timeout)
+        if stats['queue_depth'] + count > self.max_queue_size:
+            raise SchedulerBusyError(
+                'Translation queue is full, please retry later',
+                retry_after=self._estimate_retry_after(stats)
+            )
+
+    def get_queue_info(self, job_id):
+        """
+        Get queue position and wait estimates for a queued job.
+
+        Returns:
+            dict: Queue info, or None if the job is not waiting in the queue
+        """
+        position = self.store.queue_position(job_id)
+        if position is None:
+            return None
+
+        stats = self.store.queue_stats(self.worker_timeout)
+        job = self.store.get(job_id) or {}
+        info = {
+            'queue_position': position,
+            'queue_depth': stats['queue_depth'],
+            'queue_wait': round(time.time() - job.get('queued_at', time.time()), 1)
+        }
+        if stats['avg_run_time'] is not None and stats['worker_slots']:
+            info['estimated_wait'] = round(
+                math.ceil(position / stats['worker_slots']) * stats['avg_run_time'], 1
+            )
+        return info
+
+    def get_stats(self):
+        """Get a snapshot of the load on the queue and the worker fleet."""
+        stats = self.store.queue_stats(self.worker_timeout)
+        return {
+            'workers': stats['worker_slots'],
+            'active_jobs': stats['active_jobs'],
+            'queue_depth': stats['queue_depth'],
+            'max_queue_size': self.max_queue_size
+        }
+
+    def estimate_run_time(self, jobs):
+        """
+        Estimate how many seconds the worker fleet needs to run a number of jobs.
+
+        Returns:
+            float: The estimate, or None before any job has completed or
+                while no worker is alive
+        """
+        stats = self.store.queue_stats(self.worker_timeout)
+        if stats['avg_run_time'] is None or not stats['worker_slots']:
+            return None
+        return math.ceil(jobs / stats['worker_slots']) * stats['avg_run_time']
+
+    def _estimate_retry_after(self, stats):
+        """Estimate how many seconds until a queue slot frees up."""
+        if stats['avg_run_time'] is None or not stats['worker_slots']:
+            return 30
+        return max(1, int(stats['avg_run_time'] / stats['worker_slots']))
+
@@ -0,0 +1,86 @@
+import time
+import logging
+import threading
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Process-wide services, built on first use
+_translator = None
+_backends = None
+_downloader = None
+_lock = threading.Lock()
+
+
+def get_backends():
+    """
+    Get the process-wide transcription, translation and speech backends.
+
+    These are the long-lived service clients, shared by every job of the
+    process, so a real client keeps its connections open across jobs.
+
+    Returns:
+        dict: transcription_backend, translation_backend and speech_backend
+    """
+    global _backends
+    with _lock:
+        if _backends is None:
+            from backends import SimulatedTranscriptionBackend, SimulatedTranslationBackend, SimulatedSpeechBackend
+            _backends = {
+                'transcription_backend': SimulatedTranscriptionBackend(),
+                'translation_backend': SimulatedTranslationBackend(),
+                'speech_backend': SimulatedSpeechBackend(),
+            }
+        return _backends
+
+
+def get_downloader():
+    """Get the process-wide SegmentedDownloader, whose keep-alive connections all jobs share."""
+    global _downloader
+    with _lock:
+        if _downloader is None:
+            from downloader import SegmentedDownloader
+            _downloader = SegmentedDownloader()
+        return _downloader
+
+
+def get_translator():
+    """
+    Get the process-wide YouTubeTranslator, building it on first use.
+
+    Routes and workers share this one instance instead of building a
+    translator and audio processor per request. It is imported here rather
+    than at module level so importing the web app stays cheap.
+    """
+    global _translator
+    backends = get_backends()
+    with _lock:
+        if _translator is None:
+            from audio_processor import AudioProcessor
+            from yt_translator import YouTubeTranslator
+            _translator = YouTubeTranslator(AudioProcessor(**backends))
+        return _translator
+
+
+def warmup():
+    """
+    Build every service of this process ahead of the first request.
+
+    Meant for gunicorn's post_fork hook (see gunicorn.conf.py): everything
+    is created in the worker itself, never in the master before the fork,
+    so no threads, database connections or sockets are shared across
+    processes. Backends that fail to warm up are logged and left to
+    connect on first use.
+    """
+    start = time.perf_counter()
+    translator = get_translator()
+    translator.get_scheduler()
+    translator.get_result_cache()
+    translator.get_workspace()
+    for name, backend in get_backends().items():
+        try:
+            backend.warmup()
+        except Exception as e:
+            logger.warning(f"Could not warm up {name}: {str(e)}")
+    logger.info(f"Services ready in {time.perf_counter() - start:.2f}s")
@@ -1,18 +1,69 @@
-// Function to refresh the page if translation is in progress
+// Live progress updates for the result page
 document.addEventListener('DOMContentLoaded', function() {
-    // Check if we're on the result page
-    const progressBar = document.querySelector('.progress-bar');
+    const container = document.getElementById('job-progress');
     
-    if (progressBar) {
-        // Get progress value
-        const progress = parseInt(progressBar.style.width) || 0;
+    if (!container) {
+        return;
+    }
+    
+    const progressBar = container.querySelector('.progress-bar');
+    let version = parseInt(container.dataset.version, 10);
+    
+    // Update the progress section in place; reload once the job is finished
+    // so the server renders the download link or the error message
+    function render(status) {
+        if (status.status === 'completed' || status.status === 'error' || status.status === 'not_found') {
+            window.location.reload();
+            return true;
+        }
+        
+        const progress = Math.round(status.progress || 0);
+        progressBar.style.width = progress + '%';
+        container.querySelector('.job-percent').textContent = progress;
+        container.querySelector('.job-message').textContent = status.message;
         
-        // If job is not completed (progress < 100), set auto-refresh
-        if (progress < 100) {
-            // Check status every 5 seconds
-            setTimeout(function() {
-                window.location.reload();
-            }, 5000);
+        const queue = container.querySelector('.job-queue');
+        if (status.queue_position) {
+            container.querySelector('.job-queue-position').textContent = status.queue_position;
+            container.querySelector('.job-queue-depth').textContent = status.queue_depth;
+            queue.classList.remove('d-none');
+        } else {
+            queue.classList.add('d-none');
         }
+        
+        version = status.version;
+        return false;
+    }
+    
+    // Fallback for browsers without EventSource: long-poll the status endpoint
+    function longPoll() {
+        const url = container.dataset.statusUrl + '?wait=25&version=' + encodeURIComponent(version);
+        fetch(url, {cache: 'no-cache'})
+            .then(function(response) {
+                // 503 means the server is holding too many requests; retry later
+                if (!response.ok) {
+                    throw new Error('HTTP ' + response.status);
+                }
+                return response.json();
+            })
+            .then(function(status) {
+                if (!render(status)) {
+                    longPoll();
+                }
+            })
+            .catch(function() {
+                setTimeout(longPoll, 5000);
+            });
+    }
+    
+    if (window.EventSource) {
+        const source = new EventSource(container.dataset.streamUrl);
+        source.onmessage = function(event) {
+            if (render(JSON.parse(event.data))) {
+                source.close();
+            }
+        };
+    } else {
+        longPoll();
     }
 });
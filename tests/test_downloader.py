@@ -0,0 +1,264 @@
+import os
+import re
+import time
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from downloader import SegmentedDownloader, GrowingFile, DownloadError
+
+SEGMENT_SIZE = 1024 * 1024
+DATA = os.urandom(3 * SEGMENT_SIZE + 12345)
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves DATA with Range support, failing the requests the test server is told to fail."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        match = re.fullmatch(r'bytes=(\d+)-(\d+)', self.headers.get('Range', ''))
+        start, end = (int(match.group(1)), int(match.group(2))) if match else (0, len(DATA) - 1)
+        with server.lock:
+            server.requests.append((start, end) if match else None)
+            # The size probe (bytes=0-0) never fails
+            statuses = server.errors.get(start) if match and end > start else None
+            status = statuses.pop(0) if statuses else None
+            drop_after = server.drops.pop(start, None) if match and end > start else None
+
+        if status is not None:
+            self.send_response(status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if match and server.ranges:
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(DATA)}')
+        else:
+            start, end = 0, len(DATA) - 1
+            self.send_response(200)
+        self.send_header('ETag', '"v1"')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        body = DATA[start:end + 1]
+        if drop_after is not None:
+            # A dropped connection: part of the body, then nothing
+            self.wfile.write(body[:drop_after])
+            self.close_connection = True
+            return
+        for offset in range(0, len(body), 64 * 1024):
+            time.sleep(server.delay)
+            self.wfile.write(body[offset:offset + 64 * 1024])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    httpd.daemon_threads = True
+    httpd.lock = threading.Lock()
+    httpd.requests = []
+    # Range start -> error statuses to answer with, one per request
+    httpd.errors = {}
+    # Range start -> bytes to send before dropping the connection, once
+    httpd.drops = {}
+    httpd.ranges = True
+    # Seconds to wait before sending each 64 KiB of a body
+    httpd.delay = 0
+    httpd.url = f'http://127.0.0.1:{httpd.server_address[1]}/audio.webm'
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def downloader():
+    downloader = SegmentedDownloader(connections=3, segment_size=SEGMENT_SIZE, max_retries=2, timeout=10)
+    yield downloader
+    downloader.close()
+
+
+def segment_requests(server):
+    """Range requests for file data, leaving out the size probe."""
+    return [request for request in server.requests if request is not None and request[1] > request[0]]
+
+
+def read(path):
+    with open(path, 'rb') as source:
+        return source.read()
+
+
+def test_segmented_download_matches_source(server, downloader, tmp_path):
+    output_path = str(tmp_path / 'audio.webm')
+    reports = []
+
+    size = downloader.download(server.url, output_path, lambda done, total: reports.append((done, total)))
+
+    assert size == len(DATA)
+    assert read(output_path) == DATA
+    assert sorted(segment_requests(server)) == [
+        (start, min(start + SEGMENT_SIZE, len(DATA)) - 1) for start in range(0, len(DATA), SEGMENT_SIZE)
+    ]
+    assert reports[-1] == (len(DATA), len(DATA))
+    # Checkpoints are removed once the download is complete
+    assert not os.path.exists(tmp_path / 'checkpoints' / 'download_audio.webm')
+
+
+def test_resume_from_partial_file(server, downloader, tmp_path):
+    output_path = str(tmp_path / 'audio.webm')
+    server.errors[2 * SEGMENT_SIZE] = [404]
+
+    with pytest.raises(DownloadError):
+        downloader.download(server.url, output_path)
+    assert os.path.getsize(output_path) == len(DATA)
+
+    server.requests.clear()
+    downloader.download(server.url, output_path)
+
+    assert read(output_path) == DATA
+    assert segment_requests(server) == [(2 * SEGMENT_SIZE, 3 * SEGMENT_SIZE - 1)]
+
+
+def test_dropped_connection_resumes_mid_segment(server, downloader, tmp_path):
+    output_path = str(tmp_path / 'audio.webm')
+    server.drops[SEGMENT_SIZE] = 600 * 1024
+
+    downloader.download(server.url, output_path)
+
+    assert read(output_path) == DATA
+    retries = [start for start, end in segment_requests(server) if end == 2 * SEGMENT_SIZE - 1]
+    assert len(retries) == 2
+    # The retry asks only for the bytes after the last full read
+    assert SEGMENT_SIZE < retries[1] <= SEGMENT_SIZE + 600 * 1024
+
+
+def test_server_error_is_retried(server, downloader, tmp_path):
+    output_path = str(tmp_path / 'audio.webm')
+    server.errors[0] = [503]
+
+    downloader.download(server.url, output_path)
+
+    assert read(output_path) == DATA
+    assert segment_requests(server).count((0, SEGMENT_SIZE - 1)) == 2
+
+
+def test_server_error_gives_up_after_retries(server, downloader, tmp_path):
+    server.errors[0] = [503] * 10
+
+    with pytest.raises(DownloadError):
+        downloader.download(server.url, str(tmp_path / 'audio.webm'))
+    assert segment_requests(server).count((0, SEGMENT_SIZE - 1)) == 3
+
+
+def test_server_without_range_support(server, downloader, tmp_path):
+    output_path = str(tmp_path / 'audio.webm')
+    server.ranges = False
+    reports = []
+
+    size = downloader.download(server.url, output_path, lambda done, total: reports.append((done, total)))
+
+    assert size == len(DATA)
+    assert read(output_path) == DATA
+    # The size probe got the whole file, so nothing else was requested
+    assert len(server.requests) == 1
+    assert reports[-1] == (len(DATA), len(DATA))
+
+
+def read_while_downloading(growing_file, downloader, url, output_path):
+    """Download into growing_file while another thread reads it, like the translator does."""
+    received = []
+    complete_at_first_block = []
+    reader_error = []
+
+    def read():
+        try:
+            for block in growing_file.iter_bytes(64 * 1024):
+                if not received:
+                    complete_at_first_block.append(growing_file.complete)
+                received.append(block)
+        except DownloadError as e:
+            reader_error.append(e)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    try:
+        downloader.download(url, output_path, growing_file=growing_file)
+    except DownloadError as e:
+        # The translator reports a failed download to its readers the same way
+        growing_file.fail(e)
+    reader.join(10)
+    assert not reader.is_alive()
+    return b''.join(received), complete_at_first_block, reader_error
+
+
+@pytest.mark.parametrize('ranges', [True, False])
+def test_growing_file_read_while_downloading(server, downloader, tmp_path, ranges):
+    server.ranges = ranges
+    server.delay = 0.005
+    growing_file = GrowingFile()
+    advances = []
+    advance = growing_file.advance
+    growing_file.advance = lambda available: (advances.append(available), advance(available))
+
+    data, complete_at_first_block, reader_error = read_while_downloading(
+        growing_file, downloader, server.url, str(tmp_path / 'audio.webm')
+    )
+
+    assert not reader_error
+    assert data == DATA
+    # The reader started on the file before it was complete
+    assert complete_at_first_block == [False]
+    assert advances == sorted(advances)
+    assert growing_file.complete
+
+
+def test_growing_file_wait_async(server, downloader, tmp_path):
+    server.delay = 0.005
+    output_path = str(tmp_path / 'audio.webm')
+    growing_file = GrowingFile()
+
+    async def first_segment():
+        await growing_file.wait_async(SEGMENT_SIZE)
+        with open(growing_file.path, 'rb') as source:
+            return source.read(SEGMENT_SIZE), growing_file.complete
+
+    result = {}
+    reader = threading.Thread(target=lambda: result.update(first=asyncio.run(first_segment())))
+    reader.start()
+    downloader.download(server.url, output_path, growing_file=growing_file)
+    reader.join(10)
+
+    data, complete = result['first']
+    assert data == DATA[:SEGMENT_SIZE]
+    assert not complete
+
+
+def test_growing_file_reader_sees_failed_download(server, downloader, tmp_path):
+    server.errors[2 * SEGMENT_SIZE] = [404]
+    growing_file = GrowingFile()
+
+    data, _, reader_error = read_while_downloading(growing_file, downloader, server.url, str(tmp_path / 'audio.webm'))
+
+    assert len(reader_error) == 1
+    # Everything before the failed segment was readable
+    assert data == DATA[:len(data)]
+    assert len(data) <= 2 * SEGMENT_SIZE
+
+
+def test_cancelled_growing_file_stops_download(server, downloader, tmp_path):
+    server.delay = 0.01
+    growing_file = GrowingFile()
+    threading.Timer(0.1, growing_file.cancel).start()
+
+    started = time.monotonic()
+    with pytest.raises(DownloadError):
+        downloader.download(server.url, str(tmp_path / 'audio.webm'), growing_file=growing_file)
+    assert time.monotonic() - started < 1.0
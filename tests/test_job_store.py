@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+from job_store import MemoryJobStore, SQLiteJobStore
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        store = MemoryJobStore()
+    else:
+        store = SQLiteJobStore(str(tmp_path / 'jobs.db'))
+    # Let the flusher write each tick as soon as it is reported
+    store.flush_interval = 0
+    store.create('job', {'status': 'queued', 'progress': 0, 'message': 'Queued', 'youtube_url': 'url',
+                         'cache_key': 'key', 'queued_at': time.time()})
+    return store
+
+
+def state(job):
+    return job['status'], job['progress'], job['message']
+
+
+def test_tick_being_flushed_does_not_land_after_a_terminal_update(store):
+    write = store._write
+    flushing = threading.Event()
+    flushed = threading.Event()
+
+    def slow_write(job_id, fields, owner=None, unfinished_only=False):
+        if 'status' in fields:
+            return write(job_id, fields, owner, unfinished_only)
+        # Hold the flusher between taking the tick and writing it
+        flushing.set()
+        time.sleep(0.2)
+        try:
+            return write(job_id, fields, owner, unfinished_only)
+        finally:
+            flushed.set()
+
+    store._write = slow_write
+    store.update('job', status='translating', message='Translating...')
+    store.update_progress('job', 80, 'Translated 8/10 chunks')
+    assert flushing.wait(5)
+    store.update('job', status='completed', progress=100, message='Done')
+    assert flushed.wait(5)
+
+    assert state(store.get('job')) == ('completed', 100, 'Done')
+    assert state(store.get_many(['job'])['job']) == ('completed', 100, 'Done')
+
+
+def test_interleaved_ticks_and_terminal_update(store):
+    store.update('job', status='translating', message='Translating...')
+    ticks = threading.Thread(target=lambda: [store.update_progress('job', n % 90, f'Tick {n}') for n in range(2000)])
+    ticks.start()
+    time.sleep(0.01)
+    store.update('job', status='completed', progress=100, message='Done')
+    ticks.join()
+    store.flush()
+
+    assert state(store.get('job')) == ('completed', 100, 'Done')
+
+
+def test_tick_after_terminal_update_is_dropped(store):
+    store.update('job', status='error', message='Error: boom')
+    store.update_progress('job', 50, 'Late tick')
+
+    assert state(store.get('job')) == ('error', 0, 'Error: boom')
+    store.flush()
+    assert state(store.get('job')) == ('error', 0, 'Error: boom')
+
+
+def test_tick_is_written_only_for_the_lease_owner(store):
+    job_id, _ = store.claim('worker-2', 60, 3)
+    store.update_progress(job_id, 40, 'From the lost worker', owner='worker-1')
+    store.flush()
+    assert state(store.get(job_id)) == ('queued', 0, 'Queued')
+
+    store.update_progress(job_id, 40, 'From the lease owner', owner='worker-2')
+    store.flush()
+    assert state(store.get(job_id)) == ('queued', 40, 'From the lease owner')
+
+
+def test_update_writes_pending_tick_of_another_owner_separately(store):
+    job_id, _ = store.claim('worker-2', 60, 3)
+    store.update_progress(job_id, 40, 'From the lost worker', owner='worker-1')
+
+    assert store.update(job_id, owner='worker-2', status='translating', message='Translating...')
+    assert state(store.get(job_id)) == ('translating', 0, 'Translating...')
@@ -0,0 +1,245 @@
+import array
+import shutil
+import struct
+import subprocess
+
+import pytest
+
+import mp3_utils
+from mp3_utils import parse_frame_header, probe_mp3, concat_mp3
+
+# MPEG1 Layer III, 128 kbps, 44.1 kHz, joint stereo, no CRC
+HEADER = bytes((0xFF, 0xFB, 0x90, 0x64))
+SAMPLE_RATE = 44100
+FRAME_LENGTH = 417  # 144 * 128000 // 44100
+SAMPLES_PER_FRAME = 1152
+
+# Offset of the Xing/Info tag in an MPEG1 stereo frame: header and side info
+INFO_OFFSET = 4 + 32
+# The LAME tag follows the tag, flags, frame count, byte count, seek table and quality
+LAME_OFFSET = INFO_OFFSET + 120
+
+
+def audio_frame(fill, padded=False):
+    """An audio frame whose body is all `fill`, so frames can be told apart in the output."""
+    header = bytes((HEADER[0], HEADER[1], HEADER[2] | 0x02 if padded else HEADER[2], HEADER[3]))
+    return header + bytes([fill]) * (FRAME_LENGTH + padded - 4)
+
+
+def info_frame(frames, delay, padding, encoder=b'LAME3.100', crc=False):
+    """A LAME-style Info frame, built by hand rather than with mp3_utils."""
+    frame = bytearray(FRAME_LENGTH)
+    frame[0:4] = HEADER
+    frame[INFO_OFFSET:INFO_OFFSET + 4] = b'Info'
+    struct.pack_into('>III', frame, INFO_OFFSET + 4, 0x0F, frames, 0)
+    frame[LAME_OFFSET:LAME_OFFSET + 9] = encoder
+    frame[LAME_OFFSET + 21:LAME_OFFSET + 24] = ((delay << 12) | padding).to_bytes(3, 'big')
+    if crc:
+        struct.pack_into('>H', frame, LAME_OFFSET + 34, mp3_utils._crc16(frame[:LAME_OFFSET + 34]))
+    return bytes(frame)
+
+
+def write_mp3(path, frames, delay=None, padding=0, prefix=b'', suffix=b'', **tag):
+    data = b''.join(frames)
+    if delay is not None:
+        data = info_frame(len(frames), delay, padding, **tag) + data
+    path.write_bytes(prefix + data + suffix)
+    return str(path)
+
+
+def split_frames(data, start, count, length=FRAME_LENGTH):
+    return [data[start + index * length:start + (index + 1) * length] for index in range(count)]
+
+
+@pytest.mark.parametrize('header, expected', [
+    # MPEG1 Layer III 128 kbps 44.1 kHz stereo
+    (HEADER, dict(version=3, layer=3, bitrate=128000, sample_rate=44100, padding=0, channels=2,
+                  samples=1152, length=417, side_info_size=32)),
+    # Padded, mono
+    (bytes((0xFF, 0xFB, 0x92, 0xC4)), dict(padding=1, channels=1, length=418, side_info_size=17)),
+    # MPEG1 Layer III 320 kbps 48 kHz
+    (bytes((0xFF, 0xFB, 0xE4, 0x64)), dict(bitrate=320000, sample_rate=48000, length=960)),
+    # MPEG2 Layer III 64 kbps 22.05 kHz stereo
+    (bytes((0xFF, 0xF3, 0x80, 0x64)), dict(version=2, bitrate=64000, sample_rate=22050, samples=576,
+                                           length=208, side_info_size=17)),
+    # MPEG1 Layer II 192 kbps 48 kHz
+    (bytes((0xFF, 0xFD, 0xA4, 0x64)), dict(layer=2, bitrate=192000, samples=1152, length=576)),
+])
+def test_parse_frame_header(header, expected):
+    parsed = parse_frame_header(header, 0)._asdict()
+    assert {name: parsed[name] for name in expected} == expected
+
+
+@pytest.mark.parametrize('header', [
+    bytes((0xFF, 0xFB, 0xF0, 0x64)),  # bitrate index 15
+    bytes((0xFF, 0xFB, 0x00, 0x64)),  # free format
+    bytes((0xFF, 0xFB, 0x9C, 0x64)),  # sample rate index 3
+    bytes((0xFF, 0xEB, 0x90, 0x64)),  # reserved version
+    bytes((0xFF, 0xF9, 0x90, 0x64)),  # reserved layer
+    bytes((0xFE, 0xFB, 0x90, 0x64)),  # no sync word
+    HEADER[:3],
+])
+def test_parse_invalid_frame_header(header):
+    assert parse_frame_header(header, 0) is None
+
+
+def test_probe_counts_frames(tmp_path):
+    frames = [audio_frame(0x11, padded=index % 3 == 0) for index in range(50)]
+    info = probe_mp3(write_mp3(tmp_path / 'plain.mp3', frames))
+
+    assert info.frames == 50
+    assert info.sample_rate == SAMPLE_RATE
+    assert info.channels == 2
+    assert info.duration == pytest.approx(50 * SAMPLES_PER_FRAME / SAMPLE_RATE)
+    assert (info.data_offset, info.data_end) == (0, sum(len(frame) for frame in frames))
+    assert not info.has_info_frame
+
+
+def test_probe_skips_id3_tags(tmp_path):
+    # ID3v2 tag with a 300-byte body (syncsafe size) holding bytes that look like a frame sync
+    id3v2 = b'ID3\x04\x00\x00' + bytes((0, 0, 2, 44)) + HEADER * 75
+    id3v1 = b'TAG' + bytes(125)
+    frames = [audio_frame(0x22) for _ in range(20)]
+
+    info = probe_mp3(write_mp3(tmp_path / 'tagged.mp3', frames, prefix=id3v2, suffix=id3v1))
+
+    assert info.frames == 20
+    assert info.data_offset == len(id3v2)
+    assert info.data_end == len(id3v2) + 20 * FRAME_LENGTH
+
+
+def test_probe_reads_lame_delay_and_padding(tmp_path):
+    frames = [audio_frame(0x33) for _ in range(100)]
+    info = probe_mp3(write_mp3(tmp_path / 'lame.mp3', frames, delay=576, padding=1234))
+
+    assert info.has_info_frame
+    assert info.frames == 100
+    assert (info.encoder_delay, info.encoder_padding) == (576, 1234)
+    assert info.data_offset == FRAME_LENGTH
+    assert info.duration == pytest.approx((100 * SAMPLES_PER_FRAME - 576 - 1234) / SAMPLE_RATE)
+
+
+@pytest.mark.parametrize('tag, found', [
+    # FFmpeg writes its own encoder string in the LAME tag
+    (dict(encoder=b'Lavc61.3.'), True),
+    (dict(encoder=b'Lavf61.1.'), True),
+    (dict(encoder=b'XYZ1.0   ', crc=True), True),
+    (dict(encoder=b'XYZ1.0   '), False),
+])
+def test_probe_recognizes_lame_tag(tmp_path, tag, found):
+    frames = [audio_frame(0x34) for _ in range(100)]
+    info = probe_mp3(write_mp3(tmp_path / 'tagged.mp3', frames, delay=576, padding=1404, **tag))
+
+    expected = (576, 1404) if found else (0, 0)
+    assert (info.encoder_delay, info.encoder_padding) == expected
+
+
+def test_silent_frame():
+    frame = mp3_utils._silent_frame(HEADER)
+    header = parse_frame_header(frame, 0)
+
+    assert len(frame) == header.length == FRAME_LENGTH
+    assert (header.bitrate, header.sample_rate, header.channels, header.padding) == (128000, SAMPLE_RATE, 2, 0)
+    # No CRC, and zeroed side info and main data
+    assert frame[1] & 0x01
+    assert not any(frame[4:])
+
+
+def test_crc16_check_value():
+    # CRC-16/ARC check value
+    assert mp3_utils._crc16(b'123456789') == 0xBB3D
+
+
+def test_concat_places_pieces_and_writes_info_frame(tmp_path):
+    first = write_mp3(tmp_path / 'first.mp3', [audio_frame(0x41) for _ in range(40)], delay=576, padding=1000)
+    second = write_mp3(tmp_path / 'second.mp3', [audio_frame(0x42) for _ in range(40)], delay=576, padding=1000)
+    output = str(tmp_path / 'joined.mp3')
+
+    concat_mp3(output, 3.5, [(0.0, first), (2.0, second)])
+
+    # The timeline keeps the first piece's delay: 576 + 3.5 s of samples, rounded up to whole frames
+    total_samples = 576 + round(3.5 * SAMPLE_RATE)
+    total_frames = -(-total_samples // SAMPLES_PER_FRAME)
+    padding = total_frames * SAMPLES_PER_FRAME - total_samples
+    info = probe_mp3(output)
+    assert info.has_info_frame
+    assert info.frames == total_frames
+    assert (info.encoder_delay, info.encoder_padding) == (576, padding)
+    assert info.duration == pytest.approx(3.5, abs=1 / SAMPLE_RATE)
+
+    with open(output, 'rb') as output_file:
+        data = output_file.read()
+    frames = split_frames(data, info.data_offset, total_frames)
+    assert info.data_offset + total_frames * FRAME_LENGTH == len(data)
+    # Second piece starts at 2 s: round((576 + 2 * 44100 - 576) / 1152) = frame 77
+    start_of_second = round(2.0 * SAMPLE_RATE / SAMPLES_PER_FRAME)
+    silent = mp3_utils._silent_frame(HEADER)
+    assert frames[:40] == [audio_frame(0x41)] * 40
+    assert frames[40:start_of_second] == [silent] * (start_of_second - 40)
+    assert frames[start_of_second:start_of_second + 40] == [audio_frame(0x42)] * 40
+    assert frames[start_of_second + 40:] == [silent] * (total_frames - start_of_second - 40)
+
+    # Xing/Info and LAME fields, read at their byte offsets
+    assert data[INFO_OFFSET:INFO_OFFSET + 4] == b'Info'
+    flags, frame_count, byte_count = struct.unpack_from('>III', data, INFO_OFFSET + 4)
+    assert (flags, frame_count, byte_count) == (0x0F, total_frames, len(data))
+    assert data[LAME_OFFSET:LAME_OFFSET + 9] == b'LAME3.100'
+    assert int.from_bytes(data[LAME_OFFSET + 21:LAME_OFFSET + 24], 'big') == (576 << 12) | padding
+    assert struct.unpack_from('>I', data, LAME_OFFSET + 28)[0] == len(data)
+    assert struct.unpack_from('>H', data, LAME_OFFSET + 34)[0] == mp3_utils._crc16(data[:LAME_OFFSET + 34])
+
+
+def test_concat_cuts_overlapping_piece(tmp_path):
+    first = write_mp3(tmp_path / 'first.mp3', [audio_frame(0x51) for _ in range(40)], delay=576, padding=0)
+    second = write_mp3(tmp_path / 'second.mp3', [audio_frame(0x52) for _ in range(40)], delay=576, padding=0)
+    output = str(tmp_path / 'joined.mp3')
+
+    concat_mp3(output, 1.1, [(0.0, first), (0.5, second)])
+
+    info = probe_mp3(output)
+    with open(output, 'rb') as output_file:
+        frames = split_frames(output_file.read(), info.data_offset, info.frames)
+    # The first piece is cut where the second starts, the second where the output ends
+    start_of_second = round(0.5 * SAMPLE_RATE / SAMPLES_PER_FRAME)
+    assert info.frames < start_of_second + 40
+    assert frames[:start_of_second] == [audio_frame(0x51)] * start_of_second
+    assert frames[start_of_second:] == [audio_frame(0x52)] * (info.frames - start_of_second)
+
+
+def test_concat_rejects_mixed_formats(tmp_path):
+    first = write_mp3(tmp_path / 'first.mp3', [audio_frame(0x61) for _ in range(10)])
+    mono_header = bytes((0xFF, 0xFB, 0x90, 0xC4))
+    mono = write_mp3(tmp_path / 'mono.mp3', [mono_header + bytes(FRAME_LENGTH - 4) for _ in range(10)])
+
+    with pytest.raises(ValueError):
+        concat_mp3(str(tmp_path / 'joined.mp3'), 1.0, [(0.0, first), (0.5, mono)])
+    with pytest.raises(ValueError):
+        concat_mp3(str(tmp_path / 'empty.mp3'), 1.0, [])
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='needs ffmpeg')
+def test_concat_round_trips_through_a_decoder(tmp_path):
+    def encode_tone(name, seconds):
+        path = str(tmp_path / name)
+        subprocess.run(['ffmpeg', '-nostdin', '-loglevel', 'error', '-y', '-f', 'lavfi',
+                        '-i', f'sine=frequency=440:duration={seconds}', '-ac', '2', '-ar', str(SAMPLE_RATE),
+                        '-codec:a', 'libmp3lame', '-b:a', '128k', path], check=True)
+        return path
+
+    def loudness(samples, start, end):
+        window = samples[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)]
+        return sum(abs(sample) for sample in window) / len(window) / 32768
+
+    first = encode_tone('first.mp3', 1.0)
+    assert probe_mp3(first).duration == pytest.approx(1.0, abs=1 / SAMPLE_RATE)
+    output = concat_mp3(str(tmp_path / 'joined.mp3'), 3.5, [(0.0, first), (2.0, encode_tone('second.mp3', 1.0))])
+
+    decoded = subprocess.run(['ffmpeg', '-nostdin', '-loglevel', 'error', '-i', output, '-f', 's16le', '-ac', '1',
+                              'pipe:1'], check=True, capture_output=True).stdout
+    samples = array.array('h', decoded)
+    # The decoder trims the delay and padding from the LAME tag, leaving exactly the requested duration
+    assert len(samples) == round(3.5 * SAMPLE_RATE)
+    assert loudness(samples, 0.1, 0.9) > 0.02
+    assert loudness(samples, 1.1, 1.9) < 0.001
+    assert loudness(samples, 2.1, 2.9) > 0.02
+    assert loudness(samples, 3.1, 3.5) < 0.001
@@ -0,0 +1,81 @@
+import os
+import wave
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import pcm
+
+SAMPLE_RATE = 44100
+
+needs_ffmpeg = pytest.mark.skipif(not pcm.decoder_available(), reason='decoding needs ffmpeg')
+
+
+@pytest.fixture
+def tone_wav(tmp_path):
+    """Three seconds of a 440 Hz tone at 44.1 kHz."""
+    t = np.arange(3 * SAMPLE_RATE) / SAMPLE_RATE
+    samples = (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+    path = str(tmp_path / 'tone.wav')
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(SAMPLE_RATE)
+        wav_file.writeframes(pcm.to_pcm_bytes(samples, 2))
+    return path
+
+
+def file_blocks(path, size=4096):
+    with open(path, 'rb') as source:
+        while True:
+            block = source.read(size)
+            if not block:
+                return
+            yield block
+
+
+@needs_ffmpeg
+@pytest.mark.parametrize('repeat', range(5))
+def test_decode_path(tone_wav, repeat):
+    blocks = list(pcm.decode_blocks(tone_wav, block_seconds=1))
+
+    samples = np.concatenate(blocks)
+    assert samples.shape[1] == 1
+    assert abs(len(samples) - 3 * pcm.ANALYSIS_SAMPLE_RATE) <= 32
+    assert 0.3 < float(np.sqrt(np.mean(samples ** 2))) < 0.4
+
+
+@needs_ffmpeg
+def test_decode_stream(tone_wav):
+    from_path = np.concatenate(list(pcm.decode_blocks(tone_wav)))
+    from_stream = np.concatenate(list(pcm.decode_blocks(file_blocks(tone_wav))))
+
+    assert np.array_equal(from_path, from_stream)
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='the stand-in decoder is a shell script')
+def test_decoder_exiting_after_its_output_is_waited_for(tmp_path, monkeypatch):
+    # An ffmpeg stand-in that is still running for a while after closing its output
+    decoder = tmp_path / 'ffmpeg'
+    decoder.write_text('#!/bin/sh\nhead -c 32000 /dev/zero\nexec >&-\nsleep 0.3\n')
+    decoder.chmod(0o755)
+    monkeypatch.setenv('PATH', f"{tmp_path}{os.pathsep}{os.environ.get('PATH', '')}")
+
+    samples = np.concatenate(list(pcm.decode_blocks(str(tmp_path / 'audio.mp3'))))
+
+    assert len(samples) == 16000
+
+
+@needs_ffmpeg
+def test_stop_early(tone_wav):
+    blocks = pcm.decode_blocks(tone_wav, block_seconds=0.5)
+    next(blocks)
+    # Closing the generator stops ffmpeg without reporting an error
+    blocks.close()
+
+
+@needs_ffmpeg
+def test_undecodable_input():
+    with pytest.raises(RuntimeError):
+        list(pcm.decode_blocks(iter([b'not audio' * 1000])))
@@ -0,0 +1,117 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from time_stretch import TimeStretcher, stretch
+
+SAMPLE_RATE = 16000
+
+
+def sine(frequency, seconds, channels=1, sample_rate=SAMPLE_RATE):
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    tone = (0.5 * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+    return tone if channels == 1 else np.stack([tone] * channels, axis=1)
+
+
+def silence(seconds, sample_rate=SAMPLE_RATE):
+    return np.zeros(int(seconds * sample_rate), dtype=np.float32)
+
+
+def window_rms(samples, seconds=0.02, sample_rate=SAMPLE_RATE):
+    """RMS of consecutive windows of the given length."""
+    samples = samples.reshape(len(samples), -1).mean(axis=1)
+    size = int(seconds * sample_rate)
+    count = len(samples) // size
+    return np.sqrt(np.mean(samples[:count * size].reshape(count, size) ** 2, axis=1))
+
+
+def loud_span(samples, seconds=0.01, sample_rate=SAMPLE_RATE):
+    """Start and end time of the audible part of a signal."""
+    loud = np.nonzero(window_rms(samples, seconds, sample_rate) > 0.1)[0]
+    return loud[0] * seconds, (loud[-1] + 1) * seconds
+
+
+def dominant_frequency(samples, sample_rate=SAMPLE_RATE):
+    if samples.ndim > 1:
+        samples = samples.mean(axis=1)
+    spectrum = np.abs(np.fft.rfft(samples * np.hanning(len(samples))))
+    return np.fft.rfftfreq(len(samples), 1 / sample_rate)[np.argmax(spectrum)]
+
+
+@pytest.mark.parametrize('channels', [1, 2])
+@pytest.mark.parametrize('factor', [0.5, 0.75, 1.0, 1.25, 1.5, 2.0])
+def test_scalar_factor_length(factor, channels):
+    samples = sine(440, 1.3, channels)
+    out = stretch(samples, SAMPLE_RATE, factor)
+    assert out.ndim == samples.ndim
+    assert len(out) == round(len(samples) * factor)
+    if channels > 1:
+        assert out.shape[1] == channels
+
+
+@pytest.mark.parametrize('channels', [1, 2])
+def test_segment_factors_length(channels):
+    samples = sine(440, 3.0, channels)
+    segments = [(0.0, 0.8), (1.0, 1.6), (2.25, 1.1)]
+    out = stretch(samples, SAMPLE_RATE, segments)
+    expected = (1.0 * 0.8 + 1.25 * 1.6 + 0.75 * 1.1) * SAMPLE_RATE
+    assert len(out) == round(expected)
+
+
+@pytest.mark.parametrize('channels', [1, 2])
+def test_streaming_blocks_length(channels):
+    samples = sine(440, 2.0, channels)
+    stretcher = TimeStretcher(SAMPLE_RATE, channels, 1.3)
+    blocks = [stretcher.process(samples[i:i + 1234]) for i in range(0, len(samples), 1234)]
+    out = np.concatenate(blocks + [stretcher.flush()])
+    assert len(out) == round(len(samples) * 1.3)
+    assert out.shape[1] == channels
+
+
+@pytest.mark.parametrize('channels', [1, 2])
+@pytest.mark.parametrize('factor', [0.5, 0.8, 1.5, 2.0])
+def test_pitch_preserved(factor, channels):
+    samples = sine(440, 2.0, channels)
+    out = stretch(samples, SAMPLE_RATE, factor)
+    assert dominant_frequency(out) == pytest.approx(440, abs=5)
+
+
+@pytest.mark.parametrize('frequency', [150, 440, 1000])
+@pytest.mark.parametrize('factor', [0.5, 0.75, 1.5, 2.0])
+def test_no_dips_at_overlaps(factor, frequency):
+    # Frames overlapped out of phase partly cancel, which shows as dips in
+    # the level of a steady tone (about 20% for unaligned overlap-add)
+    out = stretch(sine(frequency, 2.0), SAMPLE_RATE, factor)
+    levels = window_rms(out)[5:-5]
+    assert levels.min() > 0.9 * levels.max()
+
+
+@pytest.mark.parametrize('factor', [0.5, 0.75, 1.25, 1.5, 2.0])
+def test_events_move_with_factor(factor):
+    samples = np.concatenate([silence(1.0), sine(440, 1.0), silence(0.5)])
+    start, end = loud_span(stretch(samples, SAMPLE_RATE, factor))
+    assert start == pytest.approx(1.0 * factor, abs=0.03)
+    assert end == pytest.approx(2.0 * factor, abs=0.03)
+
+
+def test_events_move_with_segment_factors():
+    samples = np.concatenate([silence(1.0), sine(440, 1.25), silence(0.75)])
+    out = stretch(samples, SAMPLE_RATE, [(0.0, 0.8), (1.0, 1.6), (2.25, 1.1)])
+    start, end = loud_span(out)
+    assert start == pytest.approx(1.0 * 0.8, abs=0.03)
+    assert end == pytest.approx(1.0 * 0.8 + 1.25 * 1.6, abs=0.03)
+
+
+@pytest.mark.parametrize('factor', [0.75, 1.3])
+def test_streaming_matches_whole_signal(factor):
+    samples = sine(440, 2.0)
+    stretcher = TimeStretcher(SAMPLE_RATE, 1, factor)
+    blocks = [stretcher.process(samples[i:i + 1234]) for i in range(0, len(samples), 1234)]
+    streamed = np.concatenate(blocks + [stretcher.flush()])
+    assert np.allclose(streamed.reshape(-1), stretch(samples, SAMPLE_RATE, factor).reshape(-1), atol=1e-5)
+
+
+@pytest.mark.parametrize('segments', [[(0, 0)], [(0.5, 1.0)], [], [(0, -1.0)]])
+def test_invalid_factors(segments):
+    with pytest.raises(ValueError):
+        TimeStretcher(SAMPLE_RATE, 1, segments)
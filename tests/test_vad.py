@@ -0,0 +1,130 @@
+import asyncio
+import threading
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from vad import SilenceIndex, SilenceTracker, FRAME_SECONDS, _runs
+
+SAMPLE_RATE = 16000
+
+
+def tone(seconds, amplitude=0.5, frequency=220):
+    t = np.arange(int(round(seconds * SAMPLE_RATE))) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+def silence(seconds):
+    return np.zeros(int(round(seconds * SAMPLE_RATE)), dtype=np.float32)
+
+
+@pytest.mark.parametrize('mask, min_length, expected', [
+    ([], 1, []),
+    ([False, False], 1, []),
+    ([True, True, True], 1, [(0, 3)]),
+    # Runs touching either end of the mask
+    ([True, False, False, True, True], 1, [(0, 1), (3, 5)]),
+    # Runs shorter than min_length are dropped
+    ([True, False, True, True, False, True, True, True], 2, [(2, 4), (5, 8)]),
+    ([True, False, True, True, False, True, True, True], 3, [(5, 8)]),
+    # A min_length of 0 still needs one frame
+    ([False, True, False], 0, [(1, 2)]),
+])
+def test_runs(mask, min_length, expected):
+    runs = _runs(np.array(mask, dtype=bool), min_length, 0.5)
+    assert runs == [(start * 0.5, end * 0.5) for start, end in expected]
+
+
+def test_finds_silent_regions():
+    samples = np.concatenate([tone(2.0), silence(0.5), tone(1.0), silence(0.1), tone(1.0)])
+    index = SilenceIndex.from_samples(samples, SAMPLE_RATE)
+
+    assert index.duration == pytest.approx(4.6)
+    # The 0.1 s gap is shorter than the shortest pause worth cutting at
+    assert index.regions == [pytest.approx((2.0, 2.5))]
+
+
+def test_boundary_lands_in_the_gap():
+    samples = np.concatenate([tone(4.8), silence(0.5), tone(4.7)])
+    index = SilenceIndex.from_samples(samples, SAMPLE_RATE)
+
+    boundaries = index.choose_boundaries(5.0, 1.0)
+
+    assert len(boundaries) == 3
+    assert boundaries[0] == 0.0 and boundaries[-1] == pytest.approx(10.0)
+    assert 4.8 <= boundaries[1] <= 5.3
+    assert boundaries[1] == pytest.approx(5.05, abs=FRAME_SECONDS)
+
+
+def test_gap_outside_the_window_is_ignored():
+    samples = np.concatenate([tone(6.8), silence(0.5), tone(2.7)])
+    index = SilenceIndex.from_samples(samples, SAMPLE_RATE)
+
+    boundary = index.choose_boundaries(5.0, 1.0)[1]
+
+    assert 4.0 <= boundary <= 6.0
+
+
+def test_without_a_gap_boundary_moves_to_the_quietest_frame():
+    # A dip of about 14 dB: quieter than anything else, but not silence
+    samples = np.concatenate([tone(5.6), tone(0.1, amplitude=0.1), tone(4.3)])
+    index = SilenceIndex.from_samples(samples, SAMPLE_RATE)
+    assert index.regions == []
+
+    boundary = index.choose_boundaries(5.0, 1.0)[1]
+
+    assert 5.6 <= boundary <= 5.7
+
+
+def test_without_a_gap_or_dip_boundary_stays_near_nominal():
+    index = SilenceIndex.from_samples(tone(10.0), SAMPLE_RATE)
+
+    boundary = index.choose_boundaries(5.0, 1.0)[1]
+
+    assert boundary == pytest.approx(5.0, abs=FRAME_SECONDS)
+
+
+def test_boundaries_of_empty_recording():
+    assert SilenceIndex.from_samples(np.zeros(0), SAMPLE_RATE).choose_boundaries(5.0, 1.0) == [0.0, 0.0]
+
+
+@pytest.mark.parametrize('block_size', [317, 1000, 4411, SAMPLE_RATE])
+def test_tracker_matches_index_of_whole_signal(block_size):
+    samples = np.concatenate([tone(2.0), silence(0.7), tone(1.5), silence(0.4), tone(1.234)]).reshape(-1, 1)
+    tracker = SilenceTracker(SAMPLE_RATE)
+    for start in range(0, len(samples), block_size):
+        tracker.feed(samples[start:start + block_size])
+    tracker.finish()
+
+    streamed = tracker.index()
+    whole = SilenceIndex.from_samples(samples, SAMPLE_RATE)
+
+    assert tracker.duration == pytest.approx(whole.duration)
+    assert np.allclose(streamed.energy_db, whole.energy_db)
+    assert streamed.regions == whole.regions
+    assert streamed.choose_boundaries(2.5, 1.0) == whole.choose_boundaries(2.5, 1.0)
+
+
+def test_tracker_wakes_waiters_as_audio_arrives():
+    tracker = SilenceTracker(SAMPLE_RATE)
+    samples = tone(3.0).reshape(-1, 1)
+
+    def feed():
+        for start in range(0, len(samples), 1234):
+            tracker.feed(samples[start:start + 1234])
+        tracker.finish()
+
+    async def wait_for(seconds):
+        await tracker.wait_async(seconds)
+        return tracker.duration
+
+    feeder = threading.Thread(target=feed)
+    feeder.start()
+    tracker.wait(1.0)
+    assert tracker.duration >= 1.0
+    assert asyncio.run(wait_for(2.0)) >= 2.0
+    # Waiting for more than there is returns once the audio has ended
+    tracker.wait(10.0)
+    assert tracker.finished
+    feeder.join()
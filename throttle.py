@@ -0,0 +1,281 @@
+import time
+import asyncio
+import logging
+import threading
+from backends import BackendError, BackendRateLimitError
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Calls faster than this are never counted as slow, whatever their average
+_MIN_SLOW_LATENCY = 0.1
+
+# Smoothing of the short- and long-run latency averages (weight of each new call)
+_SHORT_ALPHA = 0.3
+_LONG_ALPHA = 0.02
+
+
+class TokenBucket:
+    """
+    Rate limit in cost units, e.g. seconds of audio or characters.
+
+    The bucket holds up to `capacity` units and refills at `rate` units per
+    second. A call takes its whole cost at once and may overdraw the
+    bucket, so a call bigger than the capacity still runs; the calls after
+    it wait until the debt is repaid. Waiting calls are served in order.
+
+    Args:
+        rate: Units per second, or None for no rate limit
+        capacity: Maximum units saved up (default: one minute of rate)
+    """
+
+    def __init__(self, rate=None, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or (rate * 60 if rate else None)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def tokens(self):
+        """Units available now; negative while the bucket is in debt, None without a rate."""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+    def reserve(self, cost):
+        """
+        Take cost units.
+
+        Returns:
+            float: Seconds to wait before making the call
+        """
+        now = time.monotonic()
+        with self._lock:
+            pause = max(0.0, self._paused_until - now)
+            if not self.rate:
+                return pause
+            self._refill(now)
+            self._tokens -= cost
+            return max(pause, -self._tokens / self.rate)
+
+    async def acquire(self, cost):
+        """Take cost units, waiting until they are available."""
+        delay = self.reserve(cost)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds):
+        """Hold back every call for seconds, e.g. after the service rejected one as over quota."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def paused_for(self):
+        return max(0.0, self._paused_until - time.monotonic())
+
+    def _refill(self, now):
+        if self.rate:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class AdaptiveConcurrencyLimit:
+    """
+    Limit on calls in flight that adapts to the service (AIMD).
+
+    While the limit is in full use and calls succeed at their usual latency,
+    it grows by one per `limit` calls (additive increase). A failed call, a
+    rejected one or a run of slow ones halves it (multiplicative decrease),
+    at most once per round of calls: calls that started before the last
+    decrease do not count against the new limit. A call is slow when the
+    short-run average latency exceeds `latency_tolerance` times the long-run
+    average, so a single large call does not count as congestion.
+
+    Args:
+        initial: Starting limit
+        minimum: Lowest limit
+        maximum: Highest limit
+        latency_tolerance: Slowdown over the long-run latency that counts as congestion
+        backoff: Factor applied to the limit on congestion
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=32, latency_tolerance=2.0, backoff=0.5):
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.limit = float(min(max(initial, minimum), self.maximum))
+        self.in_flight = 0
+        self.decreases = 0
+        self.short_latency = None
+        self.long_latency = None
+        self._decreased_at = 0.0
+        self._waiters = []
+        self._lock = threading.Lock()
+
+    @property
+    def waiting(self):
+        with self._lock:
+            return len(self._waiters)
+
+    async def acquire(self):
+        """Wait for a free slot."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._waiters and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return
+            future = loop.create_future()
+            self._waiters.append((loop, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just before the cancellation; pass the slot on
+                self.release(None, None)
+            raise
+
+    def release(self, started, latency, congested=False):
+        """
+        Free a slot and adapt the limit to how the call went.
+
+        Args:
+            started: time.monotonic() when the call started, or None to
+                free the slot without adapting
+            latency: Seconds the call took, or None if it failed
+            congested: Whether the call failed or was rejected in a way that
+                means the service is overloaded
+        """
+        with self._lock:
+            self.in_flight -= 1
+            if started is not None:
+                if latency is not None:
+                    congested = self._observe(latency) or congested
+                if congested:
+                    if started >= self._decreased_at:
+                        self.limit = max(self.minimum, self.limit * self.backoff)
+                        self._decreased_at = time.monotonic()
+                        self.decreases += 1
+                        # Slow calls so far led to this decrease; the next one needs new ones
+                        self.short_latency = self.long_latency
+                elif self.in_flight + 1 >= int(self.limit) or self._waiters:
+                    # Only grow a limit that is actually holding calls back
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._wake()
+
+    def _observe(self, latency):
+        """Update the latency averages; returns whether calls are slow."""
+        if self.long_latency is None:
+            self.short_latency = self.long_latency = latency
+            return False
+        self.short_latency += _SHORT_ALPHA * (latency - self.short_latency)
+        self.long_latency += _LONG_ALPHA * (latency - self.long_latency)
+        return self.short_latency > max(_MIN_SLOW_LATENCY, self.latency_tolerance * self.long_latency)
+
+    def _wake(self):
+        # Called with the lock held
+        while self._waiters and self.in_flight < int(self.limit):
+            loop, future = self._waiters.pop(0)
+            if future.done():
+                continue
+            self.in_flight += 1
+            loop.call_soon_threadsafe(self._grant, future)
+
+    def _grant(self, future):
+        # On the waiter's event loop
+        if future.done():
+            # Cancelled after the slot was assigned; pass it on
+            self.release(None, None)
+        else:
+            future.set_result(None)
+
+
+class Throttle:
+    """
+    Rate and concurrency limits for calls to one backend service.
+
+    Every call first takes its cost from a TokenBucket sized from the
+    service quota, then waits for a slot under an AdaptiveConcurrencyLimit.
+    A call the service rejects as over quota (BackendRateLimitError) halves
+    the concurrency limit, holds back all calls for the Retry-After time and
+    is retried through the same limits, up to `max_retries` times; other
+    backend errors also halve the limit and are raised at once.
+
+    The limits are per process. With several worker processes, give each a
+    share of the quota.
+
+    Args:
+        name: Backend name, e.g. 'transcription'
+        unit: Cost unit, e.g. 'audio seconds'
+        quota: Cost units per minute, or None for no rate limit
+        initial_concurrency: Starting concurrency limit
+        max_concurrency: Highest concurrency limit
+        max_retries: Retries of a call rejected as over quota
+    """
+
+    def __init__(self, name, unit, quota=None, initial_concurrency=4, max_concurrency=32, max_retries=3):
+        self.name = name
+        self.unit = unit
+        self.quota = quota
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(quota / 60 if quota else None)
+        self.concurrency = AdaptiveConcurrencyLimit(initial_concurrency, maximum=max_concurrency)
+        self.rate_limited = 0
+        self.errors = 0
+
+    async def call(self, cost, func, *args):
+        """
+        Call `await func(*args)` within the limits.
+
+        Args:
+            cost: Cost of the call in self.unit
+
+        Returns:
+            tuple: (result, seconds spent waiting for the limits)
+        """
+        waited = 0.0
+        for attempt in range(self.max_retries + 1):
+            queued = time.monotonic()
+            await self.bucket.acquire(cost)
+            await self.concurrency.acquire()
+            started = time.monotonic()
+            waited += started - queued
+            try:
+                result = await func(*args)
+            except BackendRateLimitError as e:
+                self.rate_limited += 1
+                self.concurrency.release(started, None, congested=True)
+                retry_after = e.retry_after or 2 ** attempt
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"{self.name} backend is over quota, retrying in {retry_after:.1f}s: {str(e)}")
+                self.bucket.pause(retry_after)
+                continue
+            except (BackendError, OSError, asyncio.TimeoutError):
+                self.errors += 1
+                self.concurrency.release(started, None, congested=True)
+                raise
+            except BaseException:
+                self.concurrency.release(None, None)
+                raise
+            self.concurrency.release(started, time.monotonic() - started)
+            return result, waited
+
+    def get_stats(self):
+        """Get the current limits, for metrics and monitoring."""
+        tokens = self.bucket.tokens
+        return {
+            'unit': self.unit,
+            'quota': self.quota,
+            'tokens': round(tokens, 1) if tokens is not None else None,
+            'paused_for': round(self.bucket.paused_for(), 1),
+            'concurrency_limit': round(self.concurrency.limit, 2),
+            'in_flight': self.concurrency.in_flight,
+            'waiting': self.concurrency.waiting,
+            'latency': round(self.concurrency.long_latency, 3) if self.concurrency.long_latency is not None else None,
+            'decreases': self.concurrency.decreases,
+            'rate_limited': self.rate_limited,
+            'errors': self.errors
+        }
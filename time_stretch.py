@@ -0,0 +1,233 @@
+import wave
+import bisect
+import logging
+
+import numpy as np
+
+from pcm import wav_params, iter_wav_blocks, to_pcm_bytes
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Analysis frame length in seconds; ~20ms keeps pitch periods intact
+FRAME_SECONDS = 0.02
+
+# Frames per vectorized overlap-add batch
+_BATCH_FRAMES = 256
+
+
+class TimeStretcher:
+    """
+    Streaming WSOLA (waveform similarity overlap-add) time-scale modification.
+
+    Changes the duration of audio without changing its pitch. Output frames
+    are taken from the input at positions advancing by synthesis hop /
+    factor, each shifted within a small tolerance to the position that best
+    continues the previous frame's waveform, and overlap-added with a Hann
+    window at 50% overlap.
+
+    Input is fed in blocks of any size with process() and the remainder is
+    drained with flush(); memory stays bounded by the block size plus a few
+    frames. The overlap-add is vectorized over batches of frames; only the
+    similarity search runs per frame.
+
+    Args:
+        sample_rate: Sample rate in Hz
+        channels: Number of channels
+        factor: Output duration / input duration (2.0 doubles the length).
+            Either a number, or a list of (input_start_seconds, factor)
+            segments sorted by start, the first starting at 0
+    """
+
+    def __init__(self, sample_rate, channels, factor):
+        segments = [(0.0, factor)] if isinstance(factor, (int, float)) else list(factor)
+        if not segments or segments[0][0] != 0 or any(f <= 0 for _, f in segments):
+            raise ValueError("Stretch factors must be positive and the first segment must start at 0")
+
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self._segment_starts = [int(round(start * sample_rate)) for start, _ in segments]
+        self._segment_factors = [float(f) for _, f in segments]
+
+        self.frame_length = max(64, int(sample_rate * FRAME_SECONDS) // 2 * 2)
+        self.hop = self.frame_length // 2
+        self.tolerance = self.hop // 2
+        # Periodic Hann window: sums to exactly 1 at 50% overlap
+        self._window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(self.frame_length) / self.frame_length))
+        self._window = self._window.astype(np.float32)[:, None]
+
+        self._buffer = np.zeros((0, channels), dtype=np.float32)
+        self._buffer_start = 0           # input index of _buffer[0]
+        self._input_length = 0           # input samples received
+        self._analysis = 0.0             # nominal input position of the next frame
+        self._previous = None            # input position of the last frame taken
+        self._tail = np.zeros((self.hop, channels), dtype=np.float32)
+        self._expected_output = 0.0      # output samples the input so far should produce
+        self._emitted = 0                # output samples returned so far
+
+    def process(self, block):
+        """
+        Feed a block of input samples.
+
+        Args:
+            block: Array of shape (samples, channels) or (samples,) for mono
+
+        Returns:
+            np.ndarray: Output samples produced so far, shape (samples, channels)
+        """
+        block = np.asarray(block, dtype=np.float32).reshape(-1, self.channels)
+        self._expected_output += self._output_length_for(self._input_length, self._input_length + len(block))
+        self._input_length += len(block)
+        self._buffer = np.concatenate([self._buffer, block])
+        return self._run(final=False)
+
+    def flush(self):
+        """
+        Drain the remaining input.
+
+        Returns:
+            np.ndarray: The last output samples; together with everything
+                process() returned, exactly round(input length * factor) samples
+        """
+        # Silence past the end lets the last frames be taken normally
+        padding = np.zeros((self.frame_length + 2 * self.tolerance + self.hop, self.channels), dtype=np.float32)
+        self._buffer = np.concatenate([self._buffer, padding])
+        emitted = self._emitted
+        output = np.concatenate([self._run(final=True), self._tail])
+
+        # Trim (or pad) to the exact expected length
+        remaining = max(0, int(round(self._expected_output)) - emitted)
+        output = output[:remaining]
+        if len(output) < remaining:
+            output = np.concatenate([output, np.zeros((remaining - len(output), self.channels), dtype=np.float32)])
+        self._emitted = emitted + len(output)
+        return output
+
+    def _run(self, final):
+        """Take every frame the buffered input allows, in batches."""
+        outputs = []
+        while True:
+            positions = self._choose_positions(final)
+            if not positions:
+                break
+            outputs.append(self._overlap_add(positions))
+        self._discard_consumed()
+        if not outputs:
+            return np.zeros((0, self.channels), dtype=np.float32)
+        output = np.concatenate(outputs)
+        self._emitted += len(output)
+        return output
+
+    def _choose_positions(self, final):
+        """Pick the input positions of up to _BATCH_FRAMES frames (the similarity search)."""
+        positions = []
+        buffer_end = self._buffer_start + len(self._buffer)
+        # The mono mix is only used to compare waveforms
+        mono = self._buffer.mean(axis=1) if self.channels > 1 else self._buffer[:, 0]
+        n = self.frame_length
+
+        while len(positions) < _BATCH_FRAMES:
+            # During flush, stop once the output covers the expected length
+            if final and self._emitted + (len(positions) + 1) * self.hop > self._expected_output + self.hop:
+                break
+
+            nominal = int(round(self._analysis))
+            low = max(0, nominal - self.tolerance)
+            high = nominal + self.tolerance
+            if self._previous is None:
+                needed_end = nominal + n
+            else:
+                needed_end = max(high + n, self._previous + self.hop + n)
+            if needed_end > buffer_end:
+                break
+
+            if self._previous is None:
+                position = nominal
+            else:
+                # Best match for the natural continuation of the previous frame
+                template = mono[self._previous + self.hop - self._buffer_start:][:n]
+                region = mono[low - self._buffer_start:high + n - self._buffer_start]
+                position = low + int(np.argmax(np.correlate(region, template, mode='valid')))
+
+            positions.append(position)
+            self._previous = position
+            self._analysis += self.hop / self._factor_at(self._analysis)
+        return positions
+
+    def _overlap_add(self, positions):
+        """Window the chosen frames and overlap-add them in one vectorized step."""
+        offsets = np.asarray(positions) - self._buffer_start
+        frames = self._buffer[offsets[:, None] + np.arange(self.frame_length)] * self._window
+        # At 50% overlap, each output hop is a frame's first half plus the previous frame's second half
+        previous_halves = np.concatenate([self._tail[None], frames[:-1, self.hop:]])
+        self._tail = frames[-1, self.hop:].copy()
+        return (frames[:, :self.hop] + previous_halves).reshape(-1, self.channels)
+
+    def _discard_consumed(self):
+        """Drop input that no future frame can reach."""
+        keep_from = int(self._analysis) - self.tolerance
+        if self._previous is not None:
+            keep_from = min(keep_from, self._previous + self.hop)
+        drop = min(max(0, keep_from - self._buffer_start), len(self._buffer))
+        if drop:
+            self._buffer = self._buffer[drop:]
+            self._buffer_start += drop
+
+    def _factor_at(self, position):
+        return self._segment_factors[bisect.bisect_right(self._segment_starts, position) - 1]
+
+    def _output_length_for(self, start, end):
+        """Output samples that input samples [start, end) should produce."""
+        total = 0.0
+        for index, segment_start in enumerate(self._segment_starts):
+            segment_end = self._segment_starts[index + 1] if index + 1 < len(self._segment_starts) else end
+            overlap = min(end, segment_end) - max(start, segment_start)
+            if overlap > 0:
+                total += overlap * self._segment_factors[index]
+        return total
+
+
+def stretch(samples, sample_rate, factor):
+    """
+    Time-stretch a whole array of samples.
+
+    Args:
+        samples: Array of shape (samples, channels) or (samples,)
+        sample_rate: Sample rate in Hz
+        factor: Output duration / input duration, or per-segment factors
+            (see TimeStretcher)
+
+    Returns:
+        np.ndarray: Stretched samples, float32, same number of dimensions as the input
+    """
+    samples = np.asarray(samples, dtype=np.float32)
+    channels = 1 if samples.ndim == 1 else samples.shape[1]
+    stretcher = TimeStretcher(sample_rate, channels, factor)
+    output = np.concatenate([stretcher.process(samples), stretcher.flush()])
+    return output[:, 0] if samples.ndim == 1 else output
+
+
+def stretch_wav(input_path, output_path, factor, block_seconds=10):
+    """
+    Time-stretch a PCM WAV file into a new WAV file, streaming in blocks.
+
+    Args:
+        input_path: Source WAV file (8, 16 or 32-bit PCM)
+        output_path: Destination WAV file, same format as the source
+        factor: Output duration / input duration, or per-segment factors
+            (see TimeStretcher)
+        block_seconds: Input read per block; bounds memory use
+
+    Raises:
+        ValueError: If the sample width is not supported
+    """
+    params = wav_params(input_path)
+    stretcher = TimeStretcher(params['sample_rate'], params['channels'], factor)
+    with wave.open(output_path, 'wb') as destination:
+        destination.setnchannels(params['channels'])
+        destination.setsampwidth(params['sample_width'])
+        destination.setframerate(params['sample_rate'])
+        for block in iter_wav_blocks(input_path, block_seconds):
+            destination.writeframes(to_pcm_bytes(stretcher.process(block), params['sample_width']))
+        destination.writeframes(to_pcm_bytes(stretcher.flush(), params['sample_width']))
@@ -0,0 +1,223 @@
+import re
+import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Sentence boundary: terminal punctuation followed by whitespace
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+
+def split_sentences(text):
+    """Split a transcript into sentences."""
+    return [sentence for sentence in _SENTENCE_BOUNDARY.split(text.strip()) if sentence]
+
+
+def normalize_sentence(sentence):
+    """Normalize a sentence for lookup: Unicode NFC and collapsed whitespace."""
+    return ' '.join(unicodedata.normalize('NFC', sentence).split())
+
+
+class TranslationMemory:
+    """
+    Sentence-level cache of translations, stored in SQLite.
+
+    Transcripts are split into sentences and each (normalized sentence,
+    target language) pair is looked up; only the misses are sent to the
+    translation backend, in one batch. Recurring content such as intros,
+    outros and sponsor reads is therefore translated once. Entries are
+    evicted least recently used first once the stored text exceeds
+    `max_bytes`.
+    """
+
+    def __init__(self, db_path, max_bytes=256 * 1024 * 1024):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'hit_chars': 0, 'miss_chars': 0, 'evictions': 0}
+        self._init_schema()
+
+    def _connect(self):
+        """Get this thread's database connection."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS segments (
+                source_hash TEXT NOT NULL,
+                target_language TEXT NOT NULL,
+                translation TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (source_hash, target_language)
+            );
+            CREATE INDEX IF NOT EXISTS idx_segments_last_used ON segments(last_used);
+            CREATE TABLE IF NOT EXISTS tm_meta (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            -- Running total of stored bytes, so eviction never scans the table
+            INSERT OR IGNORE INTO tm_meta (name, value)
+                SELECT 'total_bytes', COALESCE(SUM(size), 0) FROM segments;
+        """)
+
+    def translate(self, text, target_language, backend):
+        """
+        Translate text, reusing stored sentence translations.
+
+        Args:
+            text: Source text
+            target_language: Target language code
+            backend: Callable (list of sentences, target_language) -> list of
+                translations, called once with all the misses
+
+        Returns:
+            str: Translated text
+        """
+        lookup = self._begin(text, target_language)
+        misses = lookup['misses']
+        if misses:
+            self._add(lookup, backend(list(misses.values()), target_language), target_language)
+        return self._finish(lookup)
+
+    async def translate_async(self, text, target_language, backend):
+        """
+        Async version of translate.
+
+        `backend` is a coroutine function with the same arguments; database
+        work runs on the event loop's default executor.
+        """
+        loop = asyncio.get_running_loop()
+        lookup = await loop.run_in_executor(None, self._begin, text, target_language)
+        misses = lookup['misses']
+        if misses:
+            translations = await backend(list(misses.values()), target_language)
+            await loop.run_in_executor(None, self._add, lookup, translations, target_language)
+        return self._finish(lookup)
+
+    def _begin(self, text, target_language):
+        """Look up every sentence of text and collect the distinct misses."""
+        sentences = [normalize_sentence(sentence) for sentence in split_sentences(text)]
+        keys = [self._hash(sentence) for sentence in sentences]
+        found = self._lookup(set(keys), target_language)
+
+        # Translate each distinct missing sentence once
+        misses = {}
+        for key, sentence in zip(keys, sentences):
+            if key not in found and key not in misses:
+                misses[key] = sentence
+        return {'sentences': sentences, 'keys': keys, 'found': found, 'misses': misses}
+
+    def _add(self, lookup, translations, target_language):
+        """Store the backend's translations of the misses."""
+        new_entries = dict(zip(lookup['misses'].keys(), translations))
+        self._store(new_entries, target_language)
+        lookup['found'].update(new_entries)
+
+    def _finish(self, lookup):
+        """Update the counters and join the translated sentences."""
+        sentences = lookup['sentences']
+        misses = lookup['misses']
+
+        # Repeats within the same text count as hits: they were not sent either
+        miss_chars = sum(len(sentence) for sentence in misses.values())
+        with self._stats_lock:
+            self._stats['hits'] += len(sentences) - len(misses)
+            self._stats['hit_chars'] += sum(len(sentence) for sentence in sentences) - miss_chars
+            self._stats['misses'] += len(misses)
+            self._stats['miss_chars'] += miss_chars
+
+        return ' '.join(lookup['found'][key] for key in lookup['keys'])
+
+    def get_stats(self):
+        """
+        Get hit/miss counters for this process.
+
+        `hit_chars` is the number of source characters that did not have to
+        be sent to the backend, which is what translation is billed by.
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def _lookup(self, keys, target_language):
+        """Fetch stored translations and mark them as recently used."""
+        if not keys:
+            return {}
+        conn = self._connect()
+        placeholders = ', '.join('?' for _ in keys)
+        rows = conn.execute(
+            f'SELECT source_hash, translation FROM segments '
+            f'WHERE target_language = ? AND source_hash IN ({placeholders})',
+            (target_language, *keys)
+        ).fetchall()
+        found = dict(rows)
+        if found:
+            conn.execute(
+                f'UPDATE segments SET last_used = ? '
+                f'WHERE target_language = ? AND source_hash IN ({", ".join("?" for _ in found)})',
+                (time.time(), target_language, *found)
+            )
+        return found
+
+    def _store(self, entries, target_language):
+        """Insert new translations, then evict down to the byte budget."""
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            added = 0
+            for key, translation in entries.items():
+                size = len(translation.encode('utf-8')) + len(key)
+                # Another process may have stored the same sentence meanwhile
+                inserted = conn.execute(
+                    'INSERT OR IGNORE INTO segments (source_hash, target_language, translation, size, last_used) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (key, target_language, translation, size, now)
+                ).rowcount
+                added += size if inserted else 0
+            conn.execute("UPDATE tm_meta SET value = value + ? WHERE name = 'total_bytes'", (added,))
+            self._evict(conn)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT value FROM tm_meta WHERE name = 'total_bytes'").fetchone()[0]
+        excess = total - self.max_bytes
+        if excess <= 0:
+            return
+
+        victims = []
+        freed = 0
+        for rowid, size in conn.execute('SELECT rowid, size FROM segments ORDER BY last_used'):
+            victims.append((rowid,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany('DELETE FROM segments WHERE rowid = ?', victims)
+        conn.execute("UPDATE tm_meta SET value = value - ? WHERE name = 'total_bytes'", (freed,))
+
+        with self._stats_lock:
+            self._stats['evictions'] += len(victims)
+        logger.debug(f"Evicted {len(victims)} translation memory entries")
+
+    def _hash(self, sentence):
+        return hashlib.sha256(sentence.encode('utf-8')).hexdigest()
@@ -0,0 +1,276 @@
+import asyncio
+import logging
+import threading
+
+import numpy as np
+
+from pcm import wav_params, iter_wav_blocks
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Analysis frame length in seconds (rounded to whole samples)
+FRAME_SECONDS = 0.02
+
+# Shortest pause worth cutting at
+MIN_SILENCE_SECONDS = 0.3
+
+# Frames quieter than this many dB below the loud (95th percentile) level are silent
+SILENCE_DB_BELOW_LOUD = 35.0
+
+# Frames just above the silence level count as silence unless their zero-crossing
+# rate looks like unvoiced speech (s, f, sh)
+QUIET_DB_ABOVE_SILENCE = 6.0
+UNVOICED_ZCR = 0.25
+
+# Frames within this many dB of the quietest count as equally quiet when no pause is found
+QUIET_TIE_DB = 1.0
+
+
+class SilenceIndex:
+    """
+    Index of the pauses in a recording, from an energy / zero-crossing
+    voice-activity detector.
+
+    Built from per-frame RMS energy and zero-crossing rate, computed with
+    vectorized NumPy over the PCM in a single pass. A frame is silent when
+    its energy is far below the recording's loud level, or slightly above
+    that but without the high zero-crossing rate of unvoiced consonants.
+
+    Attributes:
+        duration: Length of the recording in seconds
+        regions: List of (start_seconds, end_seconds) silent regions
+    """
+
+    def __init__(self, energy_db, zero_crossing_rate, frame_seconds, min_silence_seconds=MIN_SILENCE_SECONDS):
+        self.frame_seconds = frame_seconds
+        self.energy_db = energy_db
+        self.duration = len(energy_db) * frame_seconds
+
+        if len(energy_db):
+            loud = np.percentile(energy_db, 95)
+            threshold = loud - SILENCE_DB_BELOW_LOUD
+            silent = (energy_db < threshold) | (
+                (energy_db < threshold + QUIET_DB_ABOVE_SILENCE) & (zero_crossing_rate < UNVOICED_ZCR)
+            )
+        else:
+            silent = np.zeros(0, dtype=bool)
+        self.regions = _runs(silent, int(round(min_silence_seconds / frame_seconds)), frame_seconds)
+
+    @classmethod
+    def from_samples(cls, samples, sample_rate, **kwargs):
+        """Build the index from float samples, shape (samples, channels) or (samples,)."""
+        samples = np.asarray(samples, dtype=np.float32)
+        frame_length = _frame_length(sample_rate)
+        if samples.ndim == 1:
+            samples = samples[:, np.newaxis]
+        energy_db, zcr = _frame_features(samples, frame_length)
+        return cls(energy_db, zcr, frame_length / sample_rate, **kwargs)
+
+    @classmethod
+    def from_blocks(cls, blocks, sample_rate, **kwargs):
+        """Build the index from blocks of float samples, shape (samples, channels), in one pass."""
+        tracker = SilenceTracker(sample_rate, **kwargs)
+        for block in blocks:
+            tracker.feed(block)
+        return tracker.index()
+
+    @classmethod
+    def from_wav(cls, path, block_seconds=60, **kwargs):
+        """Build the index from a PCM WAV file, streaming it in blocks."""
+        return cls.from_blocks(iter_wav_blocks(path, block_seconds), wav_params(path)['sample_rate'], **kwargs)
+
+    def choose_boundaries(self, chunk_duration, window):
+        """
+        Choose chunk boundaries at pauses.
+
+        The recording is divided into ceil(duration / chunk_duration) chunks
+        of equal nominal length, which keeps parallel work balanced. Each
+        nominal boundary moves to the middle of the silent region nearest to
+        it within +/- window seconds; with no silence in the window, to the
+        quietest frame in it (the one nearest the nominal boundary, among
+        frames about equally quiet).
+
+        Returns:
+            list: Boundary times in seconds, starting with 0 and ending with duration
+        """
+        if self.duration <= 0:
+            return [0.0, 0.0]
+        num_chunks = max(1, int(np.ceil(self.duration / chunk_duration)))
+        step = self.duration / num_chunks
+
+        boundaries = [0.0]
+        for index in range(1, num_chunks):
+            boundaries.append(self.choose_boundary(index * step, boundaries[-1], step, window))
+        boundaries.append(self.duration)
+        return boundaries
+
+    def choose_boundary(self, nominal, previous, step, window):
+        """
+        Move one nominal boundary to a pause (see choose_boundaries).
+
+        Only audio up to min(nominal + window, nominal + step / 2) is
+        looked at, so the boundary can be chosen as soon as that much of
+        the recording is indexed.
+
+        Args:
+            nominal: Nominal boundary in seconds
+            previous: The boundary before it
+            step: Nominal chunk length in seconds
+            window: Maximum move in seconds
+
+        Returns:
+            float: Boundary in seconds
+        """
+        # Never move behind the previous boundary or past the next nominal one
+        low = max(nominal - window, previous + step / 2)
+        high = min(nominal + window, nominal + step / 2)
+        return self._best_pause(nominal, low, high)
+
+    def _best_pause(self, nominal, low, high):
+        candidates = []
+        for start, end in self.regions:
+            if start <= high and end >= low:
+                # Middle of the part of the pause inside the window
+                middle = (max(start, low) + min(end, high)) / 2
+                candidates.append((abs(middle - nominal), middle))
+        if candidates:
+            return float(min(candidates)[1])
+
+        first = max(0, int(low / self.frame_seconds))
+        last = min(len(self.energy_db), int(high / self.frame_seconds) + 1)
+        if first >= last:
+            return nominal
+        # Among frames about as quiet as the quietest, take the one nearest the nominal boundary
+        energy = self.energy_db[first:last]
+        candidates = first + np.flatnonzero(energy <= energy.min() + QUIET_TIE_DB)
+        quietest = candidates[np.argmin(np.abs((candidates + 0.5) * self.frame_seconds - nominal))]
+        return float((quietest + 0.5) * self.frame_seconds)
+
+
+class SilenceTracker:
+    """
+    Builds a SilenceIndex from audio that arrives in blocks, e.g. as it is
+    decoded from a download.
+
+    Frame features are computed as blocks are fed, so index() is cheap at
+    any point; it covers the audio so far, with the silence threshold set
+    relative to that audio's loud level. Other threads, and coroutines on
+    any event loop, can wait until a given duration has been fed.
+
+    Args:
+        sample_rate: Sample rate of the fed audio in Hz
+        **index_kwargs: Passed on to SilenceIndex
+
+    Attributes:
+        error: Exception that ended the audio early, or None
+    """
+
+    def __init__(self, sample_rate, **index_kwargs):
+        self.frame_length = _frame_length(sample_rate)
+        self.frame_seconds = self.frame_length / sample_rate
+        self.error = None
+        self._index_kwargs = index_kwargs
+        self._energies = []
+        self._rates = []
+        self._frames = 0
+        self._carry = None
+        self._finished = False
+        self._waiters = []
+        self._condition = threading.Condition()
+
+    @property
+    def duration(self):
+        """Seconds of audio indexed so far."""
+        return self._frames * self.frame_seconds
+
+    @property
+    def finished(self):
+        """Whether the audio has ended (see finish)."""
+        return self._finished
+
+    def feed(self, samples):
+        """Add the next block of float samples, shape (samples, channels)."""
+        block = samples if self._carry is None else np.concatenate([self._carry, samples])
+        usable = len(block) // self.frame_length * self.frame_length
+        energy_db, zcr = _frame_features(block[:usable], self.frame_length)
+        self._carry = block[usable:]
+        with self._condition:
+            self._energies.append(energy_db)
+            self._rates.append(zcr)
+            self._frames += len(energy_db)
+            self._notify()
+
+    def finish(self, error=None):
+        """Mark the end of the audio, or that it ended early because of error."""
+        with self._condition:
+            self.error = error
+            self._finished = True
+            self._notify()
+
+    def wait(self, seconds):
+        """Block until seconds of audio are indexed or the audio has ended."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._ready(seconds))
+
+    async def wait_async(self, seconds):
+        """Wait for seconds of audio without blocking the event loop (see wait)."""
+        loop = asyncio.get_running_loop()
+        with self._condition:
+            if self._ready(seconds):
+                return
+            future = loop.create_future()
+            self._waiters.append((seconds, loop, future))
+        await future
+
+    def index(self):
+        """Build a SilenceIndex over the audio so far."""
+        with self._condition:
+            energies, rates = list(self._energies), list(self._rates)
+        if not energies:
+            return SilenceIndex(np.zeros(0), np.zeros(0), self.frame_seconds, **self._index_kwargs)
+        return SilenceIndex(np.concatenate(energies), np.concatenate(rates), self.frame_seconds,
+                            **self._index_kwargs)
+
+    def _ready(self, seconds):
+        return self._finished or self.duration >= seconds
+
+    def _notify(self):
+        # Called with the condition held
+        self._condition.notify_all()
+        waiting = []
+        for seconds, loop, future in self._waiters:
+            if self._ready(seconds):
+                loop.call_soon_threadsafe(_resolve, future)
+            else:
+                waiting.append((seconds, loop, future))
+        self._waiters = waiting
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+def _frame_length(sample_rate):
+    return max(1, int(sample_rate * FRAME_SECONDS))
+
+
+def _frame_features(samples, frame_length):
+    """Per-frame RMS energy in dB and zero-crossing rate, for whole frames of samples."""
+    mono = samples.mean(axis=1) if samples.shape[1] > 1 else samples[:, 0]
+    frames = mono[:len(mono) // frame_length * frame_length].reshape(-1, frame_length)
+    energy_db = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame_length
+    return energy_db, zcr
+
+
+def _runs(mask, min_length, frame_seconds):
+    """Find runs of True at least min_length long, as (start_seconds, end_seconds)."""
+    padded = np.concatenate([[False], mask, [False]])
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    starts, ends = edges[::2], edges[1::2]
+    keep = ends - starts >= max(1, min_length)
+    return [(float(start * frame_seconds), float(end * frame_seconds)) for start, end in zip(starts[keep], ends[keep])]
@@ -0,0 +1,201 @@
+import os
+import time
+import uuid
+import signal
+import socket
+import logging
+import threading
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+class LeaseLostError(Exception):
+    """Raised by a job that stopped because its worker no longer holds the job's lease."""
+
+
+class Lease:
+    """
+    A worker's claim on a running job, handed to the job handler.
+
+    `lost` is set once the heartbeat finds that the lease ran out and the
+    job may have been reclaimed by another worker. The handler should then
+    stop the job and record nothing more, since the job's results now belong
+    to the new owner.
+
+    Args:
+        job_id: Job ID
+        worker_id: ID of the worker holding the lease
+    """
+
+    def __init__(self, job_id, worker_id):
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.lost = threading.Event()
+
+    def check(self):
+        """
+        Stop here if the lease has been lost.
+
+        Raises:
+            LeaseLostError: If the lease has been lost
+        """
+        if self.lost.is_set():
+            raise LeaseLostError(f"Lost the lease on job {self.job_id}")
+
+
+class Worker:
+    """
+    Runs queued jobs from the shared job store, up to `concurrency` at once.
+
+    A dispatcher thread claims a job whenever a slot is free (see
+    JobStore.claim) and runs it on its own thread. A heartbeat thread renews
+    the worker's leases every third of `lease_seconds` and records the
+    worker as alive. If the process dies, its leases run out and any other
+    worker sharing the store reclaims the jobs; jobs resume from the
+    checkpoints in their workspaces. If this worker is only slow (e.g. a
+    long pause) and a lease runs out anyway, the heartbeat sets the job's
+    Lease.lost so the handler stops it.
+
+    Args:
+        store: Job store holding the queue
+        handler: Callable(job_id, job, lease) that runs a job to completion,
+            recording success or failure in the store itself, but only while
+            it holds the Lease (see JobStore.update)
+        concurrency: Maximum number of jobs at once
+            (default: YT_TRANSLATOR_WORKERS or 4)
+        lease_seconds: Lease length (default: YT_TRANSLATOR_LEASE_SECONDS or 60)
+        max_attempts: Claims per job before it is failed
+            (default: YT_TRANSLATOR_MAX_ATTEMPTS or 3)
+        poll_interval: Seconds between queue checks while idle
+    """
+
+    def __init__(self, store, handler, concurrency=None, lease_seconds=None, max_attempts=None, poll_interval=0.5):
+        self.store = store
+        self.handler = handler
+        self.concurrency = concurrency or int(os.environ.get('YT_TRANSLATOR_WORKERS', 4))
+        self.lease_seconds = lease_seconds or float(os.environ.get('YT_TRANSLATOR_LEASE_SECONDS', 60))
+        self.max_attempts = max_attempts or int(os.environ.get('YT_TRANSLATOR_MAX_ATTEMPTS', 3))
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        # Lease of every running job, by job ID
+        self._active = {}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._stopping = threading.Event()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Start claiming jobs in the background."""
+        for target, name in ((self._dispatch_loop, 'dispatcher'), (self._heartbeat_loop, 'heartbeat')):
+            thread = threading.Thread(target=target, name=f"worker-{name}")
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Worker {self.worker_id} started with {self.concurrency} slots")
+
+    def stop(self, timeout=30):
+        """
+        Stop claiming jobs and wait up to timeout seconds for running ones.
+
+        Jobs still running afterwards have their leases expired, so other
+        workers reclaim them at once instead of after the lease runs out.
+        """
+        self._stopping.set()
+        self._wakeup.set()
+        deadline = time.time() + timeout
+        for _ in range(self.concurrency):
+            if not self._slots.acquire(timeout=max(0, deadline - time.time())):
+                break
+        # Leases stay renewed while running jobs drain
+        self._stopped.set()
+        with self._lock:
+            unfinished = list(self._active)
+        for job_id in unfinished:
+            logger.warning(f"Handing unfinished job {job_id} back to the queue")
+            self.store.release(job_id, self.worker_id, expire=True)
+        self.store.remove_worker(self.worker_id)
+
+    def run_forever(self, drain_timeout=30):
+        """Block until SIGTERM or SIGINT, then stop (see stop). Call start first."""
+        stop_requested = threading.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: stop_requested.set())
+        while not stop_requested.wait(1):
+            pass
+        logger.info(f"Worker {self.worker_id} stopping")
+        self.stop(drain_timeout)
+
+    def wake(self):
+        """Check the queue now instead of at the next poll, e.g. after queueing a job in this process."""
+        self._wakeup.set()
+
+    def get_stats(self):
+        with self._lock:
+            return {'worker_id': self.worker_id, 'concurrency': self.concurrency, 'active_jobs': len(self._active)}
+
+    def _dispatch_loop(self):
+        while not self._stopping.is_set():
+            self._slots.acquire()
+            if self._stopping.is_set():
+                self._slots.release()
+                return
+            self._wakeup.clear()
+            try:
+                claimed = self.store.claim(self.worker_id, self.lease_seconds, self.max_attempts)
+            except Exception as e:
+                logger.error(f"Could not claim a job: {str(e)}")
+                claimed = None
+            if claimed is None:
+                self._slots.release()
+                self._wakeup.wait(self.poll_interval)
+                continue
+
+            job_id, job = claimed
+            lease = Lease(job_id, self.worker_id)
+            with self._lock:
+                self._active[job_id] = lease
+            thread = threading.Thread(target=self._run, args=(job_id, job, lease), name=f"worker-job-{job_id[:8]}")
+            thread.daemon = True
+            thread.start()
+
+    def _run(self, job_id, job, lease):
+        try:
+            if job.get('attempts', 1) > 1:
+                logger.info(f"Reclaimed job {job_id} (attempt {job['attempts']})")
+            self.handler(job_id, job, lease)
+        except Exception as e:
+            logger.error(f"Unhandled error in job {job_id}: {str(e)}")
+        finally:
+            with self._lock:
+                self._active.pop(job_id, None)
+            try:
+                self.store.release(job_id, self.worker_id)
+            except Exception as e:
+                logger.error(f"Could not release job {job_id}: {str(e)}")
+            self._slots.release()
+
+    def _heartbeat_loop(self):
+        while True:
+            try:
+                # Jobs claimed after this snapshot may be missing from held
+                with self._lock:
+                    running = set(self._active)
+                held = self.store.renew_leases(self.worker_id, self.lease_seconds)
+                with self._lock:
+                    lost = [self._active[job_id] for job_id in running - held
+                            if job_id in self._active and not self._active[job_id].lost.is_set()]
+                    active = len(self._active)
+                for lease in lost:
+                    logger.warning(f"Lost the lease on job {lease.job_id}; stopping it, "
+                                   f"another worker may be running it")
+                    lease.lost.set()
+                self.store.heartbeat(self.worker_id, self.concurrency, active)
+            except Exception as e:
+                logger.error(f"Worker heartbeat failed: {str(e)}")
+            if self._stopped.wait(self.lease_seconds / 3):
+                return
@@ -0,0 +1,164 @@
+import os
+import time
+import shutil
+import logging
+import threading
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+class WorkspaceManager:
+    """
+    Manages the on-disk lifecycle of job files.
+
+    Each job gets a scratch directory (`<root>/jobs/<job_id>`) for its
+    downloads, intermediate files and checkpoints, removed when the job
+    completes. A failed job's directory is kept, so a retry can resume from
+    its checkpoints, until it has been untouched for `stale_after`. Finished
+    outputs (`translated_*.mp3`) are published to `<root>/outputs`, the only
+    directory clients download from, and kept under a global byte quota by a
+    background collector, which evicts the least recently downloaded outputs
+    first. Running jobs never have files in the outputs directory, so the
+    collector cannot remove anything a running job is using.
+    """
+
+    OUTPUT_PREFIX = 'translated_'
+
+    def __init__(self, root, max_output_bytes, collect_interval=60, stale_after=6 * 3600, keeps_scratch=None):
+        """
+        Args:
+            root: Top-level temp directory
+            max_output_bytes: Byte quota for finished outputs
+            collect_interval: Seconds between collector runs
+            stale_after: Age in seconds after which an untouched scratch
+                directory is removed even if its job may still use it (e.g.
+                the process running it died, or a failed job was never
+                retried)
+            keeps_scratch: Optional callable(job_id) -> bool, used to spot
+                scratch directories of jobs running in other processes or
+                kept for a retry
+        """
+        self.root = root
+        self.jobs_dir = os.path.join(root, 'jobs')
+        self.outputs_dir = os.path.join(root, 'outputs')
+        self.max_output_bytes = max_output_bytes
+        self.collect_interval = collect_interval
+        self.stale_after = stale_after
+        self.keeps_scratch = keeps_scratch
+
+        self._active = set()
+        self._lock = threading.Lock()
+        self._collector = None
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        os.makedirs(self.outputs_dir, exist_ok=True)
+
+    def create(self, job_id):
+        """
+        Create a job's scratch directory.
+
+        Returns:
+            str: Path to the directory
+        """
+        path = os.path.join(self.jobs_dir, job_id)
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            self._active.add(job_id)
+        return path
+
+    def release(self, job_id, keep=False):
+        """
+        Release a job's scratch directory once the job has ended.
+
+        Args:
+            job_id: Job ID
+            keep: Leave the directory for a later retry instead of removing it
+        """
+        with self._lock:
+            self._active.discard(job_id)
+        if not keep:
+            shutil.rmtree(os.path.join(self.jobs_dir, job_id), ignore_errors=True)
+
+    def publish(self, job_id, path):
+        """
+        Move a finished output out of the job's scratch directory into the outputs directory.
+
+        Returns:
+            str: New path of the output
+        """
+        published_path = os.path.join(self.outputs_dir, os.path.basename(path))
+        os.replace(path, published_path)
+        return published_path
+
+    def mark_accessed(self, filename):
+        """Record a download of an output, for LRU eviction."""
+        path = os.path.join(self.outputs_dir, os.path.basename(filename))
+        try:
+            # Only atime is used as the LRU clock; mtime stays stable for ETags
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except FileNotFoundError:
+            pass
+
+    def start_collector(self):
+        """Start the background collector thread, once per process."""
+        with self._lock:
+            if self._collector is not None:
+                return
+            self._collector = threading.Thread(target=self._collector_loop, name='workspace-collector')
+            self._collector.daemon = True
+            self._collector.start()
+
+    def collect(self):
+        """Enforce the output quota and remove abandoned scratch directories."""
+        self._enforce_output_quota()
+        self._remove_stale_scratch()
+
+    def _collector_loop(self):
+        while True:
+            try:
+                self.collect()
+            except Exception as e:
+                logger.error(f"Workspace collection failed: {str(e)}")
+            time.sleep(self.collect_interval)
+
+    def _enforce_output_quota(self):
+        outputs = []
+        total = 0
+        for entry in os.scandir(self.outputs_dir):
+            if not (entry.name.startswith(self.OUTPUT_PREFIX) and entry.is_file()):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            outputs.append((stat.st_atime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        outputs.sort()
+        for _, size, path in outputs:
+            if total <= self.max_output_bytes:
+                break
+            try:
+                os.remove(path)
+                logger.info(f"Evicted output {os.path.basename(path)} to stay under quota")
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def _remove_stale_scratch(self):
+        now = time.time()
+        for entry in os.scandir(self.jobs_dir):
+            job_id = entry.name
+            with self._lock:
+                if job_id in self._active:
+                    continue
+            try:
+                age = now - entry.stat().st_mtime
+            except FileNotFoundError:
+                continue
+
+            kept = self.keeps_scratch is not None and self.keeps_scratch(job_id)
+            if not kept or age > self.stale_after:
+                logger.info(f"Removing abandoned workspace for job {job_id}")
+                shutil.rmtree(entry.path, ignore_errors=True)
@@ -6,7 +6,25 @@ import threading
 import time
 import random
 import shutil
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
 from audio_processor import AudioProcessor
+from scheduler import JobScheduler
+from worker import Worker, LeaseLostError
+from job_store import create_job_store
+from disk_cache import DiskCache
+from workspace import WorkspaceManager
+from checkpoint import CheckpointStore
+from downloader import GrowingFile
+import metrics
+import services
+
+try:
+    from pytube import YouTube
+except ImportError:  # pytube is optional; without it downloads are simulated
+    YouTube = None
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -18,88 +36,632 @@ class YouTubeTranslator:
     and translation from English to Brazilian Portuguese.
     """
     
-    # Class level dictionary to store job statuses for persistence
-    _jobs = {}
+    # Job store, scheduler, worker, result cache and workspace manager
+    # shared by all translator instances in this process
+    _store = None
+    _scheduler = None
+    _worker = None
+    _result_cache = None
+    _workspace = None
+    _init_lock = threading.Lock()
     
-    def __init__(self):
+    def __init__(self, audio_processor=None):
+        """
+        Args:
+            audio_processor: AudioProcessor to use, e.g. one with custom
+                backends (default: AudioProcessor())
+        """
         # Create temporary directory for downloaded and processed files
         self.temp_dir = os.path.join(tempfile.gettempdir(), 'yt_translator')
         os.makedirs(self.temp_dir, exist_ok=True)
         
-        # Use the class level dictionary for jobs
-        # self.jobs = YouTubeTranslator._jobs
+        # Persistent job store shared across worker processes
+        self._store = self.get_job_store()
         
         # Audio processor for translation
-        self.audio_processor = AudioProcessor()
+        self.audio_processor = audio_processor or AudioProcessor()
+        
+        # Translate audio while it downloads (see _download_and_translate)
+        self.streaming = os.environ.get('YT_TRANSLATOR_STREAMING', '1') != '0'
+        
+        # Web processes only enqueue jobs, unless told to run some themselves
+        embedded_workers = int(os.environ.get('YT_TRANSLATOR_EMBEDDED_WORKERS', 0))
+        if embedded_workers > 0:
+            self.start_worker(embedded_workers)
     
-    def start_translation_job(self, youtube_url):
-        """Start a translation job for the given YouTube URL."""
+    @classmethod
+    def get_job_store(cls):
+        """Get the process-wide job store, creating it on first use."""
+        with cls._init_lock:
+            if cls._store is None:
+                cls._store = create_job_store()
+            return cls._store
+    
+    @classmethod
+    def get_scheduler(cls):
+        """Get the process-wide job scheduler, creating it on first use."""
+        store = cls.get_job_store()
+        with cls._init_lock:
+            if cls._scheduler is None:
+                cls._scheduler = JobScheduler(store)
+                scheduler = cls._scheduler
+                metrics.QUEUE_DEPTH.set_function(lambda: scheduler.get_stats()['queue_depth'])
+                metrics.ACTIVE_JOBS.set_function(lambda: scheduler.get_stats()['active_jobs'])
+            return cls._scheduler
+    
+    def start_worker(self, concurrency=None):
+        """
+        Start running queued jobs in this process, once per process.
+        
+        Jobs are claimed from the shared job store with leases (see
+        worker.Worker) and run by this translator.
+        
+        Args:
+            concurrency: Maximum number of jobs at once (default: YT_TRANSLATOR_WORKERS or 4)
+            
+        Returns:
+            Worker: The process's worker
+        """
+        with self._init_lock:
+            if YouTubeTranslator._worker is None:
+                worker = Worker(self._store,
+                                lambda job_id, job, lease: self._process_job(job_id, job['youtube_url'], lease),
+                                concurrency)
+                worker.start()
+                YouTubeTranslator._worker = worker
+            return YouTubeTranslator._worker
+    
+    @classmethod
+    def get_result_cache(cls):
+        """Get the process-wide cache of finished translations, creating it on first use."""
+        with cls._init_lock:
+            if cls._result_cache is None:
+                max_bytes = int(os.environ.get('YT_TRANSLATOR_RESULT_CACHE_BYTES', 2 * 1024 ** 3))
+                # Cached results are served for download, so they live with the published outputs
+                cache_dir = os.path.join(tempfile.gettempdir(), 'yt_translator', 'outputs')
+                cls._result_cache = DiskCache(cache_dir, max_bytes, prefix='cached_', suffix='.mp3')
+                metrics.register_cache('result', cls._result_cache.get_stats)
+            return cls._result_cache
+    
+    @classmethod
+    def get_workspace(cls):
+        """Get the process-wide workspace manager, starting its collector on first use."""
+        store = cls.get_job_store()
+        with cls._init_lock:
+            if cls._workspace is None:
+                cls._workspace = WorkspaceManager(
+                    os.path.join(tempfile.gettempdir(), 'yt_translator'),
+                    max_output_bytes=int(os.environ.get('YT_TRANSLATOR_OUTPUT_BYTES', 5 * 1024 ** 3)),
+                    collect_interval=int(os.environ.get('YT_TRANSLATOR_GC_INTERVAL', 60)),
+                    # Failed jobs can be retried from their checkpoints for this long
+                    stale_after=int(os.environ.get('YT_TRANSLATOR_RETRY_WINDOW', 6 * 3600)),
+                    keeps_scratch=lambda job_id: (store.get(job_id) or {}).get('status', 'completed') != 'completed'
+                )
+                cls._workspace.start_collector()
+            return cls._workspace
+    
+    def start_translation_job(self, youtube_url, priority=0, tenant=''):
+        """
+        Start a translation job for the given YouTube URL.
+        
+        If the same video was already translated with the current pipeline
+        settings, the job completes immediately from the result cache. If it
+        is being translated right now, the running job's ID is returned
+        instead of starting a duplicate.
+        
+        Args:
+            youtube_url: URL of the YouTube video
+            priority: Scheduling priority, lower values run first
+            tenant: Who submitted the job; tenants share the workers fairly
+            
+        Returns:
+            str: The job ID
+            
+        Raises:
+            SchedulerBusyError: If the job queue is full
+        """
         
         # Generate unique job ID
         job_id = str(uuid.uuid4())
+        cache_key = self._get_cache_key(youtube_url)
+        
+        # Serve repeat requests straight from the result cache
+        if self._complete_from_cache(job_id, youtube_url, cache_key):
+            return job_id
+        
+        self.get_scheduler().admit()
+        owner_id = self._enqueue(job_id, youtube_url, cache_key, priority, tenant)
+        if owner_id == job_id and self._worker is not None:
+            self._worker.wake()
+        return owner_id
+    
+    def start_batch(self, youtube_urls=None, playlist_url=None, priority=0, tenant=''):
+        """
+        Start translating a list of videos and/or a playlist as one batch.
+        
+        The batch is admitted only if the queue has room for every video
+        that is not in the result cache (see JobScheduler.admit); then every
+        video becomes a job like start_translation_job would create: served
+        from the result cache, attached to a running job for the same video,
+        or queued. Queued items compete with other tenants' jobs fairly
+        rather than in one block.
+        
+        Args:
+            youtube_urls: Video URLs
+            playlist_url: YouTube playlist URL, expanded to its videos
+            priority: Scheduling priority of every item, lower values run first
+            tenant: Who submitted the batch
+            
+        Returns:
+            str: The batch ID
+            
+        Raises:
+            ValueError: If the batch is empty, larger than YT_TRANSLATOR_MAX_BATCH_SIZE,
+                or has more videos to translate than the queue can hold
+            SchedulerBusyError: If the job queue has no room for the batch
+        """
+        urls = [url.strip() for url in youtube_urls or () if url and url.strip()]
+        if playlist_url:
+            urls.extend(self._list_playlist_videos(playlist_url))
+        # The same video twice in a batch is one item
+        urls = list(dict.fromkeys(urls))
+        
+        max_size = int(os.environ.get('YT_TRANSLATOR_MAX_BATCH_SIZE', 500))
+        if not urls:
+            raise ValueError('The batch has no videos')
+        if len(urls) > max_size:
+            raise ValueError(f'The batch has {len(urls)} videos; the limit is {max_size}')
+        
+        # Every video that is not in the result cache may take a queue slot
+        cache_keys = [self._get_cache_key(youtube_url) for youtube_url in urls]
+        result_cache = self.get_result_cache()
+        uncached = sum(1 for cache_key in cache_keys if not os.path.isfile(result_cache.path_for(cache_key)))
+        if uncached:
+            self.get_scheduler().admit(uncached)
+        
+        batch_id = str(uuid.uuid4())
+        items = []
+        for youtube_url, cache_key in zip(urls, cache_keys):
+            job_id = str(uuid.uuid4())
+            if not self._complete_from_cache(job_id, youtube_url, cache_key):
+                job_id = self._enqueue(job_id, youtube_url, cache_key, priority, tenant)
+            items.append({'youtube_url': youtube_url, 'job_id': job_id})
         
-        # Initialize job status
-        YouTubeTranslator._jobs[job_id] = {
-            'status': 'initializing',
+        self._store.create_batch(batch_id, {'tenant': tenant, 'playlist_url': playlist_url, 'items': items})
+        if self._worker is not None:
+            self._worker.wake()
+        logger.info(f"Started batch {batch_id} with {len(items)} videos for tenant '{tenant}'")
+        return batch_id
+    
+    def get_batch_status(self, batch_id):
+        """
+        Get the aggregate status of a batch and the status of each item.
+        
+        The batch's progress is the mean of its items' progress. Its ETA is
+        extrapolated from how fast its own items have finished so far, or
+        estimated from the fleet's recent run times before any has.
+        
+        Returns:
+            dict: Batch status ('queued', 'processing', 'completed', 'partial'
+                or 'error'), item counts, progress, eta and items
+        """
+        batch = self._store.get_batch(batch_id)
+        if batch is None:
+            return {'status': 'not_found', 'message': 'Batch not found'}
+        
+        jobs = self._store.get_many([item['job_id'] for item in batch['items']])
+        items = []
+        counts = {}
+        for item in batch['items']:
+            job = jobs.get(item['job_id'], {'status': 'not_found', 'progress': 0, 'message': 'Job not found'})
+            counts[job['status']] = counts.get(job['status'], 0) + 1
+            items.append({
+                'youtube_url': item['youtube_url'],
+                'job_id': item['job_id'],
+                **{key: job[key] for key in ('status', 'progress', 'message', 'video_title', 'filename')
+                   if key in job}
+            })
+        
+        total = len(items)
+        completed = counts.get('completed', 0)
+        failed = counts.get('error', 0) + counts.get('not_found', 0)
+        remaining = total - completed - failed
+        if remaining:
+            status = 'queued' if counts.get('queued', 0) == total else 'processing'
+        else:
+            status = 'completed' if not failed else 'error' if not completed else 'partial'
+        
+        status_info = {
+            'batch_id': batch_id,
+            'status': status,
+            'tenant': batch['tenant'],
+            'total': total,
+            'completed': completed,
+            'failed': failed,
+            'remaining': remaining,
+            'counts': counts,
+            'progress': round(sum(item.get('progress', 0) for item in items) / total, 1),
+            'eta': None,
+            'items': items
+        }
+        if batch.get('playlist_url'):
+            status_info['playlist_url'] = batch['playlist_url']
+        
+        if remaining:
+            elapsed = time.time() - batch['created_at']
+            finished = completed + failed
+            if finished:
+                status_info['eta'] = round(elapsed / finished * remaining, 1)
+            else:
+                estimate = self.get_scheduler().estimate_run_time(remaining)
+                status_info['eta'] = round(estimate, 1) if estimate is not None else None
+        else:
+            status_info['eta'] = 0
+        
+        return status_info
+    
+    def _complete_from_cache(self, job_id, youtube_url, cache_key):
+        """Create job_id as completed if the result cache has the translation."""
+        cached_path = self.get_result_cache().get(cache_key)
+        if not cached_path:
+            return False
+        
+        logger.info(f"Result cache hit for {youtube_url}")
+        metrics.JOBS_TOTAL.inc(outcome='cache_hit')
+        self._store.create(job_id, {
+            **self.get_result_cache().get_metadata(cache_key),
+            'status': 'completed',
+            'progress': 100,
+            'youtube_url': youtube_url,
+            'cache_key': cache_key,
+            'message': 'Translation completed successfully!',
+            'filename': os.path.basename(cached_path),
+            'translated_audio_path': cached_path,
+            'cache_hit': True
+        })
+        return True
+    
+    def _enqueue(self, job_id, youtube_url, cache_key, priority, tenant):
+        """
+        Queue a job for the workers, or attach to a running job for the same video.
+        
+        Returns:
+            str: ID of the job that owns the work
+        """
+        owner_id = self._store.create_or_attach(job_id, {
+            'status': 'queued',
             'progress': 0,
+            'priority': priority,
+            'tenant': tenant,
             'youtube_url': youtube_url,
-            'message': 'Job created, initializing...'
-        }
+            'cache_key': cache_key,
+            'message': 'Job queued, waiting for a free worker...',
+            'queued_at': time.time()
+        })
+        if owner_id != job_id:
+            logger.info(f"Attached request for {youtube_url} to running job {owner_id}")
+        return owner_id
+    
+    def retry_job(self, job_id, priority=0):
+        """
+        Resume a failed job from its last checkpoint.
         
-        # Start processing thread
-        thread = threading.Thread(target=self._process_job, args=(job_id, youtube_url))
-        thread.daemon = True
-        thread.start()
+        The job keeps its ID and workspace, so the download and every chunk
+        stage finished before the failure are not repeated (see
+        AudioProcessor.process_long_audio_async). Checkpoints are kept for
+        YT_TRANSLATOR_RETRY_WINDOW seconds after the failure; later retries
+        start over.
+        
+        Args:
+            job_id: ID of the failed job
+            priority: Scheduling priority, lower values run first
+            
+        Returns:
+            str: ID of the job doing the work (job_id, or a job already
+                running for the same video), or None if the job does not
+                exist or has not failed
+            
+        Raises:
+            SchedulerBusyError: If the job queue is full
+        """
+        job = self._store.get(job_id)
+        if job is None:
+            return None
         
-        return job_id
+        self.get_scheduler().admit()
+        owner_id = self._store.requeue(job_id, {
+            'status': 'queued',
+            'progress': 0,
+            'priority': priority,
+            'attempts': 0,
+            'lease_owner': None,
+            'lease_expires': None,
+            'message': 'Job queued to resume from its last checkpoint...',
+            'queued_at': time.time(),
+            'retries': job.get('retries', 0) + 1
+        })
+        if owner_id == job_id:
+            logger.info(f"Retrying job {job_id} from its last checkpoint")
+            if self._worker is not None:
+                self._worker.wake()
+        return owner_id
     
     def get_job_status(self, job_id):
         """Get the status of a translation job."""
-        if job_id not in YouTubeTranslator._jobs:
+        return self._build_status(job_id, self._store.get(job_id))
+    
+    def wait_for_job_change(self, job_id, version, timeout):
+        """
+        Wait until a job's status version differs from `version`.
+        
+        Args:
+            job_id: Job ID
+            version: Status version the caller already has
+            timeout: Maximum time to wait in seconds
+            
+        Returns:
+            dict: The job status, changed or not
+        """
+        return self._build_status(job_id, self._store.wait_for_change(job_id, version, timeout))
+    
+    def _build_status(self, job_id, status):
+        """Turn a job store record into a status response."""
+        if status is None:
             return {'status': 'not_found', 'message': 'Job not found'}
         
-        return YouTubeTranslator._jobs[job_id]
+        # Report queue position while the job waits for a worker
+        if status['status'] == 'queued':
+            queue_info = self.get_scheduler().get_queue_info(job_id)
+            if queue_info:
+                status.update(queue_info)
+        
+        return status
     
-    def _process_job(self, job_id, youtube_url):
-        """Process a translation job in a separate thread."""
+    def _process_job(self, job_id, youtube_url, lease=None):
+        """
+        Run a job claimed by the process's worker (see start_worker).
+        
+        Called on the worker's job thread with the worker.Lease on the job:
+        the job downloads and translates the video in its workspace, resuming
+        from any checkpoints a previous attempt left, and stops as soon as the
+        lease is lost. Its status, result or error are only recorded while
+        the lease is held; the worker releases the lease once this returns.
+        """
+        workspace = self.get_workspace()
+        job = self._store.get(job_id)
+        if job is None:
+            logger.warning(f"Job {job_id} was deleted before it started")
+            return
+        # Jobs queued before queued_at was recorded count from now
+        queued_at = job.get('queued_at', time.time())
+        owner = lease.worker_id if lease is not None else None
+        cancelled = lease.lost if lease is not None else None
+        # Seconds spent per stage, reported in the job status
+        stage_timings = {}
+        outcome = 'error'
         try:
-            # Update job status
-            YouTubeTranslator._jobs[job_id]['status'] = 'downloading'
-            YouTubeTranslator._jobs[job_id]['message'] = 'Downloading YouTube video...'
-            
-            # Download video
-            video_info, audio_path = self._download_youtube_audio(youtube_url)
+            # Update job status, recording how long the job waited in the queue
+            queue_wait = time.time() - queued_at
+            metrics.record_stage('queue', queue_wait, stage_timings)
+            self._store.update(
+                job_id,
+                owner=owner,
+                status='downloading',
+                message='Downloading YouTube video...',
+                queue_wait=round(queue_wait, 1)
+            )
             
-            # Update job with video info
-            YouTubeTranslator._jobs[job_id]['video_title'] = video_info['title']
-            YouTubeTranslator._jobs[job_id]['video_author'] = video_info['author']
-            YouTubeTranslator._jobs[job_id]['video_length'] = video_info['length']
-            YouTubeTranslator._jobs[job_id]['progress'] = 20
-            
-            # Translate audio
-            YouTubeTranslator._jobs[job_id]['status'] = 'translating'
-            YouTubeTranslator._jobs[job_id]['message'] = 'Translating audio from English to Brazilian Portuguese...'
+            # Download video into the job's scratch directory (kept on failure, for retries)
+            work_dir = workspace.create(job_id)
+            if self.streaming:
+                video_info, translated_audio_path = self._download_and_translate(
+                    job_id, youtube_url, work_dir, stage_timings, cancelled, owner
+                )
+            else:
+                video_info, audio_path = self._download_once(
+                    youtube_url, work_dir, stage_timings,
+                    progress_callback=lambda done, total: self._update_download_progress(job_id, done, total, owner)
+                )
+                if lease is not None:
+                    lease.check()
+                
+                # Update job with video info and start translating
+                self._store.update(
+                    job_id,
+                    owner=owner,
+                    video_title=video_info['title'],
+                    video_author=video_info['author'],
+                    video_length=video_info['length'],
+                    progress=20,
+                    status='translating',
+                    message='Translating audio from English to Brazilian Portuguese...'
+                )
+                
+                # Start translation process
+                translated_audio_path = self._translate_audio(
+                    audio_path, job_id, work_dir, stage_timings, cancelled=cancelled, owner=owner
+                )
             
-            # Start translation process
-            translated_audio_path = self._translate_audio(audio_path, job_id)
+            # Move the output out of scratch
+            if lease is not None:
+                lease.check()
+            translated_audio_path = workspace.publish(job_id, translated_audio_path)
+            metrics.BYTES_WRITTEN.inc(os.path.getsize(translated_audio_path), kind='output')
             
             # Update job with translation results
-            YouTubeTranslator._jobs[job_id]['status'] = 'completed'
-            YouTubeTranslator._jobs[job_id]['message'] = 'Translation completed successfully!'
-            YouTubeTranslator._jobs[job_id]['progress'] = 100
-            YouTubeTranslator._jobs[job_id]['filename'] = os.path.basename(translated_audio_path)
-            YouTubeTranslator._jobs[job_id]['translated_audio_path'] = translated_audio_path
+            completed = self._store.update(
+                job_id,
+                owner=owner,
+                status='completed',
+                message='Translation completed successfully!',
+                progress=100,
+                filename=os.path.basename(translated_audio_path),
+                translated_audio_path=translated_audio_path,
+                stage_timings=stage_timings
+            )
+            if not completed:
+                raise LeaseLostError(f"Lost the lease on job {job_id} before recording its result")
+            outcome = 'completed'
+            
+            # Keep a copy for repeat requests of the same video
+            self._cache_result(job['cache_key'], translated_audio_path, video_info)
             
         except Exception as e:
-            logger.error(f"Error processing job {job_id}: {str(e)}")
-            YouTubeTranslator._jobs[job_id]['status'] = 'error'
-            YouTubeTranslator._jobs[job_id]['message'] = f'Error: {str(e)}'
+            if isinstance(e, LeaseLostError) or (lease is not None and lease.lost.is_set()):
+                outcome = 'lost'
+                logger.warning(f"Stopped job {job_id} after losing its lease: {str(e)}")
+            elif not self._store.update(job_id, owner=owner, status='error', message=f'Error: {str(e)}',
+                                        stage_timings=stage_timings):
+                outcome = 'lost'
+                logger.warning(f"Lost the lease on job {job_id} before recording its error: {str(e)}")
+            else:
+                logger.error(f"Error processing job {job_id}: {str(e)}")
+        
+        finally:
+            # Downloads and intermediate files are no longer needed, unless the job is retried;
+            # a lost job's directory now belongs to the worker that reclaimed it
+            workspace.release(job_id, keep=outcome != 'completed')
+            metrics.JOBS_TOTAL.inc(outcome=outcome)
+            metrics.JOB_SECONDS.observe(time.time() - queued_at, outcome=outcome)
     
-    def _download_youtube_audio(self, youtube_url):
+    def _download_and_translate(self, job_id, youtube_url, work_dir, stage_timings, cancelled=None, owner=None):
         """
-        Simulates downloading audio from a YouTube video.
+        Download and translate a video at the same time.
         
-        In a real implementation, this would use the YouTube API to download the audio.
+        The download runs on its own thread into a GrowingFile, and the
+        translation starts as soon as the start of the audio is on disk.
+        Long audio is processed chunk by chunk as the chunks arrive (see
+        AudioProcessor.process_long_audio_async); short audio is processed
+        in one pass once the download is complete. If the translation
+        fails or the threading.Event cancelled is set, the download is
+        cancelled. Status and progress are written only while the worker
+        owner, if given, holds the job's lease.
+        
+        Returns:
+            tuple: (video_info, translated_audio_path)
+        """
+        growing_file = GrowingFile()
+        translating = threading.Event()
+        
+        def report_download(done, total):
+            if cancelled is not None and cancelled.is_set():
+                growing_file.cancel()
+            # Once translating, job progress follows the chunks instead
+            if not translating.is_set():
+                self._update_download_progress(job_id, done, total, owner)
+        
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"download-{job_id[:8]}") as executor:
+            download = executor.submit(
+                self._download_once, youtube_url, work_dir, stage_timings, report_download, growing_file
+            )
+            try:
+                # Wait for the file to exist, preallocated at its full size
+                growing_file.wait(0)
+                translating.set()
+                self._store.update(
+                    job_id,
+                    owner=owner,
+                    progress=20,
+                    status='translating',
+                    message='Translating audio from English to Brazilian Portuguese while it downloads...'
+                )
+                translated_audio_path = self._translate_audio(
+                    growing_file.path, job_id, work_dir, stage_timings, growing_file, cancelled, owner
+                )
+            except Exception:
+                # A failed download is the failure to report, not what it caused
+                download_error = growing_file.error
+                growing_file.cancel()
+                if download_error is not None:
+                    raise download_error
+                raise
+            video_info, _ = download.result()
+        
+        self._store.update(
+            job_id,
+            video_title=video_info['title'],
+            video_author=video_info['author'],
+            video_length=video_info['length']
+        )
+        return video_info, translated_audio_path
+    
+    def _download_once(self, youtube_url, work_dir, stage_timings=None, progress_callback=None, growing_file=None):
+        """
+        Download a video's audio into work_dir, unless an earlier attempt of the job already did.
+        
+        An interrupted download is resumed rather than restarted (see
+        downloader.SegmentedDownloader). With a growing_file, the audio can
+        be read while it downloads; the growing file is finished or failed
+        when this returns.
+        
+        Returns:
+            tuple: (video_info, audio_path)
+        """
+        checkpoints = CheckpointStore(work_dir, 'download', youtube_url)
+        saved = checkpoints.load('download')
+        if saved is not None:
+            logger.info(f"Reusing the download of {youtube_url} from an earlier attempt")
+            if growing_file is not None:
+                growing_file.finish(saved['audio_path'])
+            return saved['video_info'], saved['audio_path']
+        
+        try:
+            with metrics.timed('download', stage_timings):
+                video_info, audio_path = self._download_youtube_audio(
+                    youtube_url, work_dir, progress_callback, growing_file
+                )
+            metrics.BYTES_WRITTEN.inc(os.path.getsize(audio_path), kind='download')
+            checkpoints.save('download', {'video_info': video_info, 'audio_path': audio_path}, files=('audio_path',))
+        except Exception as e:
+            if growing_file is not None:
+                growing_file.fail(e)
+            raise
+        if growing_file is not None:
+            growing_file.finish(audio_path)
+        return video_info, audio_path
+    
+    def _download_youtube_audio(self, youtube_url, work_dir=None, progress_callback=None, growing_file=None):
+        """
+        Download the audio of a YouTube video.
+        
+        Picks the highest-bitrate audio-only stream and fetches it with
+        parallel Range requests (see downloader.SegmentedDownloader). Without
+        pytube, the download is simulated.
+        
+        Args:
+            youtube_url: URL of the YouTube video
+            work_dir: Directory to download into (default: self.temp_dir)
+            progress_callback: Optional callable(bytes_done, total_bytes)
+            growing_file: Optional downloader.GrowingFile to report the bytes
+                on disk to, so the audio can be read while it downloads
+        
+        Returns:
+            tuple: (video_info, audio_path)
+        """
+        if YouTube is None:
+            return self._simulate_download(youtube_url, work_dir, progress_callback, growing_file)
+        
+        try:
+            video = YouTube(youtube_url)
+            # Audio-only streams are a fraction of the size of the muxed video
+            stream = video.streams.filter(only_audio=True).order_by('abr').desc().first()
+            if stream is None:
+                raise Exception('The video has no audio-only stream')
+            
+            audio_path = os.path.join(work_dir or self.temp_dir, f"{video.video_id}.{stream.subtype}")
+            logger.info(f"Downloading {stream.abr} {stream.mime_type} audio of {youtube_url}")
+            services.get_downloader().download(stream.url, audio_path, progress_callback, growing_file)
+            
+            video_info = {'title': video.title, 'author': video.author, 'length': video.length}
+            return video_info, audio_path
+            
+        except Exception as e:
+            logger.error(f"Error downloading YouTube audio: {str(e)}")
+            raise Exception(f"Failed to download YouTube audio: {str(e)}")
+    
+    def _simulate_download(self, youtube_url, work_dir=None, progress_callback=None, growing_file=None):
+        """
+        Simulates downloading audio from a YouTube video, for setups without pytube.
         
         Returns:
             tuple: (video_info, audio_path)
@@ -108,8 +670,7 @@ class YouTubeTranslator:
             # Simulate download process
             logger.info(f"Simulating download of audio from: {youtube_url}")
             
-            # Extract video ID from URL (basic implementation)
-            video_id = youtube_url.split("v=")[-1].split("&")[0] if "v=" in youtube_url else "sample_video"
+            video_id = self._extract_video_id(youtube_url) or "sample_video"
             
             # Generate simulated video info
             video_title = f"Sample Video - {video_id}"
@@ -123,15 +684,27 @@ class YouTubeTranslator:
             }
             
             # Create a dummy audio file
-            audio_path = os.path.join(self.temp_dir, f"{video_id}.mp3")
+            audio_path = os.path.join(work_dir or self.temp_dir, f"{video_id}.mp3")
             
-            # Write some dummy data to the file
+            # Write 1MB of random data over 2 seconds, at its full size from the start
+            # like a real download, so it can be read while it "downloads"
+            size = 1024 * 1024
+            block_size = size // 8
             with open(audio_path, "wb") as audio_file:
-                # Write a small amount of random data
-                audio_file.write(os.urandom(1024 * 1024))  # 1MB of random data
-            
-            # Simulate download time
-            time.sleep(2)
+                audio_file.truncate(size)
+            if growing_file is not None:
+                growing_file.start(audio_path, size)
+            with open(audio_path, "r+b") as audio_file:
+                for offset in range(0, size, block_size):
+                    if growing_file is not None and growing_file.cancelled:
+                        raise Exception('Download cancelled')
+                    time.sleep(2 / 8)
+                    audio_file.write(os.urandom(block_size))
+                    audio_file.flush()
+                    if growing_file is not None:
+                        growing_file.advance(offset + block_size)
+                    if progress_callback is not None:
+                        progress_callback(offset + block_size, size)
             
             logger.info(f"Simulated download complete: {audio_path}")
             return video_info, audio_path
@@ -140,24 +713,105 @@ class YouTubeTranslator:
             logger.error(f"Error simulating YouTube audio download: {str(e)}")
             raise Exception(f"Failed to simulate YouTube audio download: {str(e)}")
     
-    def _translate_audio(self, audio_path, job_id):
+    def _list_playlist_videos(self, playlist_url):
+        """
+        Simulates listing the videos of a YouTube playlist.
+        
+        In a real implementation, this would use the YouTube Data API
+        (playlistItems.list), following its page tokens.
+        
+        Returns:
+            list: Video URLs in playlist order
+            
+        Raises:
+            ValueError: If the URL has no playlist ID
+        """
+        playlist_id = parse_qs(urlparse(playlist_url).query).get('list', [None])[0]
+        if not playlist_id:
+            raise ValueError(f'Not a YouTube playlist URL: {playlist_url}')
+        
+        logger.info(f"Simulating listing of playlist: {playlist_id}")
+        # A stable, made-up playlist of 3-12 videos
+        digest = hashlib.sha256(playlist_id.encode('utf-8')).hexdigest()
+        return [
+            f"https://www.youtube.com/watch?v={digest[:7]}{index:04d}"
+            for index in range(3 + int(digest[-2:], 16) % 10)
+        ]
+    
+    def _extract_video_id(self, youtube_url):
+        """
+        Extract the video ID from a YouTube URL.
+        
+        Handles watch?v=, youtu.be/, /shorts/ and /embed/ URLs.
+        
+        Returns:
+            str: The video ID, or None if the URL has none
+        """
+        parsed = urlparse(youtube_url)
+        video_ids = parse_qs(parsed.query).get('v')
+        if video_ids:
+            return video_ids[0]
+        
+        path_parts = [part for part in parsed.path.split('/') if part]
+        if parsed.netloc.endswith('youtu.be') and path_parts:
+            return path_parts[0]
+        if len(path_parts) >= 2 and path_parts[0] in ('shorts', 'embed', 'live'):
+            return path_parts[1]
+        return None
+    
+    def _get_cache_key(self, youtube_url):
+        """Build the result cache key from the video ID and the pipeline settings."""
+        # Fall back to the raw URL so unrecognized URLs never share a key
+        video_id = self._extract_video_id(youtube_url) or youtube_url
+        return hashlib.sha256(
+            f"{video_id}:{self.audio_processor.get_config_fingerprint()}".encode('utf-8')
+        ).hexdigest()[:32]
+    
+    def _cache_result(self, cache_key, translated_audio_path, video_info):
+        """Store a finished translation in the result cache."""
+        if not translated_audio_path.endswith('.mp3'):
+            # Demo copies of the original audio (no MP3 encoder) are not worth keeping
+            return
+        try:
+            self.get_result_cache().put(cache_key, translated_audio_path, metadata={
+                'video_title': video_info['title'],
+                'video_author': video_info['author'],
+                'video_length': video_info['length']
+            })
+        except Exception as e:
+            # A cache failure must not fail a job that already succeeded
+            logger.warning(f"Could not cache result {cache_key}: {str(e)}")
+    
+    def _translate_audio(self, audio_path, job_id, work_dir=None, stage_timings=None, growing_file=None,
+                         cancelled=None, owner=None):
         """
         Translate audio from English to Brazilian Portuguese.
         
         Args:
             audio_path: Path to the audio file
             job_id: Job ID for status updates
+            work_dir: Directory for intermediate and output files
+            stage_timings: Optional dict that receives seconds spent per stage
+            growing_file: Optional downloader.GrowingFile if the audio is still downloading
+            cancelled: Optional threading.Event that cancels the translation once set
+            owner: Worker whose lease the job's status updates are written under
             
         Returns:
             str: Path to the translated audio file
         """
+        def report_progress(progress, message):
+            self._update_job_progress(job_id, progress, message, owner)
+        
         try:
             # Get audio duration (estimated)
-            duration = self.audio_processor.get_audio_duration(audio_path)
+            if growing_file is not None:
+                duration = self.audio_processor.get_growing_audio_duration(growing_file)
+            else:
+                duration = self.audio_processor.get_audio_duration(audio_path)
             
-            # Simulate decision making process based on file size
+            # Audio over an hour is split into chunks that go through the stages as a pipeline
             if duration > 3600:  # If longer than 1 hour
-                YouTubeTranslator._jobs[job_id]['message'] = 'Audio is longer than 1 hour. Splitting into chunks...'
+                self._store.update(job_id, owner=owner, message='Audio is longer than 1 hour. Splitting into chunks...')
                 
                 # Log the process
                 logger.info(f"Processing long audio (duration: {duration}s) using chunking method")
@@ -165,16 +819,27 @@ class YouTubeTranslator:
                 # Use long audio processing method
                 translated_audio_path = self.audio_processor.process_long_audio(
                     audio_path, 
-                    progress_callback=lambda progress, message: self._update_job_progress(job_id, progress, message)
+                    progress_callback=report_progress,
+                    work_dir=work_dir,
+                    stage_timings=stage_timings,
+                    growing_file=growing_file,
+                    cancelled=cancelled
                 )
             else:
                 # Log the process
                 logger.info(f"Processing audio (duration: {duration}s) in one pass")
                 
+                # One pass needs the whole file
+                if growing_file is not None:
+                    growing_file.wait(growing_file.size)
+                
                 # Process audio in one go
                 translated_audio_path = self.audio_processor.process_audio(
                     audio_path,
-                    progress_callback=lambda progress, message: self._update_job_progress(job_id, progress, message)
+                    progress_callback=report_progress,
+                    work_dir=work_dir,
+                    stage_timings=stage_timings,
+                    cancelled=cancelled
                 )
             
             return translated_audio_path
@@ -183,10 +848,42 @@ class YouTubeTranslator:
             logger.error(f"Error translating audio: {str(e)}")
             raise Exception(f"Failed to translate audio: {str(e)}")
     
-    def _update_job_progress(self, job_id, progress, message):
-        """Update job progress."""
-        if job_id in YouTubeTranslator._jobs:
-            # Scale progress from 20-90% (as 0-20% is download, 90-100% is finalization)
-            scaled_progress = 20 + (progress * 0.7)
-            YouTubeTranslator._jobs[job_id]['progress'] = min(90, scaled_progress)
-            YouTubeTranslator._jobs[job_id]['message'] = message
+    def _update_download_progress(self, job_id, done, total, owner=None):
+        """Update job progress while downloading (batched, 0-20% of the job)."""
+        if total:
+            message = f'Downloading audio... {done / 1024 ** 2:.1f} of {total / 1024 ** 2:.1f} MB'
+            self._store.update_progress(job_id, 20 * done / total, message, owner)
+        else:
+            self._store.update_progress(job_id, 0, f'Downloading audio... {done / 1024 ** 2:.1f} MB', owner)
+    
+    def _update_job_progress(self, job_id, progress, message, owner=None):
+        """Update job progress (batched, see JobStore.update_progress)."""
+        # Scale progress from 20-90% (as 0-20% is download, 90-100% is finalization)
+        scaled_progress = 20 + (progress * 0.7)
+        self._store.update_progress(job_id, min(90, scaled_progress), message, owner)
+
+
+def main(argv=None):
+    """Command-line entry point: `python -m yt_translator worker --concurrency N`."""
+    parser = argparse.ArgumentParser(prog='python -m yt_translator', description='YouTube audio translator')
+    commands = parser.add_subparsers(dest='command', required=True)
+    worker_parser = commands.add_parser(
+        'worker', help='Run queued translation jobs from the shared job store until stopped'
+    )
+    worker_parser.add_argument('--concurrency', type=int, default=int(os.environ.get('YT_TRANSLATOR_WORKERS', 4)),
+                               help='Maximum number of jobs at once (default: YT_TRANSLATOR_WORKERS or 4)')
+    worker_parser.add_argument('--drain-timeout', type=float, default=30,
+                               help='Seconds to let running jobs finish on shutdown before handing them '
+                                    'back to the queue (default: 30)')
+    args = parser.parse_args(argv)
+    
+    if os.environ.get('YT_TRANSLATOR_JOB_STORE', 'sqlite') == 'memory':
+        parser.error('a separate worker needs a shared job store; YT_TRANSLATOR_JOB_STORE is "memory"')
+    
+    services.warmup()
+    worker = services.get_translator().start_worker(args.concurrency)
+    worker.run_forever(args.drain_timeout)
+
+
+if __name__ == '__main__':
+    main()